@@ -1,30 +1,34 @@
+import time
+_startup_started = time.perf_counter()
+
 import os
-import io
-import tempfile
-import numpy as np
-import pandas as pd
+import sys
 import subprocess
-from extractor.run_extraction import run_pipeline
 from functools import wraps
 from pathlib import Path
-from PyPDF2 import PdfReader
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from googleapiclient.http import MediaIoBaseDownload
-from forecast_processor import run_forecast_processing, LLM_OUTPUT_DIR, PROCESSED_OUTPUT_DIR
-from db.crud import insert_or_replace_po, upsert_drive_files_sqlalchemy, get_all_drive_files, delete_po_by_drive_file_id, get_po_with_schedule
+from db.crud import insert_or_replace_po, upsert_drive_files_sqlalchemy, get_po_with_schedule
+from app.services.drive import download_to_buffer, get_download_settings, DownloadBuffer
+from app.services.drive_clients import get_drive_client_pool, credentials_to_dict, CLIENT_SECRETS_FILE
+from app.services.drive_listing import list_all_files_in_folder, list_folder_children
+from app.services.drive_tree_cache import get_drive_tree_cache
 from db.database import init_db, PurchaseOrder, SessionLocal, PaymentSchedule, Milestone
-from flask import Flask, request, redirect, session, url_for, render_template,  send_file, flash, g
-from extractor.pdf_processing.extract_blocks import extract_blocks
-from extractor.pdf_processing.extract_tables import extract_tables
-from extractor.pdf_processing.format_po import format_po_for_llm
+from db.profiling import start_query_profile, finish_query_profile, current_query_profile
+from flask import Flask, request, redirect, session, url_for, render_template,  send_file, flash, g, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
 
+# Heavy subsystems (pandas/numpy, PDF parsing, LLM providers, the Google API
+# client and the Excel writer) are imported inside the routes that use them,
+# so worker start-up only pays for what a request actually needs.
+
 from app.core.logger import setup_logger
 
 logger = setup_logger()
+
+BASE_OUTPUT_DIR = Path('output')
+LLM_OUTPUT_DIR = BASE_OUTPUT_DIR / "LLM output"
+PROCESSED_OUTPUT_DIR = BASE_OUTPUT_DIR / "processed"
+
 DOTENV_PATH = os.path.join(os.path.dirname(__file__), '.env')
 print(f"DEBUG: Looking for .env file at: {DOTENV_PATH}")
 load_success = load_dotenv(dotenv_path=DOTENV_PATH, verbose=True, override=True)
@@ -44,7 +48,6 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
-CLIENT_SECRETS_FILE = 'client_secret.json'
 
 
 USERS = {}
@@ -55,10 +58,6 @@ for i in range(1, 10):
         USERS[username] = password
         logger.debug(f"Loaded user: {username}")
 
-def build_credentials(creds_dict):
-    return Credentials(**creds_dict)
-
-
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -71,6 +70,28 @@ def login_required(f):
     return decorated_function
 
 
+@app.before_request
+def start_sql_profile():
+    # Statements are totalled per route; the concrete path is kept on each request's report.
+    rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+    g.sql_profile_token = start_query_profile(f"{request.method} {rule}", path=request.path)
+
+
+@app.after_request
+def add_sql_server_timing(response):
+    profile = current_query_profile()
+    if profile is not None:
+        response.headers.add('Server-Timing', f'db;dur={profile.db_ms:.1f};desc="{profile.queries} queries"')
+    return response
+
+
+@app.teardown_request
+def finish_sql_profile(exc):
+    token = g.pop('sql_profile_token', None)
+    if token is not None:
+        finish_query_profile(token)
+
+
 @app.before_request
 def load_logged_in_user():
     g.user = None
@@ -79,6 +100,14 @@ def load_logged_in_user():
     logger.info("User %s is accessing %s", g.user, request.path)
 
 
+@app.before_request
+def start_job_workers():
+    # Starts the background sync workers once per process (a no-op afterwards), so
+    # jobs left unfinished by a previous run are resumed.
+    from app.services.jobs import get_job_runner
+    get_job_runner()
+
+
 @app.route('/add_client', methods=['GET', 'POST'])
 def add_unconfirmed_order():
     if request.method == 'POST':
@@ -203,6 +232,7 @@ def login():
 @login_required
 def logout():
     logger.info("User '%s' logging out.", session.get('username'))
+    get_drive_client_pool().evict(session.get('username'))
     session.pop('logged_in', None)
     session.pop('username', None)
     session.pop('credentials', None)
@@ -215,6 +245,7 @@ def logout():
 @login_required
 def authorize():
     logger.info("User '%s' initiating Google OAuth authorization.", session.get('username'))
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=SCOPES,
@@ -228,6 +259,7 @@ def authorize():
 @login_required
 def oauth2callback():
     logger.info("User '%s' returned from Google OAuth callback.", session.get('username'))
+    from google_auth_oauthlib.flow import Flow
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=SCOPES,
@@ -244,85 +276,41 @@ def oauth2callback():
 @login_required
 def process_pdf(file_id):
 
-    creds = Credentials.from_authorized_user_info(session['credentials'])
-    service = build('drive', 'v3', credentials=creds)
+    lease = open_drive_lease() if 'credentials' in session else None
+    if lease is None:
+        return redirect(url_for('authorize'))
+    service = lease.service
 
     try:
-        file = service.files().get(fileId=file_id, fields='name, mimeType').execute()
+        file = service.files().get(fileId=file_id, fields='name, mimeType, size').execute()
         if file['mimeType'] != 'application/pdf':
             return "<p>Only PDF files are supported for processing.</p>"
 
-        request_drive = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request_drive)
-
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-
-        fh.seek(0)
-
-        temp_dir = tempfile.gettempdir()
-        temp_pdf_path = os.path.join(temp_dir, f"temp_pdf_{file_id}.pdf")
-
-        with open(temp_pdf_path, 'wb') as f:
-            f.write(fh.getvalue())
-
+        from extractor.pdf_processing.parse_document import parse_pdf
+        from extractor.pdf_processing.format_po import format_po_for_llm
+        buffer = download_to_buffer(service, file_id, DownloadBuffer(get_download_settings()["memory_bytes"]), expected_size=file.get('size'))
         try:
-            text_blocks = extract_blocks(temp_pdf_path)
-            tables = extract_tables(temp_pdf_path)
-
-            llm_formatted_content = format_po_for_llm(text_blocks, tables)
+            text_blocks, tables = parse_pdf(buffer.source())
+        finally:
+            buffer.release()
 
-            return f"""
-            <h1>Processed PDF: {file['name']}</h1>
-            <h2>LLM Formatted Content (for direct use):</h2>
-            <pre>{llm_formatted_content}</pre>
-            """
+        llm_formatted_content = format_po_for_llm(text_blocks, tables)
 
-        finally:
-            if os.path.exists(temp_pdf_path):
-                os.remove(temp_pdf_path)
+        return f"""
+        <h1>Processed PDF: {file['name']}</h1>
+        <h2>LLM Formatted Content (for direct use):</h2>
+        <pre>{llm_formatted_content}</pre>
+        """
 
     except Exception as e:
         return f"<p>An error occurred: {e}</p>"
 
 
-# @app.route('/download/<file_id>')
-# @login_required
-# def download_pdf(file_id):
-
-#     creds = Credentials.from_authorized_user_info(session['credentials'])
-#     service = build('drive', 'v3', credentials=creds)
-
-#     file = service.files().get(fileId=file_id, fields='name, mimeType').execute()
-#     file_name = file['name']
-#     mime_type = file['mimeType']
-
-#     if mime_type != 'application/pdf' and not file_name.endswith('.pdf'):
-#         return "<p>Only PDF files are supported for download.</p>"
-
-#     project_root = os.path.dirname(os.path.abspath(__file__))
-#     save_dir = os.path.join(project_root, 'input', 'POs')
-#     os.makedirs(save_dir, exist_ok=True)
-#     save_path = os.path.join(save_dir, file_name)
-
-#     request = service.files().get_media(fileId=file_id)
-#     with open(save_path, "wb") as f:
-#         downloader = MediaIoBaseDownload(f, request)
-#         done = False
-#         while not done:
-#             status, done = downloader.next_chunk()
-
-#     print(f"✅ PDF saved to: {save_path}")
-#     return f"<p>✅ PDF downloaded and saved to <code>{save_path}</code></p>"
-
-
 @app.route("/forecast", methods=["GET"])
 @login_required
 def forecast():
+    import pandas as pd
     logger.info("User '%s' accessed forecast page.", session.get('username'))
-    creds = Credentials.from_authorized_user_info(session['credentials'])
     def parse_checklist(param):
         val = request.args.get(param, default=None, type=str)
         if val is None or val == '':
@@ -400,6 +388,8 @@ def forecast():
 
 
 def generate_pivot_table_html(df=None):
+    import numpy as np
+    import pandas as pd
     from app.core.logger import setup_logger
     logger = setup_logger()
     try:
@@ -555,44 +545,44 @@ def download_forecast():
 
 
 def creds_to_dict(creds):
-    return {
-        'token': creds.token,
-        'refresh_token': creds.refresh_token,
-        'token_uri': creds.token_uri,
-        'client_id': creds.client_id,
-        'client_secret': creds.client_secret,
-        'scopes': creds.scopes
-    }
+    return credentials_to_dict(creds)
 
 
-def get_drive_tree(service, parent_id='root'):
+def open_drive_lease():
     """
-    Recursively builds a tree of files/folders from Google Drive.
-    Returns a nested dict structure.
+    Leases the current user's pooled Drive services for this request.
+
+    The services go back to the pool, and a refreshed access token is written
+    to the session, once the request is done. Returns None when the stored
+    credentials can no longer be refreshed, so the user has to authorize again.
     """
-    logger.info("Building Google Drive tree for parent_id='%s'", parent_id)
-    query = f"'{parent_id}' in parents and trashed = false"
+    from google.auth.exceptions import RefreshError
     try:
-        results = service.files().list(
-            q=query, fields="files(id, name, mimeType)", pageSize=1000).execute()
-        items = results.get('files', [])
-        logger.debug("Found %d items in folder '%s'", len(items), parent_id)
-    except Exception as e:
-        logger.error("Error listing files for parent_id='%s': %s", parent_id, e, exc_info=True)
-        return []
-    tree = []
-    for item in items:
-        node = {
-            'id': item['id'],
-            'name': item['name'],
-            'mimeType': item['mimeType']
-        }
-        if item['mimeType'] == 'application/vnd.google-apps.folder':
-            logger.debug("Recursing into subfolder '%s' (id=%s)", item['name'], item['id'])
-            node['children'] = get_drive_tree(service, item['id'])
-        tree.append(node)
-    logger.info("Completed building tree for parent_id='%s' (items: %d)", parent_id, len(tree))
-    return tree
+        lease = get_drive_client_pool().lease(session.get('username'), session['credentials'])
+    except RefreshError as e:
+        logger.warning("Google credentials for user '%s' could not be refreshed: %s", session.get('username'), e)
+        session.pop('credentials', None)
+        return None
+    g.setdefault('drive_leases', []).append(lease)
+    return lease
+
+
+@app.after_request
+def release_drive_leases(response):
+    for lease in g.pop('drive_leases', []):
+        lease.close()
+        updated = lease.updated_credentials()
+        if updated:
+            session['credentials'] = updated
+            logger.debug("Stored refreshed Google credentials for user '%s'", session.get('username'))
+    return response
+
+
+@app.teardown_request
+def close_drive_leases(exc):
+    # Only finds leases when the request failed before after_request ran.
+    for lease in g.pop('drive_leases', []):
+        lease.close()
 
 
 @app.route('/drive_tree_children/<folder_id>')
@@ -602,9 +592,12 @@ def drive_tree_children(folder_id):
     if 'credentials' not in session:
         logger.warning("No credentials in session for user: %s", session.get('username'))
         return ''
-    creds = Credentials.from_authorized_user_info(session['credentials'])
-    service = build('drive', 'v3', credentials=creds)
-    children = get_drive_tree(service, folder_id)
+    lease = open_drive_lease()
+    if lease is None:
+        return ''
+    # Uses the client, not the lease: a stale level is refreshed after the request has ended.
+    children = get_drive_tree_cache().get_children(
+        session.get('username'), folder_id, lambda: lease.client.call(lambda service: list_folder_children(service, folder_id)))
 
     def render_tree(nodes, parent_path=""):
         html = '<ul style="margin-left:20px">'
@@ -629,9 +622,12 @@ def drive_tree():
         logger.warning("No credentials in session for user: %s", session.get('username'))
         return redirect(url_for('authorize'))
 
-    creds = Credentials.from_authorized_user_info(session['credentials'])
-    service = build('drive', 'v3', credentials=creds)
-    tree = get_drive_tree(service)
+    lease = open_drive_lease()
+    if lease is None:
+        return redirect(url_for('authorize'))
+    # Only the top level is rendered; deeper levels are fetched as folders are expanded.
+    tree = get_drive_tree_cache().get_children(
+        session.get('username'), 'root', lambda: lease.client.call(lambda service: list_folder_children(service, 'root')))
 
     def render_tree(nodes, parent_path=""):
         html = '<ul>'
@@ -656,42 +652,6 @@ def drive_tree():
     return render_template("drive_tree.html", tree_html=tree_html)
 
 
-def list_all_files_in_folder(service, folder_id):
-    """
-    Recursively list all files in a Google Drive folder by folder_id.
-    Returns a list of dicts: [{id, name, modifiedTime}]
-    """
-    logger.info("Listing all files in Google Drive folder_id='%s'", folder_id)
-    files = []
-    page_token = None
-    try:
-        while True:
-            response = service.files().list(
-                q=f"'{folder_id}' in parents and trashed = false",
-                fields="nextPageToken, files(id, name, mimeType, modifiedTime)",
-                pageToken=page_token
-            ).execute()
-            logger.debug("Found %d items in folder '%s' (page_token=%s)", len(response.get('files', [])), folder_id, page_token)
-            for file in response.get('files', []):
-                if file['mimeType'] == 'application/vnd.google-apps.folder':
-                    logger.debug("Recursing into subfolder '%s' (id=%s)", file['name'], file['id'])
-                    files.extend(list_all_files_in_folder(service, file['id']))
-                else:
-                    files.append({
-                        'id': file['id'],
-                        'name': file['name'],
-                        'mimeType': file['mimeType'],
-                        'modifiedTime': file.get('modifiedTime', '')
-                    })
-            page_token = response.get('nextPageToken', None)
-            if not page_token:
-                break
-        logger.info("Completed listing files for folder_id='%s' (total files: %d)", folder_id, len(files))
-    except Exception as e:
-        logger.error("Error listing files in folder_id='%s': %s", folder_id, e, exc_info=True)
-    return files
-
-
 def render_files_table(files):
     if not files:
         logger.info("No files found to render in files table.")
@@ -711,17 +671,22 @@ def confirm_folder():
     if 'credentials' not in session:
         logger.warning("No credentials in session for user: %s", session.get('username'))
         return '<p>Not authorized.</p>', 401
-    creds = Credentials.from_authorized_user_info(session['credentials'])
-    service = build('drive', 'v3', credentials=creds)
+    lease = open_drive_lease()
+    if lease is None:
+        return '<p>Not authorized.</p>', 401
+    service = lease.service
     data = request.get_json()
     folder_id = data.get('folder_id')
     if not folder_id:
         logger.warning("No folder_id provided in confirm_folder request (user: %s)", session.get('username'))
         return '<p>No folder selected.</p>', 400
-    files = list_all_files_in_folder(service, folder_id)
     try:
-        upsert_drive_files_sqlalchemy(files)  # Use the new SQLAlchemy function
-        logger.info("Upserted %d drive files into database for folder_id='%s' (user: %s)", len(files), folder_id, session.get('username'))
+        files = list_all_files_in_folder(service, folder_id, service_factory=lease.new_service)
+    except Exception as e:
+        return f"<p>Error listing the folder: {e}</p>", 502
+    try:
+        counts = upsert_drive_files_sqlalchemy(files, folder_id)
+        logger.info("Synced %d drive files into database for folder_id='%s' (user: %s): %s", len(files), folder_id, session.get('username'), counts)
     except Exception as e:
         logger.error("Error upserting drive files for folder_id='%s' (user: %s): %s", folder_id, session.get('username'), e, exc_info=True)
         return f"<p>Error updating database: {e}</p>", 500
@@ -741,8 +706,10 @@ def extract_text_from_drive_folder():
         logger.warning("No folder_id provided in request by user: %s", session.get('username'))
         return "Please provide a 'folder_id' query parameter.", 400
 
-    creds = Credentials.from_authorized_user_info(session['credentials'])
-    service = build('drive', 'v3', credentials=creds)
+    lease = open_drive_lease()
+    if lease is None:
+        return redirect(url_for('authorize'))
+    service = lease.service
 
     try:
         logger.info("Fetching metadata for folder_id='%s'", folder_id)
@@ -756,114 +723,11 @@ def extract_text_from_drive_folder():
         logger.error("Invalid folder_id or error accessing folder: %s (user: %s)", e, session.get('username'), exc_info=True)
         return f"Invalid folder_id or error accessing folder: {e}", 400
 
-    all_files_in_folder = list_all_files_in_folder(service, folder_id)
-    pdf_files_found = False
-    extracted_texts_summary = []
-
-    logger.info("Starting PDF text extraction for folder ID: %s", folder_id)
-    db_files = get_all_drive_files()  # {name: (last_edited, id)}
-    current_drive_file_names = set()
-    current_drive_file_ids = set()
-    for file_item in all_files_in_folder:
-        if file_item.get('mimeType') == 'application/pdf':
-            current_drive_file_names.add(file_item['name'])
-            current_drive_file_ids.add(file_item['id'])
-    db_file_names = set(db_files.keys())
-    for db_name, (db_last_edited, db_id) in db_files.items():
-        if db_name not in current_drive_file_names:
-            logger.info("File '%s' (id=%s) deleted from Drive. Removing from database...", db_name, db_id)
-            delete_po_by_drive_file_id(db_id)
-    for file_item in all_files_in_folder:
-        if file_item.get('mimeType') != 'application/pdf':
-            continue
-        file_name = file_item['name']
-        file_id = file_item['id']
-        file_last_edited = file_item.get('modifiedTime')
-        from datetime import datetime
-        file_last_edited_dt = None
-        if file_last_edited:
-            try:
-                if file_last_edited.endswith('Z'):
-                    file_last_edited_dt = datetime.fromisoformat(
-                        file_last_edited[:-1] + '+00:00')
-                else:
-                    file_last_edited_dt = datetime.fromisoformat(
-                        file_last_edited)
-            except Exception:
-                logger.warning("Could not parse modifiedTime for file '%s' (id=%s)", file_name, file_id)
-        db_entry = db_files.get(file_name)
-        if db_entry:
-            db_last_edited, db_id = db_entry
-            if db_last_edited == file_last_edited_dt:
-                logger.info("Skipping %s (unchanged)", file_name)
-                continue  # Skip unchanged
-            else:
-                logger.info("Updating %s (timestamp changed)", file_name)
-                delete_po_by_drive_file_id(file_id)
-        else:
-            logger.info("Adding new file %s", file_name)
-        try:
-            logger.info("Downloading file '%s' (id=%s)", file_name, file_id)
-            request_file = service.files().get_media(fileId=file_item['id'])
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request_file)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            fh.seek(0)
-            temp_pdf_path = None
-            try:
-                temp_dir = tempfile.gettempdir()
-                temp_pdf_filename = f"temp_drive_pdf_{file_item['id']}_{os.urandom(4).hex()}.pdf"
-                temp_pdf_path = os.path.join(temp_dir, temp_pdf_filename)
-                with open(temp_pdf_path, 'wb') as f_temp:
-                    f_temp.write(fh.getvalue())
-                logger.info("Saved PDF content for %s to temporary file: %s", file_name, temp_pdf_path)
-                logger.info("Running extraction pipeline for %s...", file_name)
-                po_json_data_for_db = run_pipeline(temp_pdf_path)
-                if po_json_data_for_db:
-                    insert_or_replace_po(po_json_data_for_db)
-                    logger.info("Successfully inserted/replaced PO data for %s into database.", file_name)
-                    extracted_texts_summary.append(
-                        f"Inserted/replaced PO data for: {file_name}")
-                else:
-                    logger.warning("No data extracted from %s. Skipping database insertion for this file.", file_name)
-                    extracted_texts_summary.append(
-                        f"No data extracted from {file_name}. DB insert skipped.")
-            finally:
-                if temp_pdf_path and os.path.exists(temp_pdf_path):
-                    logger.info("Deleting temporary file: %s", temp_pdf_path)
-                    os.remove(temp_pdf_path)
-        except Exception as error:
-            error_message = f"Error processing file {file_name} (ID: {file_id}): {error}"
-            logger.error(error_message, exc_info=True)
-            extracted_texts_summary.append(
-                f"Error processing: {file_name} - {error}")
-        finally:
-            if fh:
-                fh.close()
-        pdf_files_found = True
-
-    logger.info("Finished processing folder ID: %s", folder_id)
-    logger.info("Exporting Data to JSON and CSV...")
-    from extractor.export import export_all_pos_json, export_all_csvs
-    export_all_pos_json()
-    export_all_csvs()
-    logger.info("Data Export Complete.")
-    logger.info("Generating Financial Forecast...")
-    run_forecast_processing(input_json_path=LLM_OUTPUT_DIR / "purchase_orders.json",)
-    logger.info("Financial Forecast Generation Complete.")
-    logger.info("All processes finished successfully!")
-
-    if not pdf_files_found:
-        message = f"No PDF files found in the specified folder '{folder_metadata.get('name')}' (ID: {folder_id})."
-        logger.warning(message)
-        return message
-    else:
-        response_message = f"PDF text extraction process initiated for folder '{folder_metadata.get('name')}' (ID: {folder_id}). Check your terminal for output. Summary of processed files:<br>"
-        response_message += "<br>".join(extracted_texts_summary)
-        logger.info("PDF text extraction summary for folder '%s': %s", folder_metadata.get('name'), extracted_texts_summary)
-        return response_message
+    from app.services.jobs import enqueue_drive_sync
+    job_id = enqueue_drive_sync(session.get('username'), folder_id, folder_metadata.get('name'), credentials_to_dict(lease.client.credentials))
+    logger.info("Queued sync job %s for folder '%s' (ID: %s)", job_id, folder_metadata.get('name'), folder_id)
+    progress_url = url_for('job_progress', job_id=job_id)
+    return f"PDF extraction for folder '{folder_metadata.get('name')}' (ID: {folder_id}) is running in the background as job {job_id}. Progress: <a href=\"{progress_url}\">{progress_url}</a>"
 
 
 @app.route('/edit_po/<po_id>', methods=['GET', 'POST'])
@@ -963,6 +827,42 @@ def edit_po(po_id):
     return render_template('edit_po.html', po=po)
 
 
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_progress(job_id):
+    """Status and per-file progress of a background sync job, polled by the Drive upload page."""
+    from app.services.jobs import get_job_progress
+    job = get_job_progress(job_id)
+    if job is None or job['user'] != session.get('username'):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/llm_usage')
+@login_required
+def llm_usage():
+    """Per-backend LLM usage (requests, tokens, rate limits) for the scheduler's key pool."""
+    from extractor.llm_client import get_llm_usage
+    try:
+        usage = get_llm_usage()
+    except Exception as e:
+        # The scheduler cannot be built, e.g. no API key is configured.
+        logger.warning("LLM usage unavailable: %s", e)
+        return jsonify({"backends": [], "error": f"LLM backends are not configured: {e}"}), 503
+    logger.debug("Reporting LLM usage for %d backend(s) (user: %s)", len(usage), session.get('username'))
+    return jsonify({"backends": usage})
+
+
+@app.route('/diagnostics/sql')
+@login_required
+def sql_diagnostics():
+    """Query counts and database time per route and background job, with recent profiles and suspected N+1 patterns."""
+    from db.profiling import get_sql_diagnostics
+    diagnostics = get_sql_diagnostics()
+    logger.debug("Reporting SQL diagnostics for %d route(s) (user: %s)", len(diagnostics["routes"]), session.get('username'))
+    return jsonify(diagnostics)
+
+
 @app.route('/refresh_charts')
 @login_required
 def refresh_charts():
@@ -1011,13 +911,15 @@ def drive_folder_upload():
     if 'credentials' not in session:
         logger.warning("No credentials in session for user: %s", session.get('username'))
         return redirect(url_for('authorize'))
-    creds = Credentials.from_authorized_user_info(session['credentials'])
-    service = build('drive', 'v3', credentials=creds)
+    lease = open_drive_lease()
+    if lease is None:
+        return redirect(url_for('authorize'))
+    service = lease.service
     error = None
     pdf_files = []
     folder_id = None
     folder_url = ''
-    llm_summary = None
+    job_id = request.args.get('job_id', type=int)
     if request.method == 'POST':
         logger.info("Received POST request to /drive_folder_upload from user '%s'", session.get('username'))
         folder_url = request.form.get('folder_url', '').strip()
@@ -1046,88 +948,28 @@ def drive_folder_upload():
                     logger.info("Accessing folder: %s (ID: %s)", folder_metadata.get('name'), folder_id)
                     response = service.files().list(
                         q=f"'{folder_id}' in parents and trashed = false and mimeType = 'application/pdf'",
-                        fields="files(id, name, modifiedTime)",
+                        fields="files(id, name, modifiedTime, size)",
                     ).execute()
                     pdf_files = response.get('files', [])
                     logger.info("Found %d PDF files in folder '%s' (ID: %s)", len(pdf_files), folder_metadata.get('name'), folder_id)
                     # --- Store drive file details if Confirm Folder is clicked ---
                     if request.form.get('confirm_folder'):
                         logger.info("User '%s' confirmed folder '%s' (ID: %s)", session.get('username'), folder_metadata.get('name'), folder_id)
-                        all_files_in_folder = list_all_files_in_folder(service, folder_id)
+                        all_files_in_folder = list_all_files_in_folder(service, folder_id, service_factory=lease.new_service)
                         from db.crud import upsert_drive_files_sqlalchemy
-                        upsert_drive_files_sqlalchemy(all_files_in_folder)
-                        logger.info("Upserted %d files from Drive folder '%s' (ID: %s) into database.", len(all_files_in_folder), folder_metadata.get('name'), folder_id)
+                        counts = upsert_drive_files_sqlalchemy(all_files_in_folder, folder_id)
+                        logger.info("Synced %d files from Drive folder '%s' (ID: %s) into database: %s", len(all_files_in_folder), folder_metadata.get('name'), folder_id, counts)
                     if run_llm and pdf_files:
                         logger.info("User '%s' initiated LLM extraction for folder '%s' (ID: %s)", session.get('username'), folder_metadata.get('name'), folder_id)
-                        # --- Get all files in Drive (recursively) ---
-                        all_files_in_folder = list_all_files_in_folder(service, folder_id)
-                        pdfs = [f for f in all_files_in_folder if f.get('mimeType') == 'application/pdf']
-                        extracted_texts_summary = []
-                        # Get all files in DB (by file ID)
-                        db_files = get_all_drive_files()  # {name: (last_edited, id)}
-                        db_file_ids = set(db_id for (_, db_id) in db_files.values())
-                        for file_item in pdfs:
-                            file_name = file_item['name']
-                            file_id = file_item['id']
-                            # Only process if file_id not in DB
-                            if file_id in db_file_ids:
-                                logger.info("Skipped (already processed): %s", file_name)
-                                extracted_texts_summary.append(f"Skipped (already processed): {file_name}")
-                                continue
-                            try:
-                                logger.info("Downloading file '%s' (id=%s)", file_name, file_id)
-                                request_file = service.files().get_media(fileId=file_id)
-                                fh = io.BytesIO()
-                                downloader = MediaIoBaseDownload(fh, request_file)
-                                done = False
-                                while not done:
-                                    status, done = downloader.next_chunk()
-                                fh.seek(0)
-                                temp_pdf_path = None
-                                try:
-                                    temp_dir = tempfile.gettempdir()
-                                    temp_pdf_filename = f"temp_drive_pdf_{file_id}_{os.urandom(4).hex()}.pdf"
-                                    temp_pdf_path = os.path.join(temp_dir, temp_pdf_filename)
-                                    with open(temp_pdf_path, 'wb') as f_temp:
-                                        f_temp.write(fh.getvalue())
-                                    logger.info("Saved PDF content for %s to temporary file: %s", file_name, temp_pdf_path)
-                                    logger.info("Running extraction pipeline for %s...", file_name)
-                                    po_json_data_for_db = run_pipeline(temp_pdf_path)
-                                    if po_json_data_for_db:
-                                        insert_or_replace_po(po_json_data_for_db)
-                                        logger.info("Inserted/replaced PO data for: %s", file_name)
-                                        extracted_texts_summary.append(f"Inserted/replaced PO data for: {file_name}")
-                                    else:
-                                        logger.warning("No data extracted from %s. DB insert skipped.", file_name)
-                                        extracted_texts_summary.append(f"No data extracted from {file_name}. DB insert skipped.")
-                                finally:
-                                    if temp_pdf_path and os.path.exists(temp_pdf_path):
-                                        logger.info("Deleting temporary file: %s", temp_pdf_path)
-                                        os.remove(temp_pdf_path)
-                            except Exception as error:
-                                logger.error("Error processing file %s (ID: %s): %s", file_name, file_id, error, exc_info=True)
-                                extracted_texts_summary.append(f"Error processing: {file_name} - {error}")
-                            finally:
-                                if fh:
-                                    fh.close()
-                        # --- Update drive_files table after processing ---
-                        from db.crud import upsert_drive_files_sqlalchemy
-                        upsert_drive_files_sqlalchemy(all_files_in_folder)
-                        logger.info("Upserted %d files from Drive folder '%s' (ID: %s) after LLM extraction.", len(all_files_in_folder), folder_metadata.get('name'), folder_id)
-                        from extractor.export import export_all_pos_json, export_all_csvs
-                        from forecast_processor import run_forecast_processing
-                        logger.info("Exporting all POs to JSON and CSV after LLM extraction...")
-                        export_all_pos_json()
-                        export_all_csvs()
-                        logger.info("Running forecast processing after LLM extraction...")
-                        run_forecast_processing(input_json_path=LLM_OUTPUT_DIR / "purchase_orders.json",)
-                        logger.info("LLM extraction and forecast processing complete for folder '%s' (ID: %s)", folder_metadata.get('name'), folder_id)
-                        llm_summary = extracted_texts_summary
+                        from app.services.jobs import enqueue_drive_sync
+                        # The sync runs on a background worker; the page polls /jobs/<id> for progress.
+                        job_id = enqueue_drive_sync(session.get('username'), folder_id, folder_metadata.get('name'), credentials_to_dict(lease.client.credentials))
+                        logger.info("Queued sync job %s for folder '%s' (ID: %s)", job_id, folder_metadata.get('name'), folder_id)
             except Exception as e:
                 logger.error("Invalid folder link or error accessing folder '%s': %s", folder_id, e, exc_info=True)
                 error = f"Invalid folder link or error accessing folder: {e}"
                 folder_id = None
-    return render_template('drive_folder_upload.html', error=error, pdf_files=pdf_files, folder_id=folder_id, folder_url=folder_url, llm_summary=llm_summary)
+    return render_template('drive_folder_upload.html', error=error, pdf_files=pdf_files, folder_id=folder_id, folder_url=folder_url, job_id=job_id)
 
 def generate_unconfirmed_po_id():
     logger.debug("Generating new unconfirmed PO ID.")
@@ -1304,6 +1146,14 @@ def restore_backup():
         flash(f"❌ Restore failed: {e}", "danger")
     return redirect(url_for("forecast"))
 
+# Modules that should only load on first use; any listed at start-up are reported.
+LAZY_MODULES = ("pandas", "numpy", "fitz", "pdfplumber", "langchain_core", "googleapiclient", "openpyxl")
+logger.info(
+    "App module loaded in %.0f ms (eagerly loaded heavy modules: %s)",
+    (time.perf_counter() - _startup_started) * 1000,
+    ", ".join(m for m in LAZY_MODULES if m in sys.modules) or "none",
+)
+
 if __name__ == '__main__':
     init_db()
     app.run(host="0.0.0.0", debug=True)
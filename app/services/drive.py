@@ -0,0 +1,162 @@
+import os
+import queue
+import tempfile
+from pathlib import Path
+from typing import Optional
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+# The Google API client is imported on first use to keep app start-up fast.
+
+
+def credentials_from_session(creds_dict: dict):
+    """Builds OAuth credentials from the dict stored in the Flask session."""
+    from google.oauth2.credentials import Credentials
+    return Credentials.from_authorized_user_info(creds_dict)
+
+
+def get_download_settings() -> dict:
+    """
+    Returns the Drive download tuning options.
+
+    Read from DRIVE_DOWNLOAD_CHUNK_MB (default 4; size of each ranged request)
+    and DRIVE_DOWNLOAD_MEMORY_MB (default 64; larger files are spilled to a
+    temporary file instead of being held in memory).
+    """
+    return {
+        "chunk_bytes": max(256 * 1024, int(float(os.getenv("DRIVE_DOWNLOAD_CHUNK_MB", "4")) * 1024 * 1024)),
+        "memory_bytes": int(float(os.getenv("DRIVE_DOWNLOAD_MEMORY_MB", "64")) * 1024 * 1024),
+    }
+
+
+class DownloadBuffer:
+    """
+    A reusable write target for Drive downloads.
+
+    Chunks are written into one bytearray that keeps its capacity between
+    downloads. Once a file grows past max_memory_bytes, the content moves to a
+    temporary file, so a very large attachment never sits in memory whole.
+    source() hands the content to the parser as a zero-copy memoryview, or as
+    the temporary file's path.
+    """
+
+    def __init__(self, max_memory_bytes: int):
+        self.max_memory_bytes = max_memory_bytes
+        self._data = bytearray()
+        self._length = 0
+        self._view = None
+        self._spill = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill is not None
+
+    def reset(self, expected_size: Optional[int] = None) -> None:
+        """Empties the buffer for the next download, pre-sizing it when the file size is known."""
+        self.release()
+        if expected_size and expected_size > self.max_memory_bytes:
+            self._start_spill()
+        elif expected_size and expected_size > len(self._data):
+            self._grow(expected_size)
+
+    def _grow(self, capacity: int) -> None:
+        try:
+            self._data.extend(bytes(capacity - len(self._data)))
+        except BufferError:
+            # A parser still holds a view of the old array; continue in a new one.
+            data = bytearray(capacity)
+            data[:self._length] = self._data[:self._length]
+            self._data = data
+
+    def _start_spill(self) -> None:
+        self._spill = tempfile.NamedTemporaryFile(prefix="drive-", suffix=".pdf", delete=False)
+        self._spill.write(memoryview(self._data)[:self._length])
+        logger.info(f"Download exceeds {self.max_memory_bytes} bytes; spilling to {self._spill.name}")
+
+    def write(self, chunk) -> int:
+        size = len(chunk)
+        if self._spill is None and self._length + size > self.max_memory_bytes:
+            self._start_spill()
+        if self._spill is not None:
+            self._spill.write(chunk)
+        else:
+            end = self._length + size
+            if end > len(self._data):
+                self._grow(max(end, 2 * len(self._data)))
+            self._data[self._length:end] = chunk
+        self._length += size
+        return size
+
+    def source(self):
+        """Returns the downloaded content as a memoryview, or the path of the spilled file."""
+        if self._spill is not None:
+            self._spill.flush()
+            return Path(self._spill.name)
+        if self._view is None:
+            self._view = memoryview(self._data)[:self._length]
+        return self._view
+
+    def release(self) -> None:
+        """Drops the view handed out by source() and deletes any spilled file."""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._spill is not None:
+            self._spill.close()
+            Path(self._spill.name).unlink(missing_ok=True)
+            self._spill = None
+        self._length = 0
+
+
+class DownloadBufferPool:
+    """
+    A fixed set of DownloadBuffers shared by the download and parse stages.
+
+    acquire() blocks while every buffer is in use, so at most `size` downloads
+    are held at once and peak memory stays within size * max_memory_bytes.
+    """
+
+    def __init__(self, size: int, max_memory_bytes: int):
+        self._buffers = queue.LifoQueue()
+        for _ in range(size):
+            self._buffers.put(DownloadBuffer(max_memory_bytes))
+
+    def acquire(self) -> DownloadBuffer:
+        return self._buffers.get()
+
+    def release(self, buffer: DownloadBuffer) -> None:
+        try:
+            buffer.release()
+        finally:
+            self._buffers.put(buffer)
+
+
+def download_to_buffer(service, file_id: str, buffer: DownloadBuffer, chunk_size: Optional[int] = None, expected_size: Optional[int] = None) -> DownloadBuffer:
+    """
+    Streams a Drive file into a download buffer in ranged chunks.
+
+    Args:
+        service: A Drive v3 service object.
+        file_id: The Drive file ID.
+        buffer: The buffer to fill; it is reset first.
+        chunk_size: Bytes per request. Defaults to DRIVE_DOWNLOAD_CHUNK_MB.
+        expected_size: The file size from Drive metadata, if known, so the
+            buffer can be sized (or spilled) up front.
+
+    Returns:
+        DownloadBuffer: The filled buffer; pass buffer.source() to the parser.
+    """
+    from googleapiclient.http import MediaIoBaseDownload
+    chunk_size = chunk_size or get_download_settings()["chunk_bytes"]
+    buffer.reset(int(expected_size) if expected_size else None)
+    request_file = service.files().get_media(fileId=file_id)
+    downloader = MediaIoBaseDownload(buffer, request_file, chunksize=chunk_size)
+    done = False
+    while not done:
+        status, done = downloader.next_chunk()
+    logger.debug(f"Downloaded {len(buffer)} bytes for file {file_id} ({'on disk' if buffer.spilled else 'in memory'})")
+    return buffer
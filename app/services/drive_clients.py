@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+CLIENT_SECRETS_FILE = 'client_secret.json'
+
+_discovery = None
+_discovery_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_client_pool_settings() -> dict:
+    """
+    Returns the Drive client pool options.
+
+    Read from DRIVE_CLIENT_MAX_IDLE (default 8; idle service objects kept per
+    user), DRIVE_CLIENT_MAX_USERS (default 50; least recently used users are
+    dropped beyond this), DRIVE_CLIENT_IDLE_SECONDS (default 1800; a user's
+    clients are dropped after this long unused), DRIVE_TOKEN_REFRESH_MARGIN_SECONDS
+    (default 300; access tokens are refreshed when they expire within this
+    long) and DRIVE_HTTP_TIMEOUT_SECONDS (default 60).
+    """
+    return {
+        "max_idle": max(1, int(os.getenv("DRIVE_CLIENT_MAX_IDLE", "8"))),
+        "max_users": max(1, int(os.getenv("DRIVE_CLIENT_MAX_USERS", "50"))),
+        "idle_seconds": float(os.getenv("DRIVE_CLIENT_IDLE_SECONDS", "1800")),
+        "refresh_margin_seconds": float(os.getenv("DRIVE_TOKEN_REFRESH_MARGIN_SECONDS", "300")),
+        "http_timeout_seconds": float(os.getenv("DRIVE_HTTP_TIMEOUT_SECONDS", "60")),
+    }
+
+
+def get_discovery_document() -> dict:
+    """
+    Returns the parsed Drive v3 discovery document, loaded once per process.
+
+    The document is read from DRIVE_DISCOVERY_FILE when set, otherwise from
+    the static copy shipped with google-api-python-client, so building a
+    service never fetches or re-parses it.
+    """
+    global _discovery
+    with _discovery_lock:
+        if _discovery is None:
+            path = os.getenv("DRIVE_DISCOVERY_FILE")
+            if path:
+                with open(path, "r", encoding="utf-8") as f:
+                    _discovery = json.load(f)
+            else:
+                from googleapiclient.discovery_cache import get_static_doc
+                _discovery = json.loads(get_static_doc("drive", "v3"))
+            logger.info(f"Loaded Drive discovery document ({'file ' + path if path else 'bundled copy'})")
+    return _discovery
+
+
+def credentials_to_dict(creds) -> dict:
+    """Turns OAuth credentials into the dict stored in the Flask session, expiry included."""
+    return {
+        'token': creds.token,
+        'refresh_token': creds.refresh_token,
+        'token_uri': creds.token_uri,
+        'client_id': creds.client_id,
+        'client_secret': creds.client_secret,
+        'scopes': creds.scopes,
+        'expiry': creds.expiry.isoformat() + 'Z' if creds.expiry else None,
+    }
+
+
+def load_client_config(path: str = CLIENT_SECRETS_FILE) -> dict:
+    """Returns the OAuth client (client_id, client_secret, token_uri, ...) from the app's client secrets file."""
+    with open(path) as f:
+        config = json.load(f)
+    return config.get('web') or config['installed']
+
+
+def with_client_secret(creds_dict: dict) -> dict:
+    """Adds the app's client secret to credentials stored without it (see enqueue_sync_job)."""
+    return dict(creds_dict, client_secret=load_client_config()['client_secret'])
+
+
+class DriveClient:
+    """
+    One user's Drive credentials and their idle service objects.
+
+    Service objects are not thread-safe, so each is used by one thread at a
+    time: acquire() hands out an idle one (or builds one from the cached
+    discovery document) and release() puts it back. Every service has its own
+    authorized httplib2 session, whose keep-alive connections are reused by
+    the next request that picks it up. All of them share the credentials, so a
+    refreshed token is seen by every service at once.
+    """
+
+    def __init__(self, credentials, settings: dict):
+        self.credentials = credentials
+        self.settings = settings
+        self.last_used = time.monotonic()
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def ensure_fresh(self) -> bool:
+        """Refreshes the access token when it expires within the refresh margin. Returns True if it did."""
+        from google.auth.transport.requests import Request
+        margin = timedelta(seconds=self.settings["refresh_margin_seconds"])
+        with self._lock:
+            expiry = self.credentials.expiry  # naive UTC, as google-auth stores it
+            if self.credentials.token and expiry and expiry - margin > datetime.now(timezone.utc).replace(tzinfo=None):
+                return False
+            self.credentials.refresh(Request())
+        logger.info(f"Refreshed Drive access token (valid until {self.credentials.expiry})")
+        return True
+
+    def _build(self):
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build_from_document
+        http = AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.settings["http_timeout_seconds"]))
+        return build_from_document(get_discovery_document(), http=http)
+
+    def acquire(self):
+        with self._lock:
+            self.last_used = time.monotonic()
+            if self._idle:
+                return self._idle.pop()
+        return self._build()
+
+    def release(self, service) -> None:
+        with self._lock:
+            if len(self._idle) < self.settings["max_idle"]:
+                self._idle.append(service)
+                return
+        service.close()
+
+    def call(self, fn):
+        """Runs fn(service) with one of the client's services, for work that may outlive the request."""
+        service = self.acquire()
+        try:
+            return fn(service)
+        finally:
+            self.release(service)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for service in idle:
+            service.close()
+
+
+class DriveLease:
+    """
+    The Drive services one request (or job) is using.
+
+    `service` is for the calling thread; new_service() hands further services
+    to worker threads. close() returns all of them to the user's client.
+    """
+
+    def __init__(self, client: DriveClient, session_credentials: dict):
+        self.client = client
+        self._session_credentials = session_credentials
+        self._services = []
+        self._lock = threading.Lock()
+        self.service = self.new_service()
+
+    def new_service(self):
+        service = self.client.acquire()
+        with self._lock:
+            self._services.append(service)
+        return service
+
+    def updated_credentials(self) -> Optional[dict]:
+        """
+        Returns the credentials dict to store in the session if the token was
+        refreshed (or the session has no expiry yet), else None.
+        """
+        if self.client.credentials.token != self._session_credentials.get('token') or not self._session_credentials.get('expiry'):
+            return credentials_to_dict(self.client.credentials)
+        return None
+
+    def close(self) -> None:
+        with self._lock:
+            services, self._services = self._services, []
+        for service in services:
+            self.client.release(service)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class DriveClientPool:
+    """Keeps one DriveClient per user across requests (least recently used users are dropped)."""
+
+    def __init__(self, settings: dict):
+        self.settings = settings
+        self._clients = OrderedDict()  # user -> DriveClient
+        self._lock = threading.Lock()
+        self.stats = {"clients_built": 0, "leases": 0, "token_refreshes": 0}
+
+    def get_client(self, user: str, creds_dict: dict) -> DriveClient:
+        """
+        Returns the user's client, building it from the session credentials
+        when there is none or the user has authorized again since.
+        """
+        now = time.monotonic()
+        with self._lock:
+            client = self._clients.get(user)
+            if client is not None and (
+                now - client.last_used > self.settings["idle_seconds"]
+                or client.credentials.refresh_token != creds_dict.get('refresh_token')
+                or client.credentials.client_id != creds_dict.get('client_id')
+            ):
+                self._clients.pop(user)
+                client.close()
+                client = None
+            if client is None:
+                from google.oauth2.credentials import Credentials
+                client = DriveClient(Credentials.from_authorized_user_info(creds_dict), self.settings)
+                self._clients[user] = client
+                self.stats["clients_built"] += 1
+                logger.info(f"Created Drive client for user {user}")
+            self._clients.move_to_end(user)
+            while len(self._clients) > self.settings["max_users"]:
+                _, evicted = self._clients.popitem(last=False)
+                evicted.close()
+        return client
+
+    def lease(self, user: str, creds_dict: dict) -> DriveLease:
+        """
+        Hands out Drive services for one request, refreshing the user's access
+        token first if it is about to expire. Use as a context manager, and
+        store lease.updated_credentials() in the session when it is not None.
+        """
+        client = self.get_client(user, creds_dict)
+        if client.ensure_fresh():
+            with self._lock:
+                self.stats["token_refreshes"] += 1
+        with self._lock:
+            self.stats["leases"] += 1
+        return DriveLease(client, creds_dict)
+
+    def evict(self, user: str) -> None:
+        """Drops a user's client, e.g. on logout."""
+        with self._lock:
+            client = self._clients.pop(user, None)
+        if client is not None:
+            client.close()
+
+
+def get_drive_client_pool() -> DriveClientPool:
+    """Returns the process-wide Drive client pool (see get_client_pool_settings)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DriveClientPool(get_client_pool_settings())
+    return _pool
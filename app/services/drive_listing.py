@@ -0,0 +1,175 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+TREE_FIELDS = "nextPageToken, files(id, name, mimeType, parents)"
+FILE_FIELDS = "nextPageToken, files(id, name, mimeType, modifiedTime, size, md5Checksum, parents)"
+
+
+def get_listing_settings() -> dict:
+    """
+    Returns the Drive folder listing options.
+
+    Read from DRIVE_LIST_PARENTS_PER_QUERY (default 30; folders combined into
+    one files().list query) and DRIVE_LIST_WORKERS (default 4; queries of one
+    tree level run concurrently).
+    """
+    return {
+        "parents_per_query": max(1, int(os.getenv("DRIVE_LIST_PARENTS_PER_QUERY", "30"))),
+        "workers": max(1, int(os.getenv("DRIVE_LIST_WORKERS", "4"))),
+    }
+
+
+def _list_children(service, parent_ids: List[str], fields: str) -> List[dict]:
+    """Lists the non-trashed children of several folders with one paged query."""
+    parents = " or ".join(f"'{parent_id}' in parents" for parent_id in parent_ids)
+    items = []
+    page_token = None
+    while True:
+        response = service.files().list(
+            q=f"({parents}) and trashed = false",
+            fields=fields,
+            pageSize=1000,
+            pageToken=page_token,
+        ).execute()
+        items.extend(response.get('files', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return items
+
+
+def list_folder_children(service, folder_id: str) -> List[dict]:
+    """Lists one level of a folder as {id, name, mimeType} nodes, for the folder picker."""
+    items = _list_children(service, [folder_id], TREE_FIELDS)
+    return [{'id': item['id'], 'name': item['name'], 'mimeType': item['mimeType']} for item in items]
+
+
+def walk_folder_tree(service, root_id: str, fields: str = FILE_FIELDS, service_factory: Optional[Callable[[], object]] = None) -> Dict[str, List[dict]]:
+    """
+    Lists a Drive folder tree breadth-first, one level at a time.
+
+    Each level's folders are combined into queries of up to
+    DRIVE_LIST_PARENTS_PER_QUERY parents ('a' in parents or 'b' in parents
+    ...), so a deep hierarchy costs a few queries per level instead of one per
+    folder. With a service_factory, a level's queries run concurrently on up
+    to DRIVE_LIST_WORKERS threads, each with its own service object (they are
+    not thread-safe).
+
+    Args:
+        service: A Drive v3 service object.
+        root_id: The folder to list.
+        fields: The files().list fields; must include parents.
+        service_factory: Builds a Drive service for a worker thread.
+
+    Returns:
+        Dict[str, List[dict]]: The children of every folder in the tree, by
+        folder ID, in the order Drive returned them.
+    """
+    settings = get_listing_settings()
+    children: Dict[str, List[dict]] = {root_id: []}
+    level = [root_id]
+    local = threading.local()
+
+    def list_chunk(parent_ids: List[str]) -> List[dict]:
+        if service_factory is None:
+            return _list_children(service, parent_ids, fields)
+        if not hasattr(local, "service"):
+            local.service = service_factory()
+        return _list_children(local.service, parent_ids, fields)
+
+    executor = ThreadPoolExecutor(max_workers=settings["workers"]) if service_factory and settings["workers"] > 1 else None
+    try:
+        depth = 0
+        while level:
+            size = settings["parents_per_query"]
+            chunks = [level[i:i + size] for i in range(0, len(level), size)]
+            results = list(executor.map(list_chunk, chunks)) if executor and len(chunks) > 1 else [list_chunk(chunk) for chunk in chunks]
+            next_level = []
+            for chunk, items in zip(chunks, results):
+                chunk_ids = set(chunk)
+                for item in items:
+                    # A single-folder query may use an alias such as 'root', which
+                    # Drive does not echo back in 'parents'.
+                    parent_ids = chunk if len(chunk) == 1 else [p for p in item.get('parents', []) if p in chunk_ids]
+                    for parent_id in parent_ids:
+                        children[parent_id].append(item)
+                    if item['mimeType'] == FOLDER_MIME_TYPE and item['id'] not in children:
+                        children[item['id']] = []
+                        next_level.append(item['id'])
+            logger.debug(f"Listed level {depth} of folder {root_id}: {len(level)} folders in {len(chunks)} queries")
+            level = next_level
+            depth += 1
+    finally:
+        if executor:
+            executor.shutdown(wait=False)
+    return children
+
+
+def list_all_files_in_folder(service, folder_id, folder_ids=None, service_factory=None):
+    """
+    Lists all files in a Google Drive folder and its subfolders.
+    Returns a list of dicts: [{id, name, mimeType, modifiedTime, size,
+    md5Checksum}], in depth-first order.
+    If a set is passed as folder_ids, the IDs of all subfolders are added to it.
+    Listing errors are raised: callers that sync the result must not take a
+    failed listing for an empty folder.
+    """
+    logger.info(f"Listing all files in Google Drive folder_id='{folder_id}'")
+    try:
+        children = walk_folder_tree(service, folder_id, FILE_FIELDS, service_factory)
+    except Exception as e:
+        logger.error(f"Error listing files in folder_id='{folder_id}': {e}", exc_info=True)
+        raise
+
+    files = []
+
+    def collect(parent_id):
+        for item in children.get(parent_id, []):
+            if item['mimeType'] == FOLDER_MIME_TYPE:
+                if folder_ids is not None:
+                    folder_ids.add(item['id'])
+                collect(item['id'])
+            else:
+                files.append({
+                    'id': item['id'],
+                    'name': item['name'],
+                    'mimeType': item['mimeType'],
+                    'modifiedTime': item.get('modifiedTime', ''),
+                    'size': item.get('size'),
+                    'md5Checksum': item.get('md5Checksum'),
+                })
+
+    collect(folder_id)
+    logger.info(f"Completed listing files for folder_id='{folder_id}' (total files: {len(files)}, folders: {len(children)})")
+    return files
+
+
+def get_drive_tree(service, parent_id='root', service_factory=None):
+    """
+    Builds a tree of files/folders from Google Drive.
+    Returns a nested list of {id, name, mimeType} nodes; folders also have 'children'.
+    """
+    logger.info(f"Building Google Drive tree for parent_id='{parent_id}'")
+    try:
+        children = walk_folder_tree(service, parent_id, TREE_FIELDS, service_factory)
+    except Exception as e:
+        logger.error(f"Error listing files for parent_id='{parent_id}': {e}", exc_info=True)
+        return []
+
+    def build(folder_id):
+        tree = []
+        for item in children.get(folder_id, []):
+            node = {'id': item['id'], 'name': item['name'], 'mimeType': item['mimeType']}
+            if item['mimeType'] == FOLDER_MIME_TYPE:
+                node['children'] = build(item['id'])
+            tree.append(node)
+        return tree
+
+    tree = build(parent_id)
+    logger.info(f"Completed building tree for parent_id='{parent_id}' (items: {len(tree)})")
+    return tree
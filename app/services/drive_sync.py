@@ -0,0 +1,295 @@
+import os
+from typing import Callable, Dict, Iterable, List, Tuple
+from app.core.logger import setup_logger
+from db.crud import (get_drive_sync_state, save_drive_sync_state, parse_drive_time, upsert_drive_files_sqlalchemy,
+                     apply_drive_file_changes, link_drive_files_to_pos, delete_unreferenced_pos)
+from app.services.drive_tree_cache import get_drive_tree_cache
+
+logger = setup_logger()
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+PDF_MIME_TYPE = 'application/pdf'
+CHANGE_FIELDS = "nextPageToken, newStartPageToken, changes(fileId, removed, file(id, name, mimeType, modifiedTime, size, md5Checksum, parents, trashed))"
+# Drive answers an expired or unknown page token with one of these statuses.
+EXPIRED_TOKEN_STATUSES = {400, 404, 410}
+SYNC_MODES = {"incremental", "full"}
+
+
+class FullResyncRequired(Exception):
+    """Raised when the changes cannot be applied incrementally, e.g. a folder moved in or out of the tree."""
+
+
+def get_sync_mode() -> str:
+    """
+    Returns how Drive folders are synced, read from DRIVE_SYNC_MODE.
+
+    "incremental" (default) reads only the changes since the last sync of the
+    folder, using a stored Drive changes start-page token. "full" re-lists the
+    whole folder tree on every sync.
+    """
+    mode = os.getenv("DRIVE_SYNC_MODE", "incremental").lower()
+    if mode not in SYNC_MODES:
+        logger.error(f"Unsupported Drive sync mode: {mode}")
+        raise ValueError(f"Unsupported Drive sync mode: {mode}")
+    return mode
+
+
+def _is_expired_token_error(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status) in EXPIRED_TOKEN_STATUSES
+    except (TypeError, ValueError):
+        return False
+
+
+def list_changes(service, page_token: str) -> Tuple[List[dict], str]:
+    """
+    Reads every Drive change since page_token.
+
+    Returns:
+        Tuple[List[dict], str]: The changes, oldest first, and the token to
+        resume from next time.
+    """
+    changes = []
+    while True:
+        response = service.changes().list(
+            pageToken=page_token,
+            fields=CHANGE_FIELDS,
+            includeRemoved=True,
+            spaces="drive",
+            pageSize=1000,
+        ).execute()
+        changes.extend(response.get("changes", []))
+        if "newStartPageToken" in response:
+            return changes, response["newStartPageToken"]
+        page_token = response["nextPageToken"]
+
+
+def classify_changes(changes: Iterable[dict], folder_ids: set, known_file_ids: set) -> Tuple[List[dict], set]:
+    """
+    Narrows drive-wide changes down to the files of one folder tree.
+
+    Args:
+        changes: Changes from list_changes, oldest first.
+        folder_ids: IDs of the watched folder and all of its subfolders.
+        known_file_ids: IDs of the files stored for the folder so far.
+
+    Returns:
+        Tuple[List[dict], set]: Files added or modified inside the tree, and
+        the IDs of known files that were deleted, trashed or moved out.
+
+    Raises:
+        FullResyncRequired: When a folder was added to, moved within or
+            removed from the tree, since the changes feed does not list the
+            files that move with it.
+    """
+    changed = {}
+    removed = set()
+    for change in changes:
+        file_id = change["fileId"]
+        file = change.get("file") or {}
+        in_tree = (
+            not change.get("removed")
+            and not file.get("trashed")
+            and any(parent in folder_ids for parent in file.get("parents", []))
+        )
+        if file.get("mimeType") == FOLDER_MIME_TYPE or file_id in folder_ids:
+            if in_tree != (file_id in folder_ids):
+                raise FullResyncRequired(f"folder '{file.get('name', file_id)}' moved in or out of the synced tree")
+            continue
+        if in_tree:
+            changed[file_id] = {
+                'id': file_id,
+                'name': file['name'],
+                'mimeType': file.get('mimeType'),
+                'modifiedTime': file.get('modifiedTime', ''),
+                'size': file.get('size'),
+                'md5Checksum': file.get('md5Checksum'),
+            }
+            removed.discard(file_id)
+        else:
+            changed.pop(file_id, None)
+            if file_id in known_file_ids:
+                removed.add(file_id)
+    return list(changed.values()), removed
+
+
+def sync_folder(service, folder_id: str, list_folder: Callable, known_file_ids: set) -> dict:
+    """
+    Works out what changed in a Drive folder tree since its last sync.
+
+    With a stored start-page token (and DRIVE_SYNC_MODE=incremental), only the
+    Drive changes since then are read. Without one, or when the token has
+    expired or the folder structure changed, the whole tree is listed with
+    list_folder. Nothing is saved here: call commit_sync once the changes have
+    been processed, so an interrupted sync is picked up again next time.
+
+    Args:
+        service: A Drive v3 service object.
+        folder_id: The watched folder.
+        list_folder: Full lister, called as list_folder(service, folder_id,
+            folder_ids=set) and filling folder_ids with the tree's folders.
+        known_file_ids: IDs of the files stored for the folder so far (see
+            folder_file_ids).
+
+    Returns:
+        dict: "mode" ("incremental" or "full"), "files" (the full listing, or
+        None), "changed" and "removed" (incremental mode only, else None),
+        plus the "folder_id", "token" and "folder_ids" to pass on to
+        commit_sync.
+
+    Raises:
+        Exception: Listing errors are passed on, so a failed listing is never
+            taken for an empty folder.
+    """
+    state = get_drive_sync_state(folder_id) if get_sync_mode() == "incremental" else None
+    if state:
+        try:
+            changes, token = list_changes(service, state["start_page_token"])
+            changed, removed = classify_changes(changes, set(state["folder_ids"]), known_file_ids)
+            logger.info(f"Incremental sync of folder {folder_id}: {len(changes)} Drive changes, "
+                        f"{len(changed)} changed and {len(removed)} removed files in the folder")
+            return {"mode": "incremental", "folder_id": folder_id, "files": None, "changed": changed, "removed": removed,
+                    "token": token, "folder_ids": state["folder_ids"]}
+        except FullResyncRequired as e:
+            logger.info(f"Falling back to a full listing of folder {folder_id}: {e}")
+        except Exception as e:
+            if not _is_expired_token_error(e):
+                raise
+            logger.warning(f"Drive changes token for folder {folder_id} has expired; falling back to a full listing")
+
+    # Take the token before listing, so changes made during the listing are seen next time.
+    token = service.changes().getStartPageToken().execute()["startPageToken"]
+    folder_ids = {folder_id}
+    files = list_folder(service, folder_id, folder_ids=folder_ids)
+    logger.info(f"Full sync of folder {folder_id}: {len(files)} files in {len(folder_ids)} folders")
+    return {"mode": "full", "folder_id": folder_id, "files": files, "changed": None, "removed": None,
+            "token": token, "folder_ids": sorted(folder_ids)}
+
+
+def commit_sync(folder_id: str, sync: dict) -> None:
+    """
+    Stores the token from sync_folder so the next sync starts after these
+    changes, and drops the folder picker's cached levels for the synced tree
+    when anything changed.
+    """
+    save_drive_sync_state(folder_id, sync["token"], sync["folder_ids"])
+    if sync["mode"] == "full" or sync["changed"] or sync["removed"]:
+        get_drive_tree_cache().invalidate(sync["folder_ids"])
+
+
+def folder_file_ids(stored: Dict[str, dict], folder_id: str) -> set:
+    """IDs of the files in the drive_files index that were synced under folder_id."""
+    return {file_id for file_id, row in stored.items() if row["sync_root"] == folder_id}
+
+
+def unextracted_files(stored: Dict[str, dict], folder_id: str) -> List[dict]:
+    """
+    PDFs stored under folder_id without a PO (listed by Confirm Folder only,
+    or whose extraction failed), as file dicts for plan_extraction.
+
+    An incremental sync only sees files that changed in Drive, so these are
+    planned alongside its changes to be extracted again. Rows stored before
+    the MIME type was recorded count as PDFs by their name.
+    """
+    return [
+        {
+            'id': file_id,
+            'name': row["name"],
+            'mimeType': PDF_MIME_TYPE,
+            'modifiedTime': row["last_edited"].isoformat() + 'Z' if row["last_edited"] else '',
+            'size': row["size"],
+            'md5Checksum': row["md5_checksum"],
+        }
+        for file_id, row in stored.items()
+        if row["sync_root"] == folder_id and not row["po_id"] and (
+            row["mime_type"] == PDF_MIME_TYPE or (row["mime_type"] is None and (row["name"] or "").lower().endswith(".pdf")))
+    ]
+
+
+def _same_content(stored: dict, file: dict) -> bool:
+    """Whether a listed file still has its stored content: by checksum and size, or by modifiedTime for rows stored without a checksum."""
+    if stored.get("md5_checksum") and file.get("md5Checksum"):
+        size = file.get("size")
+        return stored["md5_checksum"] == file["md5Checksum"] and (stored.get("size") is None or size is None or int(size) == stored["size"])
+    return stored.get("last_edited") == parse_drive_time(file.get("modifiedTime"))
+
+
+def plan_extraction(files: Iterable[dict], stored: Dict[str, dict]) -> dict:
+    """
+    Decides which listed PDFs have to be downloaded and extracted, by content.
+
+    A file whose content is unchanged and already extracted is skipped,
+    whatever happened to its name, folder or modifiedTime. Files stored
+    without a PO (listed by Confirm Folder only, or whose extraction failed)
+    are extracted again. A file whose content was already extracted
+    under another ID (a copy, or a re-upload) is linked to that PO instead.
+    Identical copies within the listing are extracted once.
+
+    Args:
+        files: Listed PDF dicts with 'id', 'name', 'modifiedTime' and, from
+            Drive, 'md5Checksum' and 'size'.
+        stored: The drive_files index from db.crud.get_drive_file_index.
+
+    Returns:
+        dict: "ingest" (files to extract), "unchanged" (files skipped),
+        "linked" ({file_id: po_id} for copies of extracted content),
+        "duplicates" ({file_id: id of the identical file being extracted})
+        and "stale_po_ids" (POs of files whose content changed).
+    """
+    po_by_checksum = {row["md5_checksum"]: row["po_id"] for row in stored.values() if row["md5_checksum"] and row["po_id"]}
+    plan = {"ingest": [], "unchanged": [], "linked": {}, "duplicates": {}, "stale_po_ids": set()}
+    queued = {}
+    for file in files:
+        row = stored.get(file["id"])
+        if row and row["po_id"] and _same_content(row, file):
+            plan["unchanged"].append(file)
+            continue
+        if row and row["po_id"]:
+            plan["stale_po_ids"].add(row["po_id"])
+        checksum = file.get("md5Checksum")
+        if checksum and checksum in po_by_checksum:
+            plan["linked"][file["id"]] = po_by_checksum[checksum]
+        elif checksum and checksum in queued:
+            plan["duplicates"][file["id"]] = queued[checksum]
+        else:
+            plan["ingest"].append(file)
+            if checksum:
+                queued[checksum] = file["id"]
+    logger.info(f"Extraction plan: {len(plan['ingest'])} to extract, {len(plan['unchanged'])} unchanged, "
+                f"{len(plan['linked'])} copies of extracted content, {len(plan['duplicates'])} duplicates within the listing")
+    return plan
+
+
+def record_extraction(sync: dict, plan: dict, stored: Dict[str, dict]) -> dict:
+    """
+    Stores the outcome of a sync once its files have been extracted.
+
+    Writes the synced folder's drive_files rows, links every file to the PO
+    extracted from its content (ingested files carry it as 'po_id'), and
+    deletes the POs of removed or changed files that no file links to any
+    more. Only files stored under the synced folder can be removed. Call
+    commit_sync afterwards.
+
+    Returns:
+        dict: "linked" (files linked to a PO) and "deleted_pos".
+    """
+    links = dict(plan["linked"])
+    for file in plan["ingest"]:
+        if file.get("po_id"):
+            links[file["id"]] = file["po_id"]
+    for file_id, original_id in plan["duplicates"].items():
+        if original_id in links:
+            links[file_id] = links[original_id]
+
+    folder_id = sync["folder_id"]
+    if sync["mode"] == "incremental":
+        apply_drive_file_changes(sync["changed"], sync["removed"], folder_id)
+        removed = set(sync["removed"]) & folder_file_ids(stored, folder_id)
+    else:
+        upsert_drive_files_sqlalchemy(sync["files"], folder_id)
+        removed = folder_file_ids(stored, folder_id) - {file["id"] for file in sync["files"]}
+    link_drive_files_to_pos(links)
+    stale = plan["stale_po_ids"] | {stored[file_id]["po_id"] for file_id in removed if file_id in stored}
+    deleted = delete_unreferenced_pos(stale)
+    return {"linked": len(links), "deleted_pos": deleted}
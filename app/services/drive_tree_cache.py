@@ -0,0 +1,117 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class DriveTreeCache:
+    """
+    Caches the Drive folder picker one level at a time, per user and folder.
+
+    Entries younger than ttl_seconds are served as they are. Older entries,
+    up to max_stale_seconds, are still served straight away while a background
+    thread fetches the level again (stale-while-revalidate). Anything older,
+    or not cached yet, is fetched before returning. The least recently used
+    entries are dropped beyond max_entries.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, max_stale_seconds: float = 3600, max_entries: int = 5000, refresh_workers: int = 2):
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (user, folder_id) -> (fetched_at, children)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="drive-tree-refresh")
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "invalidations": 0}
+
+    def _store(self, key, children: List[dict]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), children)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key, fetch: Callable[[], List[dict]]) -> None:
+        try:
+            self._store(key, fetch())
+            logger.debug(f"Refreshed Drive tree level {key[1]} for user {key[0]}")
+        except Exception as e:
+            logger.warning(f"Background refresh of Drive tree level {key[1]} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_children(self, user: str, folder_id: str, fetch: Callable[[], List[dict]]) -> List[dict]:
+        """
+        Returns one level of the folder tree, fetching it with fetch() when needed.
+
+        Args:
+            user: Whose Drive this is; entries are never shared between users.
+            folder_id: The folder to expand.
+            fetch: Lists the folder's children. It may run on a background
+                thread, so it must not use a service object owned by the
+                request.
+        """
+        key = (user, folder_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                if age < self.max_stale_seconds:
+                    self._entries.move_to_end(key)
+                    self.stats["stale_hits"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self.stats["refreshes"] += 1
+                        self._executor.submit(self._refresh, key, fetch)
+                    return entry[1]
+            self.stats["misses"] += 1
+
+        children = fetch()
+        self._store(key, children)
+        return children
+
+    def invalidate(self, folder_ids: Iterable[str], user: Optional[str] = None) -> int:
+        """Drops the cached levels of the given folders (for every user unless one is given)."""
+        folder_ids = set(folder_ids)
+        with self._lock:
+            keys = [key for key in self._entries if key[1] in folder_ids and (user is None or key[0] == user)]
+            for key in keys:
+                del self._entries[key]
+            self.stats["invalidations"] += len(keys)
+        if keys:
+            logger.info(f"Invalidated {len(keys)} cached Drive tree levels")
+        return len(keys)
+
+
+def get_drive_tree_cache() -> DriveTreeCache:
+    """
+    Returns the process-wide Drive tree cache.
+
+    Tuned with DRIVE_TREE_CACHE_TTL_SECONDS (default 300),
+    DRIVE_TREE_CACHE_MAX_STALE_SECONDS (default 3600) and
+    DRIVE_TREE_CACHE_MAX_ENTRIES (default 5000).
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DriveTreeCache(
+                ttl_seconds=float(os.getenv("DRIVE_TREE_CACHE_TTL_SECONDS", "300")),
+                max_stale_seconds=float(os.getenv("DRIVE_TREE_CACHE_MAX_STALE_SECONDS", "3600")),
+                max_entries=int(os.getenv("DRIVE_TREE_CACHE_MAX_ENTRIES", "5000")),
+            )
+    return _cache
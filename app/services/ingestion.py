@@ -0,0 +1,187 @@
+import os
+import json
+import queue
+import threading
+from typing import Callable, List, Optional, Tuple
+from app.core.logger import setup_logger
+from app.services.drive import DownloadBufferPool, download_to_buffer, get_download_settings
+from db.crud import insert_or_replace_po
+from extractor.run_extraction import prepare_document, extract_document
+from extractor.metrics import new_document_metrics, collect_metrics, stage, aggregate_metrics
+
+logger = setup_logger()
+
+# Marks the end of the work stream in a stage queue.
+_DONE = object()
+
+
+def get_ingestion_limits() -> dict:
+    """
+    Returns the number of concurrent workers for each ingestion stage.
+
+    Limits are read from INGEST_DRIVE_WORKERS (Drive downloads),
+    INGEST_PARSE_WORKERS (PDF parsing) and INGEST_LLM_WORKERS (LLM calls).
+    """
+    cpu_count = os.cpu_count() or 1
+    return {
+        "drive": max(1, int(os.getenv("INGEST_DRIVE_WORKERS", "4"))),
+        "parse": max(1, int(os.getenv("INGEST_PARSE_WORKERS", str(min(4, cpu_count))))),
+        "llm": max(1, int(os.getenv("INGEST_LLM_WORKERS", "4"))),
+    }
+
+
+def _start_stage(name: str, workers: int, in_q: queue.Queue, out_q: queue.Queue, fn, setup=None) -> None:
+    """
+    Starts the worker threads for one stage of the ingestion pipeline.
+
+    Each worker takes items from in_q, applies fn(item, context) and passes the
+    item on to out_q. Items that already failed in an earlier stage are passed
+    through untouched. The last worker to finish forwards the end marker.
+    """
+    state = {"remaining": workers}
+    lock = threading.Lock()
+
+    def worker():
+        context, setup_error = None, None
+        if setup:
+            try:
+                context = setup()
+            except Exception as e:
+                logger.error("Ingestion stage '%s' could not start a worker: %s", name, e, exc_info=True)
+                setup_error = e
+        while True:
+            item = in_q.get()
+            if item is _DONE:
+                in_q.put(_DONE)
+                break
+            if item["error"] is None and setup_error is not None:
+                item["error"] = setup_error
+            elif item["error"] is None:
+                try:
+                    fn(item, context)
+                except Exception as e:
+                    logger.error("Ingestion stage '%s' failed for %s (ID: %s): %s", name, item["file"]["name"], item["file"]["id"], e, exc_info=True)
+                    item["error"] = e
+            out_q.put(item)
+        with lock:
+            state["remaining"] -= 1
+            last = state["remaining"] == 0
+        if last:
+            out_q.put(_DONE)
+
+    for i in range(workers):
+        threading.Thread(target=worker, name=f"ingest-{name}-{i}", daemon=True).start()
+
+
+def _download(item: dict, service, buffers: DownloadBufferPool, chunk_bytes: int) -> None:
+    logger.info("Downloading file '%s' (id=%s)", item["file"]["name"], item["file"]["id"])
+    buffer = buffers.acquire()
+    try:
+        with collect_metrics(item["metrics"]), stage("download") as span:
+            download_to_buffer(service, item["file"]["id"], buffer, chunk_size=chunk_bytes, expected_size=item["file"].get("size"))
+            span["bytes_in"] = len(buffer)
+            span["spilled"] = int(buffer.spilled)
+    except Exception:
+        buffers.release(buffer)
+        raise
+    item["buffer"] = buffer
+
+
+def _parse(item: dict, buffers: DownloadBufferPool) -> None:
+    logger.info("Running extraction pipeline for %s...", item["file"]["name"])
+    buffer = item.pop("buffer")
+    try:
+        item["prepared"] = prepare_document(buffer.source(), metrics=item["metrics"])
+    finally:
+        buffers.release(buffer)
+
+
+def _extract(item: dict, _context) -> None:
+    item["po"] = extract_document(item.pop("prepared"))
+
+
+def ingest_drive_files(service_factory: Callable[[], object], files: List[dict], on_result: Optional[Callable[[dict, str], None]] = None) -> Tuple[List[str], dict]:
+    """
+    Downloads, parses and extracts a list of Drive PDFs concurrently and stores the results.
+
+    Downloads, parsing and LLM calls run in separate stages with their own
+    worker limits (see get_ingestion_limits). Bounded queues between stages
+    provide backpressure, so a slow LLM stage does not pile up downloaded PDFs
+    in memory. Downloads stream into a fixed pool of reusable buffers that are
+    handed to the parser without copying, which caps the memory held by
+    downloaded PDFs (see app.services.drive.get_download_settings). All
+    database writes happen on the calling thread, one at a time.
+
+    Args:
+        service_factory: Builds a Drive service object. Each download worker
+            gets its own, because service objects are not thread-safe.
+        files: Drive file dicts with at least 'id' and 'name'. Each file
+            whose PO was stored gets that PO's ID set as 'po_id'.
+        on_result: Called on the calling thread as on_result(file, summary)
+            once each file's outcome is final, e.g. to checkpoint it.
+
+    Returns:
+        Tuple[List[str], dict]: One summary line per file, in the order of
+        `files`, and the per-stage timing and size metrics for the batch (see
+        extractor.metrics.aggregate_metrics).
+    """
+    if not files:
+        return [], aggregate_metrics([])
+
+    limits = get_ingestion_limits()
+    logger.info("Ingesting %d Drive files with limits: %s", len(files), limits)
+
+    download_q = queue.Queue(maxsize=limits["drive"] * 2)
+    parse_q = queue.Queue(maxsize=limits["parse"] * 2)
+    llm_q = queue.Queue(maxsize=limits["llm"] * 2)
+    write_q = queue.Queue(maxsize=limits["llm"] * 2)
+
+    download_settings = get_download_settings()
+    # One buffer per download and per parse worker: downloads wait for a free
+    # buffer rather than queueing more PDFs in memory than the parsers can take.
+    buffers = DownloadBufferPool(limits["drive"] + limits["parse"], download_settings["memory_bytes"])
+    logger.info("Download buffers: %d x %.0f MB in memory at most", limits["drive"] + limits["parse"], download_settings["memory_bytes"] / 1024 / 1024)
+
+    _start_stage("download", limits["drive"], download_q, parse_q,
+                 lambda item, service: _download(item, service, buffers, download_settings["chunk_bytes"]), setup=service_factory)
+    _start_stage("parse", limits["parse"], parse_q, llm_q, lambda item, _context: _parse(item, buffers))
+    _start_stage("llm", limits["llm"], llm_q, write_q, _extract)
+
+    def feed():
+        for index, file_item in enumerate(files):
+            download_q.put({"index": index, "file": file_item, "error": None, "metrics": new_document_metrics(file_item["name"])})
+        download_q.put(_DONE)
+
+    threading.Thread(target=feed, name="ingest-feed", daemon=True).start()
+
+    # Single serialized writer: every DB write goes through this loop.
+    summaries = [None] * len(files)
+    document_metrics = [None] * len(files)
+    while True:
+        item = write_q.get()
+        if item is _DONE:
+            break
+        file_name = item["file"]["name"]
+        document_metrics[item["index"]] = item["metrics"]
+        po = item.get("po")
+        if item["error"] is not None:
+            summaries[item["index"]] = f"Error processing: {file_name} - {item['error']}"
+        elif not po:
+            logger.warning("No data extracted from %s. DB insert skipped.", file_name)
+            summaries[item["index"]] = f"No data extracted from {file_name}. DB insert skipped."
+        else:
+            try:
+                with collect_metrics(item["metrics"]), stage("db_write"):
+                    insert_or_replace_po(po)
+                item["file"]["po_id"] = po.get("po_id")
+                logger.info("Inserted/replaced PO data for: %s", file_name)
+                summaries[item["index"]] = f"Inserted/replaced PO data for: {file_name}"
+            except Exception as e:
+                logger.error("Error saving PO data for %s: %s", file_name, e, exc_info=True)
+                summaries[item["index"]] = f"Error processing: {file_name} - {e}"
+        if on_result:
+            on_result(item["file"], summaries[item["index"]])
+
+    batch_metrics = aggregate_metrics(document_metrics)
+    logger.info("Finished ingesting %d Drive files. Stage metrics: %s", len(files), json.dumps(batch_metrics))
+    return summaries, batch_metrics
@@ -0,0 +1,264 @@
+import os
+import sys
+import socket
+import argparse
+import threading
+from functools import partial
+from typing import Optional
+from dotenv import load_dotenv
+from app.core.logger import setup_logger
+from db.profiling import profile_queries
+from db.crud import (enqueue_sync_job, claim_sync_job, update_sync_job, finish_sync_job, save_sync_job_plan,
+                     checkpoint_sync_job_file, get_sync_job_files, get_sync_job, get_drive_file_index)
+
+logger = setup_logger()
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_settings() -> dict:
+    """
+    Returns the background job options.
+
+    Read from JOB_WORKERS (default 1; worker threads started in the web
+    process, 0 to leave jobs to `python -m app.services.jobs`),
+    JOB_POLL_SECONDS (default 2; how often idle workers check the queue) and
+    JOB_STALE_SECONDS (default 120; a running job without a heartbeat for
+    this long is queued again) and JOB_MAX_ATTEMPTS (default 3; a stale job
+    that has been started this many times is marked failed instead).
+    """
+    return {
+        "workers": max(0, int(os.getenv("JOB_WORKERS", "1"))),
+        "poll_seconds": float(os.getenv("JOB_POLL_SECONDS", "2")),
+        "stale_seconds": float(os.getenv("JOB_STALE_SECONDS", "120")),
+        "max_attempts": max(1, int(os.getenv("JOB_MAX_ATTEMPTS", "3"))),
+    }
+
+
+def _sync_state(sync: dict) -> dict:
+    return dict(sync, removed=sorted(sync["removed"]) if sync["removed"] is not None else None)
+
+
+def _plan_state(plan: dict) -> dict:
+    return {
+        "unchanged": len(plan["unchanged"]),
+        "linked": plan["linked"],
+        "duplicates": plan["duplicates"],
+        "stale_po_ids": sorted(plan["stale_po_ids"]),
+    }
+
+
+def _plan_job(job_id: int, folder_id: str, lease, stored: dict) -> dict:
+    """Lists the folder and stores the sync and extraction plan as the job's checkpoint."""
+    from app.services.drive_listing import list_all_files_in_folder
+    from app.services.drive_sync import sync_folder, plan_extraction, folder_file_ids, unextracted_files, PDF_MIME_TYPE
+    update_sync_job(job_id, phase="listing")
+    lister = partial(list_all_files_in_folder, service_factory=lease.new_service)
+    sync = sync_folder(lease.service, folder_id, lister, folder_file_ids(stored, folder_id))
+    if sync["mode"] == "incremental":
+        # Unchanged files without a PO are not in the changes feed; retry them too.
+        seen = {f["id"] for f in sync["changed"]} | sync["removed"]
+        listed = sync["changed"] + [f for f in unextracted_files(stored, folder_id) if f["id"] not in seen]
+    else:
+        listed = sync["files"]
+    plan = plan_extraction([f for f in listed if f.get("mimeType") == PDF_MIME_TYPE], stored)
+    state = {"sync": _sync_state(sync), "plan": _plan_state(plan)}
+    save_sync_job_plan(job_id, state, plan["ingest"])
+    return state
+
+
+def run_drive_sync_job(job: dict) -> None:
+    """
+    Runs (or resumes) one Drive folder sync job, from listing to forecast.
+
+    A job that already has a saved plan skips the listing and only extracts
+    the files whose checkpoints are still pending.
+    """
+    from app.services.drive_clients import get_drive_client_pool, with_client_secret
+    from app.services.drive_sync import commit_sync, record_extraction
+    from app.services.ingestion import ingest_drive_files
+    from extractor.metrics import format_metrics_summary
+    job_id, folder_id = job["id"], job["folder_id"]
+    with get_drive_client_pool().lease(job["user"], with_client_secret(job["credentials"])) as lease:
+        # drive_files is only written once the job is recorded, so a resumed job sees the same rows.
+        stored = get_drive_file_index()
+        state = job["state"]
+        if state is None:
+            state = _plan_job(job_id, folder_id, lease, stored)
+        else:
+            logger.info(f"Resuming sync job {job_id} (attempt {job['attempts']}) from its checkpoint")
+        update_sync_job(job_id, phase="extracting", progress={
+            "mode": state["sync"]["mode"],
+            "unchanged": state["plan"]["unchanged"],
+            "linked": len(state["plan"]["linked"]) + len(state["plan"]["duplicates"]),
+        })
+
+        pending = [checkpoint["file"] for checkpoint in get_sync_job_files(job_id) if checkpoint["status"] == "pending"]
+
+        def on_result(file_item: dict, summary: str) -> None:
+            checkpoint_sync_job_file(job_id, file_item["id"], "done" if file_item.get("po_id") else "failed",
+                                     po_id=file_item.get("po_id"), message=summary)
+
+        _, metrics = ingest_drive_files(lease.new_service, pending, on_result=on_result)
+
+        update_sync_job(job_id, phase="recording")
+        checkpoints = get_sync_job_files(job_id)
+        sync = dict(state["sync"], folder_id=folder_id,
+                    removed=set(state["sync"]["removed"]) if state["sync"]["removed"] is not None else None)
+        plan = {
+            "ingest": [dict(checkpoint["file"], po_id=checkpoint["po_id"]) for checkpoint in checkpoints],
+            "linked": state["plan"]["linked"],
+            "duplicates": state["plan"]["duplicates"],
+            "stale_po_ids": set(state["plan"]["stale_po_ids"]),
+        }
+        outcome = record_extraction(sync, plan, stored)
+        commit_sync(folder_id, sync)
+
+    from extractor.export import export_all_pos_json, export_all_csvs, LLM_OUTPUT_DIR
+    from forecast_processor import run_forecast_processing
+    export_all_pos_json()
+    export_all_csvs()
+    run_forecast_processing(input_json_path=LLM_OUTPUT_DIR / "purchase_orders.json")
+
+    summary = [checkpoint["message"] for checkpoint in checkpoints if checkpoint["message"]]
+    if state["plan"]["unchanged"]:
+        summary.insert(0, f"Skipped {state['plan']['unchanged']} files whose content is unchanged.")
+    copies = len(state["plan"]["linked"]) + len(state["plan"]["duplicates"])
+    if copies:
+        summary.append(f"Linked {copies} identical copies to existing extractions.")
+    if pending:
+        summary.extend(format_metrics_summary(metrics))
+    if not summary:
+        summary.append("No new or changed PDFs in the folder.")
+    finish_sync_job(job_id, "done", result={"summary": summary, "metrics": metrics if pending else None, "outcome": outcome})
+
+
+class JobRunner:
+    """
+    Worker threads that claim queued sync jobs and run them, one job per
+    thread at a time.
+
+    HTTP requests only queue jobs (enqueue_drive_sync). A job saves its plan,
+    with one checkpoint per file to extract, before extracting anything, and
+    checkpoints every file as soon as it is stored. While a job runs, its
+    worker sends a heartbeat; a job whose heartbeat stops (the process
+    crashed or was restarted) is queued again and resumes with the files
+    still pending. After JOB_MAX_ATTEMPTS such restarts the job is marked
+    failed instead.
+    """
+
+    def __init__(self, workers: int, poll_seconds: float, stale_seconds: float, max_attempts: int):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, args=(f"{prefix}:{i}",), name=f"sync-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} sync job workers")
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+    def wake(self) -> None:
+        """Lets idle workers check the queue now instead of at their next poll."""
+        self._wake.set()
+
+    def _heartbeat(self, job_id: int, stop: threading.Event) -> None:
+        while not stop.wait(self.stale_seconds / 4):
+            try:
+                update_sync_job(job_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat of sync job {job_id} failed: {e}")
+
+    def _loop(self, worker: str) -> None:
+        while True:
+            try:
+                job = claim_sync_job(worker, self.stale_seconds, self.max_attempts)
+            except Exception as e:
+                logger.error(f"Sync job worker {worker} could not read the queue: {e}", exc_info=True)
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            logger.info(f"Worker {worker} running sync job {job['id']} for folder {job['folder_id']}")
+            stop = threading.Event()
+            threading.Thread(target=self._heartbeat, args=(job["id"], stop), name=f"sync-job-{job['id']}-heartbeat", daemon=True).start()
+            try:
+                with profile_queries("drive sync job", job_id=job["id"]):
+                    run_drive_sync_job(job)
+            except Exception as e:
+                logger.error(f"Sync job {job['id']} failed: {e}", exc_info=True)
+                finish_sync_job(job["id"], "failed", error=str(e))
+            finally:
+                stop.set()
+
+
+def get_job_runner() -> Optional[JobRunner]:
+    """Returns the process's job runner, starting its workers on first use (None when JOB_WORKERS=0)."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            settings = get_job_settings()
+            if settings["workers"] == 0:
+                return None
+            _runner = JobRunner(settings["workers"], settings["poll_seconds"], settings["stale_seconds"], settings["max_attempts"])
+            _runner.start()
+    return _runner
+
+
+def enqueue_drive_sync(user: str, folder_id: str, folder_name: str, credentials: dict) -> int:
+    """Queues a sync and extraction of a Drive folder and returns the job ID; an active job for the folder is reused."""
+    job_id, created = enqueue_sync_job(user, folder_id, folder_name, credentials)
+    runner = get_job_runner()
+    if created and runner:
+        runner.wake()
+    return job_id
+
+
+def get_job_progress(job_id: int) -> Optional[dict]:
+    """Returns a job's status and progress for the progress endpoint, without its credentials or checkpoint."""
+    job = get_sync_job(job_id)
+    if job is None:
+        return None
+    for key in ("credentials", "state"):
+        job.pop(key)
+    for key in ("created_at", "started_at", "finished_at"):
+        job[key] = job[key].isoformat() + "Z" if job[key] else None
+    return job
+
+
+def main() -> int:
+    """
+    Runs sync job workers in their own process, for deployments that set
+    JOB_WORKERS=0 on the web process:
+
+        python -m app.services.jobs --workers 2
+    """
+    parser = argparse.ArgumentParser(description="Run background Drive sync job workers.")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    load_dotenv()
+    from db.database import init_db
+    init_db()
+    settings = get_job_settings()
+    runner = JobRunner(args.workers, settings["poll_seconds"], settings["stale_seconds"], settings["max_attempts"])
+    runner.start()
+    try:
+        runner.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping sync job workers")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Compares the breadth-first Drive folder lister with a folder-at-a-time walk.
+
+Both run against benchmarks.fake_drive with a simulated per-call latency. The
+reference walk issues one files().list per folder, in sequence, as the routes
+did before; the breadth-first lister batches each tree level into combined
+parent queries. The benchmark checks that the flat file list and the nested
+tree are identical, and reports API calls and wall time for each.
+
+Usage:
+    python -m benchmarks.bench_drive_listing --latency-ms 50
+    python -m benchmarks.bench_drive_listing --clients 20 --months 12 --latency-ms 80 --workers 8
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from app.services.drive_listing import list_all_files_in_folder, get_drive_tree, FOLDER_MIME_TYPE
+from benchmarks.fake_drive import FakeDrive, build_hierarchy
+
+
+def recursive_file_listing(service, folder_id):
+    """The folder-at-a-time walk: one paged files().list per folder, recursing into subfolders."""
+    files = []
+    page_token = None
+    while True:
+        response = service.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            fields="nextPageToken, files(id, name, mimeType, modifiedTime, size, md5Checksum)",
+            pageToken=page_token,
+        ).execute()
+        for item in response.get('files', []):
+            if item['mimeType'] == FOLDER_MIME_TYPE:
+                files.extend(recursive_file_listing(service, item['id']))
+            else:
+                files.append({'id': item['id'], 'name': item['name'], 'mimeType': item['mimeType'],
+                              'modifiedTime': item.get('modifiedTime', ''), 'size': item.get('size'),
+                              'md5Checksum': item.get('md5Checksum')})
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return files
+
+
+def recursive_tree(service, parent_id):
+    tree = []
+    page_token = None
+    while True:
+        response = service.files().list(
+            q=f"'{parent_id}' in parents and trashed = false",
+            fields="nextPageToken, files(id, name, mimeType)",
+            pageToken=page_token,
+        ).execute()
+        for item in response.get('files', []):
+            node = {'id': item['id'], 'name': item['name'], 'mimeType': item['mimeType']}
+            if item['mimeType'] == FOLDER_MIME_TYPE:
+                node['children'] = recursive_tree(service, item['id'])
+            tree.append(node)
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return tree
+
+
+def measure(drive: FakeDrive, fn) -> tuple:
+    drive.reset_calls()
+    started = time.perf_counter()
+    result = fn()
+    return result, sum(drive.calls.values()), (time.perf_counter() - started) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare breadth-first and folder-at-a-time Drive listing on a fake Drive.")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--files-per-folder", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="Simulated round-trip time per API call.")
+    parser.add_argument("--workers", type=int, help="Concurrent queries per level (DRIVE_LIST_WORKERS).")
+    parser.add_argument("--parents-per-query", type=int, help="Folders per combined query (DRIVE_LIST_PARENTS_PER_QUERY).")
+    args = parser.parse_args()
+
+    if args.workers:
+        os.environ["DRIVE_LIST_WORKERS"] = str(args.workers)
+    if args.parents_per_query:
+        os.environ["DRIVE_LIST_PARENTS_PER_QUERY"] = str(args.parents_per_query)
+    logging.getLogger("invoice_app").setLevel(logging.WARNING)
+
+    drive = FakeDrive(latency_ms=args.latency_ms)
+    top = build_hierarchy(drive, args.clients, args.years, args.months, args.files_per_folder)
+    folders = sum(1 for item in drive.items.values() if item["mimeType"] == FOLDER_MIME_TYPE) - 1
+    print(f"Fake Drive: {folders} folders, {len(drive.items) - folders - 1} files, {args.latency_ms:.0f} ms per call")
+
+    failed = False
+    for label, reference_fn, batched_fn in [
+        ("flat file list", lambda: recursive_file_listing(drive.service(), top),
+         lambda: list_all_files_in_folder(drive.service(), top, service_factory=drive.service)),
+        ("nested tree", lambda: recursive_tree(drive.service(), top),
+         lambda: get_drive_tree(drive.service(), top, service_factory=drive.service)),
+    ]:
+        reference, reference_calls, reference_ms = measure(drive, reference_fn)
+        batched, batched_calls, batched_ms = measure(drive, batched_fn)
+        same = reference == batched
+        failed |= not same
+        print(f"{label}: folder-at-a-time {reference_calls} calls, {reference_ms:.0f} ms; "
+              f"breadth-first {batched_calls} calls, {batched_ms:.0f} ms "
+              f"({reference_ms / batched_ms:.1f}x faster) - output {'identical' if same else 'DIFFERS'}")
+
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
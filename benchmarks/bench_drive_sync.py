@@ -0,0 +1,139 @@
+"""
+Compares full and incremental Drive folder syncs against a fake Drive.
+
+Builds a client/year/month folder hierarchy in benchmarks.fake_drive, syncs it
+once in full, applies a batch of edits (inside and outside the folder), and
+then syncs again incrementally. Checks that the incremental result matches a
+diff of two full listings, that an expired changes token and a moved folder
+fall back to a full listing, and reports API calls and wall time for each
+sync. The database is a throwaway SQLite file, not output/database.
+
+Usage:
+    python -m benchmarks.bench_drive_sync
+    python -m benchmarks.bench_drive_sync --clients 10 --files-per-folder 10 --latency-ms 50
+"""
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from pathlib import Path
+from sqlalchemy import create_engine
+from db.database import Base, SessionLocal
+from db.crud import upsert_drive_files_sqlalchemy, apply_drive_file_changes, get_drive_file_index
+from app.services.drive_sync import sync_folder, commit_sync, folder_file_ids
+from app.services.drive_listing import list_all_files_in_folder
+from benchmarks.fake_drive import FakeDrive, build_hierarchy, PDF_MIME_TYPE
+
+
+def use_scratch_database(directory: Path) -> None:
+    engine = create_engine(f"sqlite:///{directory / 'bench_drive_sync.db'}")
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+
+
+def known_file_ids(folder_id: str) -> set:
+    """IDs of the files stored for the folder."""
+    return folder_file_ids(get_drive_file_index(), folder_id)
+
+
+def run_sync(drive: FakeDrive, folder_id: str, lister) -> dict:
+    """Runs one sync, stores its result the way the routes do, and reports its cost."""
+    drive.reset_calls()
+    started = time.perf_counter()
+    sync = sync_folder(drive.service(), folder_id, lister, known_file_ids(folder_id))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if sync["mode"] == "incremental":
+        apply_drive_file_changes(sync["changed"], sync["removed"], folder_id)
+    else:
+        upsert_drive_files_sqlalchemy(sync["files"], folder_id)
+    commit_sync(folder_id, sync)
+    sync["api_calls"] = sum(drive.calls.values())
+    sync["elapsed_ms"] = elapsed_ms
+    return sync
+
+
+def make_edits(drive: FakeDrive, top: str, edits: int) -> None:
+    """Modifies, adds, trashes and moves out PDFs in the tree, and adds noise elsewhere in the Drive."""
+    pdfs = sorted(item_id for item_id, item in drive.items.items() if item["mimeType"] == PDF_MIME_TYPE)
+    month_folders = sorted({drive.items[pdf]["parents"][0] for pdf in pdfs})
+    outside = drive.add_folder("Unrelated")
+    for i in range(edits):
+        kind = i % 4
+        if kind == 0:
+            drive.update_file(pdfs[i], content=f"%PDF-1.4 revised {i}".encode("utf-8"))
+        elif kind == 1:
+            drive.add_file(f"New-{i}.pdf", month_folders[i % len(month_folders)])
+        elif kind == 2:
+            drive.trash(pdfs[i])
+        else:
+            drive.move(pdfs[i], outside)
+        drive.add_file(f"Noise-{i}.pdf", outside)
+
+
+def expected_changes(before: dict, after: list) -> tuple:
+    """Diffs a stored snapshot ({id: modifiedTime}) against a fresh full listing."""
+    after_by_id = {f["id"]: f.get("modifiedTime") for f in after}
+    changed = {file_id for file_id, modified in after_by_id.items() if before.get(file_id) != modified}
+    removed = set(before) - set(after_by_id)
+    return changed, removed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare full and incremental Drive folder syncs on a fake Drive.")
+    parser.add_argument("--clients", type=int, default=5)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--files-per-folder", type=int, default=5)
+    parser.add_argument("--edits", type=int, default=20, help="Edits made between the two syncs.")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated round-trip time per API call.")
+    args = parser.parse_args()
+
+    logging.getLogger("invoice_app").setLevel(logging.WARNING)
+    lister = list_all_files_in_folder
+    failed = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_scratch_database(Path(tmp))
+        drive = FakeDrive(latency_ms=args.latency_ms)
+        top = build_hierarchy(drive, args.clients, args.years, args.months, args.files_per_folder)
+
+        full = run_sync(drive, top, lister)
+        print(f"Initial sync ({full['mode']}): {len(full['files'])} files, {full['api_calls']} API calls, {full['elapsed_ms']:.0f} ms")
+        snapshot = {f["id"]: f.get("modifiedTime") for f in full["files"]}
+
+        make_edits(drive, top, args.edits)
+        reference = lister(drive.service(), top)
+        want_changed, want_removed = expected_changes(snapshot, reference)
+
+        incremental = run_sync(drive, top, lister)
+        got_changed = {f["id"] for f in incremental["changed"]}
+        ok = incremental["mode"] == "incremental" and got_changed == want_changed and incremental["removed"] == want_removed
+        failed |= not ok
+        print(f"Incremental sync ({incremental['mode']}): {len(got_changed)} changed, {len(incremental['removed'])} removed, "
+              f"{incremental['api_calls']} API calls, {incremental['elapsed_ms']:.0f} ms - {'matches' if ok else 'DIFFERS FROM'} a full diff")
+
+        unchanged = run_sync(drive, top, lister)
+        ok = unchanged["mode"] == "incremental" and not unchanged["changed"] and not unchanged["removed"]
+        failed |= not ok
+        print(f"Sync with no changes ({unchanged['mode']}): {unchanged['api_calls']} API calls - {'OK' if ok else 'FAIL'}")
+
+        drive.expire_tokens()
+        expired = run_sync(drive, top, lister)
+        ok = expired["mode"] == "full"
+        failed |= not ok
+        print(f"Sync after token expiry ({expired['mode']}): {expired['api_calls']} API calls - {'OK' if ok else 'FAIL'}")
+
+        subfolder = next(item_id for item_id, item in drive.items.items() if item["parents"] == [top])
+        drive.move(subfolder, "root")
+        moved = run_sync(drive, top, lister)
+        ok = moved["mode"] == "full" and known_file_ids(top) == {f["id"] for f in moved["files"]}
+        failed |= not ok
+        print(f"Sync after a folder moved out ({moved['mode']}): {len(moved['files'])} files - {'OK' if ok else 'FAIL'}")
+
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
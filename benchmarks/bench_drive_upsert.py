@@ -0,0 +1,139 @@
+"""
+Compares the set-based drive_files sync with a row-at-a-time upsert.
+
+The reference upsert issues one SELECT per listed file inside one long
+transaction, as upsert_drive_files_sqlalchemy did before. Both are run
+against a scratch SQLite database for the same sequence of listings: an
+initial load, a listing with a share of files renamed, modified, added and
+removed, and an unchanged re-listing. The benchmark checks that both leave
+identical tables, and that the reported counts match the edits.
+
+Usage:
+    python -m benchmarks.bench_drive_upsert
+    python -m benchmarks.bench_drive_upsert --files 50000 --change-percent 5
+"""
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from functools import partial
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import create_engine, event
+from db.database import Base, SessionLocal, DriveFile
+from db.crud import upsert_drive_files_sqlalchemy, parse_drive_time
+
+BASE_TIME = datetime(2025, 1, 1)
+
+
+def row_at_a_time_upsert(files_data):
+    """The previous upsert: one SELECT (and one INSERT or UPDATE) per file, then a delete of vanished IDs."""
+    session = SessionLocal()
+    try:
+        current_ids = {file_id for file_id, in session.query(DriveFile.id).all()}
+        processed = set()
+        for file_data in files_data:
+            processed.add(file_data['id'])
+            last_edited = parse_drive_time(file_data.get('modifiedTime'))
+            existing = session.query(DriveFile).filter_by(id=file_data['id']).first()
+            if existing:
+                if existing.name != file_data['name'] or existing.last_edited != last_edited:
+                    existing.name = file_data['name']
+                    existing.last_edited = last_edited
+            else:
+                session.add(DriveFile(id=file_data['id'], name=file_data['name'], last_edited=last_edited))
+        vanished = current_ids - processed
+        if vanished:
+            session.query(DriveFile).filter(DriveFile.id.in_(vanished)).delete(synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+
+def listing(count: int, start: int = 0, version: int = 0) -> list:
+    return [{
+        'id': f"file{i}",
+        'name': f"Invoice-{i}.pdf",
+        'mimeType': 'application/pdf',
+        'modifiedTime': (BASE_TIME + timedelta(seconds=i + version)).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+    } for i in range(start, start + count)]
+
+
+def edited(files: list, percent: float) -> tuple:
+    """Renames, modifies, removes and adds `percent` of the files each; returns the listing and expected counts."""
+    step = max(1, int(100 / percent))
+    result = []
+    counts = {"inserted": 0, "updated": 0, "deleted": 0}
+    for index, file_data in enumerate(files):
+        kind = index % step
+        if kind == 0:
+            result.append(dict(file_data, name=file_data['name'].replace('Invoice', 'Renamed')))
+            counts["updated"] += 1
+        elif kind == 1:
+            result.append(dict(file_data, modifiedTime=(BASE_TIME + timedelta(days=400, seconds=index)).strftime("%Y-%m-%dT%H:%M:%S.000Z")))
+            counts["updated"] += 1
+        elif kind == 2:
+            counts["deleted"] += 1
+        else:
+            result.append(file_data)
+    added = listing(counts["deleted"], start=len(files))
+    counts["inserted"] = len(added)
+    counts["unchanged"] = len(result) - counts["updated"]
+    return result + added, counts
+
+
+def snapshot() -> list:
+    session = SessionLocal()
+    try:
+        return [(f.id, f.name, f.last_edited) for f in session.query(DriveFile).order_by(DriveFile.id)]
+    finally:
+        session.close()
+
+
+def run(directory: Path, label: str, upsert, listings: list) -> tuple:
+    engine = create_engine(f"sqlite:///{directory / (label + '.db')}")
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+    statements = [0]
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.__setitem__(0, statements[0] + 1))
+    timings, results = [], []
+    for files in listings:
+        statements[0] = 0
+        started = time.perf_counter()
+        results.append(upsert(files))
+        timings.append(((time.perf_counter() - started) * 1000, statements[0]))
+    return snapshot(), timings, results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare the set-based drive_files sync with a row-at-a-time upsert.")
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--change-percent", type=float, default=2.0, help="Share of files renamed, modified, removed and added, each.")
+    args = parser.parse_args()
+    logging.getLogger("invoice_app").setLevel(logging.WARNING)
+
+    initial = listing(args.files)
+    changed, want_counts = edited(initial, args.change_percent)
+    listings = [initial, changed, changed]
+    labels = ["initial load", "edited listing", "unchanged listing"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reference_rows, reference_timings, _ = run(Path(tmp), "row_at_a_time", row_at_a_time_upsert, listings)
+        bulk_rows, bulk_timings, bulk_counts = run(Path(tmp), "set_based", partial(upsert_drive_files_sqlalchemy, root_id="folder"), listings)
+
+    failed = reference_rows != bulk_rows
+    for label, (reference_ms, reference_statements), (bulk_ms, bulk_statements), counts in zip(labels, reference_timings, bulk_timings, bulk_counts):
+        print(f"{label}: row-at-a-time {reference_statements} statements, {reference_ms:.0f} ms; "
+              f"set-based {bulk_statements} statements, {bulk_ms:.0f} ms ({reference_ms / max(bulk_ms, 0.001):.1f}x faster) - {counts}")
+    counts_ok = (bulk_counts[0] == {"inserted": args.files, "updated": 0, "deleted": 0, "unchanged": 0}
+                 and bulk_counts[1] == want_counts
+                 and bulk_counts[2] == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": len(changed)})
+    failed |= not counts_ok
+    print(f"Final tables {'identical' if reference_rows == bulk_rows else 'DIFFER'}; counts {'as expected' if counts_ok else 'WRONG'}")
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+Benchmarks the PDF extraction path over the sample POs and enlarged variants.
+
+Runs extract_blocks, extract_tables, format_po_for_llm and the full
+run_pipeline on every document, using the offline replay LLM provider and no
+caches, so results are reproducible without network access. Reports latency
+percentiles per stage, traced allocations and peak RSS, and writes everything
+to a JSON file that can be compared with an earlier run.
+
+Usage:
+    python -m benchmarks.bench_extraction --iterations 5
+    python -m benchmarks.bench_extraction --compare output/benchmarks/<earlier>.json
+"""
+import os
+
+# Offline, uncached LLM calls; set before the extractor modules read them.
+os.environ.setdefault("LLM_PROVIDER", "replay")
+os.environ.setdefault("EXTRACTION_CACHE_ENABLED", "false")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+import io
+import gc
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import fitz
+from extractor.pdf_processing.extract_blocks import extract_blocks
+from extractor.pdf_processing.extract_tables import extract_tables
+from extractor.pdf_processing.format_po import format_po_for_llm
+from extractor.run_extraction import run_pipeline
+from benchmarks.synthetic_pdfs import benchmark_corpus
+
+BENCHMARK_OUTPUT_DIR = Path("output") / "benchmarks"
+STAGES = ["extract_blocks", "extract_tables", "format_po_for_llm", "run_pipeline"]
+
+
+def percentiles(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 3)
+
+    return {
+        "n": len(ordered),
+        "min": round(ordered[0], 3),
+        "p50": pick(0.5),
+        "p90": pick(0.9),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 3),
+        "mean": round(statistics.fmean(ordered), 3),
+    }
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process so far (ru_maxrss is in KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if platform.system() == "Darwin" else peak
+
+
+def time_calls(fn: Callable[[], object], iterations: int, warmup: int = 1) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def measure_allocations(fn: Callable[[], object]) -> dict:
+    """Runs fn once under tracemalloc and reports its peak and total allocations."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = [stat for stat in after.compare_to(before, "filename") if stat.size_diff > 0]
+    return {
+        "peak_kb": round(peak / 1024, 1),
+        "retained_kb": round(sum(stat.size_diff for stat in diff) / 1024, 1),
+        "retained_blocks": sum(stat.count_diff for stat in diff if stat.count_diff > 0),
+    }
+
+
+def _stage_functions(data: bytes) -> Dict[str, Callable[[], object]]:
+    blocks = extract_blocks(data)
+    tables = extract_tables(data)
+    return {
+        "extract_blocks": lambda: extract_blocks(data),
+        "extract_tables": lambda: extract_tables(data),
+        "format_po_for_llm": lambda: format_po_for_llm(blocks, tables),
+        "run_pipeline": lambda: run_pipeline(data),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(iterations: int, pages: int, table_pages: int, stages: List[str]) -> dict:
+    corpus = benchmark_corpus(pages=pages, table_pages=table_pages)
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": iterations,
+            "llm_provider": os.environ["LLM_PROVIDER"],
+            "replay_latency_ms": float(os.getenv("LLM_REPLAY_LATENCY_MS", "0")),
+            "table_backend": os.getenv("PDF_TABLE_BACKEND", "pdfplumber"),
+            "table_workers": int(os.getenv("PDF_TABLE_WORKERS", "1")),
+        },
+        "documents": {},
+        "stages": {},
+    }
+    all_samples = {stage: [] for stage in stages}
+
+    for name, data in corpus.items():
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            page_count = len(doc)
+        print(f"{name}: {len(data) / 1024:.0f} KB, {page_count} pages")
+        doc_result = {"bytes": len(data), "pages": page_count, "stages": {}}
+        with redirect_stdout(io.StringIO()):
+            functions = _stage_functions(data)
+        for stage in stages:
+            with redirect_stdout(io.StringIO()):
+                samples = time_calls(functions[stage], iterations)
+                allocations = measure_allocations(functions[stage])
+            all_samples[stage].extend(samples)
+            doc_result["stages"][stage] = {
+                "latency_ms": percentiles(samples),
+                "allocations": allocations,
+                "peak_rss_kb_after": peak_rss_kb(),
+            }
+            print(f"  {stage:<18} p50 {doc_result['stages'][stage]['latency_ms']['p50']:>9.1f} ms  "
+                  f"p90 {doc_result['stages'][stage]['latency_ms']['p90']:>9.1f} ms  "
+                  f"alloc peak {allocations['peak_kb']:>9.1f} KB")
+        results["documents"][name] = doc_result
+
+    results["stages"] = {stage: percentiles(samples) for stage, samples in all_samples.items() if samples}
+    results["peak_rss_kb"] = peak_rss_kb()
+    return results
+
+
+def compare_results(current: dict, baseline: dict) -> List[str]:
+    """Returns one line per document and stage with the p50 change against a baseline run."""
+    lines = [f"Compared with {baseline['meta'].get('git_commit')} ({baseline['meta'].get('timestamp')}):"]
+    for name, doc in current["documents"].items():
+        base_doc = baseline.get("documents", {}).get(name)
+        if not base_doc:
+            continue
+        for stage, result in doc["stages"].items():
+            base_stage = base_doc["stages"].get(stage)
+            if not base_stage:
+                continue
+            before, after = base_stage["latency_ms"]["p50"], result["latency_ms"]["p50"]
+            change = (after - before) / before * 100 if before else 0.0
+            lines.append(f"  {name} / {stage}: p50 {before:.1f} -> {after:.1f} ms ({change:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF extraction over the sample POs and enlarged variants.")
+    parser.add_argument("--iterations", type=int, default=5, help="Timed runs per stage and document.")
+    parser.add_argument("--pages", type=int, default=40, help="Annexure pages in the 'many pages' variant.")
+    parser.add_argument("--table-pages", type=int, default=10, help="Table pages in the 'many tables' variant.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to benchmark.")
+    parser.add_argument("--output", type=Path, help="Where to write the JSON results.")
+    parser.add_argument("--compare", type=Path, help="An earlier results file to compare against.")
+    args = parser.parse_args()
+
+    # Keep the pipeline's INFO logging out of the timings.
+    logging.getLogger("invoice_app").setLevel(logging.WARNING)
+
+    results = run_benchmarks(args.iterations, args.pages, args.table_pages, args.stages)
+    print(f"Peak RSS: {results['peak_rss_kb'] / 1024:.1f} MB")
+
+    output = args.output or BENCHMARK_OUTPUT_DIR / f"extraction-{results['meta']['git_commit'] or 'nogit'}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        print("\n".join(compare_results(results, baseline)))
+
+
+if __name__ == "__main__":
+    main()
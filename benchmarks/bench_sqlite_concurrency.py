@@ -0,0 +1,264 @@
+"""
+Stress-tests concurrent reads and writes against the SQLite storage layer.
+
+Writer processes stand in for job workers and other web workers. Their
+ingest threads upsert batches of POs in one transaction each, as a sync job
+does, and their edit threads upsert single POs, as the edit page does.
+Meanwhile, reader threads in the measuring process run the UI's queries: a
+PO with its schedule, and the per-client totals. The workload runs twice, each time on a fresh scratch
+database. The first run uses a default engine, as db/database.py created it
+before: rollback journal and pysqlite's 5 s busy timeout. The second applies
+configure_sqlite_engine: WAL, pragmas and one writer at a time.
+
+The benchmark reports reader latency percentiles, throughput and "database
+is locked" errors. It checks that every committed write is in the database,
+and fails if the tuned engine reports any errors.
+
+Usage:
+    python -m benchmarks.bench_sqlite_concurrency
+    python -m benchmarks.bench_sqlite_concurrency --seconds 10 --writer-processes 3 --readers 8
+"""
+import sys
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from pathlib import Path
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from db.database import Base, SessionLocal, PurchaseOrder
+from db.crud import insert_or_replace_po, insert_or_replace_pos, get_po_with_schedule
+from db.storage import configure_sqlite_engine, get_sqlite_settings
+
+
+def po(index: int, version: int = 0) -> dict:
+    return {
+        "po_id": f"PO-{index}",
+        "client_name": f"Client {index % 25}",
+        "amount": 1000.0 + index + version,
+        "status": "Confirmed",
+        "payment_terms": 30,
+        "payment_type": "milestone",
+        "start_date": "2025-01-01",
+        "end_date": "2025-12-31",
+        "duration_months": 12,
+        "milestones": [{
+            "milestone_name": f"Milestone {m + 1}",
+            "milestone_description": f"Delivery {m + 1} (v{version})",
+            "milestone_due_date": f"2025-{m + 1:02d}-15",
+            "milestone_percentage": 25.0,
+        } for m in range(4)],
+    }
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def is_locked(error: Exception) -> bool:
+    return isinstance(error, OperationalError) and "locked" in str(error)
+
+
+def _bind(path: Path, tuned: bool):
+    engine = create_engine(f"sqlite:///{path}")
+    if tuned:
+        configure_sqlite_engine(engine, get_sqlite_settings())
+    SessionLocal.configure(bind=engine)
+    return engine
+
+
+def writer_process(path: Path, tuned: bool, args, index: int, ready, start, stop, out) -> None:
+    """One writing process (a job worker or another web worker): ingest and edit threads until stopped."""
+    logging.getLogger("invoice_app").setLevel(logging.CRITICAL)
+    _bind(path, tuned)
+    lock = threading.Lock()
+    results = {"writes": 0, "write_errors": 0, "other_errors": 0, "committed": set(), "edit_ms": []}
+
+    def failed(error: Exception) -> None:
+        with lock:
+            results["write_errors" if is_locked(error) else "other_errors"] += 1
+        if not is_locked(error):
+            print(f"  unexpected error: {error}")
+
+    def ingest(worker: int) -> None:
+        version = 0
+        while not stop.is_set():
+            version += 1
+            first = args.pos + (index * 100 + worker) * 100000 + version * args.batch_size
+            batch = [po(i, version) for i in range(first, first + args.batch_size)]
+            try:
+                insert_or_replace_pos(batch)
+            except Exception as e:
+                failed(e)
+                continue
+            with lock:
+                results["writes"] += len(batch)
+                results["committed"].update(item["po_id"] for item in batch)
+            time.sleep(args.ingest_pause_ms / 1000)
+
+    def edit(worker: int) -> None:
+        rng = random.Random(index * 100 + worker)
+        version = 0
+        while not stop.is_set():
+            version += 1
+            started = time.perf_counter()
+            try:
+                insert_or_replace_po(po(rng.randrange(args.pos), version))
+            except Exception as e:
+                failed(e)
+                continue
+            with lock:
+                results["writes"] += 1
+                results["edit_ms"].append((time.perf_counter() - started) * 1000)
+            time.sleep(args.edit_pause_ms / 1000)
+
+    threads = ([threading.Thread(target=ingest, args=(i,)) for i in range(args.ingest_threads)]
+               + [threading.Thread(target=edit, args=(i,)) for i in range(args.edit_threads)])
+    ready.release()
+    start.wait()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    out.put(results)
+
+
+def run(path: Path, tuned: bool, args) -> dict:
+    engine = _bind(path, tuned)
+    Base.metadata.create_all(bind=engine)
+    insert_or_replace_pos([po(i) for i in range(args.pos)])
+    engine.dispose()
+
+    context = multiprocessing.get_context("spawn")
+    ready, start, stop, out = context.Semaphore(0), context.Event(), context.Event(), context.Queue()
+    processes = [context.Process(target=writer_process, args=(path, tuned, args, i, ready, start, stop, out))
+                 for i in range(args.writer_processes)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+
+    lock = threading.Lock()
+    results = {"read_ms": [], "export_ms": [], "reads": 0, "read_errors": 0, "other_errors": 0}
+
+    def read(worker: int) -> None:
+        rng = random.Random(1000 + worker)
+        start.wait()
+        while not stop.is_set():
+            started = time.perf_counter()
+            kind = rng.random()
+            try:
+                if kind < args.export_share:
+                    # An export: the statement (and its read lock) stays open while rows are processed.
+                    session = SessionLocal()
+                    try:
+                        for row in session.execute(text(
+                                "SELECT p.po_id, p.client_name, p.amount, m.milestone_name, m.milestone_due_date "
+                                "FROM purchase_orders p LEFT JOIN milestones m ON m.po_id = p.po_id")):
+                            dict(row._mapping)
+                    finally:
+                        session.close()
+                elif kind < (1 + args.export_share) / 2:
+                    get_po_with_schedule(f"PO-{rng.randrange(args.pos)}")
+                else:
+                    session = SessionLocal()
+                    try:
+                        session.execute(text("SELECT client_name, SUM(amount), COUNT(*) FROM purchase_orders GROUP BY client_name")).all()
+                    finally:
+                        session.close()
+            except Exception as e:
+                with lock:
+                    results["read_errors" if is_locked(e) else "other_errors"] += 1
+                if not is_locked(e):
+                    print(f"  unexpected error: {e}")
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with lock:
+                results["export_ms" if kind < args.export_share else "read_ms"].append(elapsed_ms)
+                results["reads"] += 1
+            time.sleep(args.read_pause_ms / 1000)
+
+    readers = [threading.Thread(target=read, args=(i,)) for i in range(args.readers)]
+    for thread in readers:
+        thread.start()
+    started = time.perf_counter()
+    start.set()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in readers:
+        thread.join()
+    writers = [out.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    committed = set().union(*(writer["committed"] for writer in writers))
+    session = SessionLocal()
+    try:
+        stored = {po_id for po_id, in session.query(PurchaseOrder.po_id)}
+        journal_mode = session.execute(text("PRAGMA journal_mode")).scalar()
+    finally:
+        session.close()
+    engine.dispose()
+    results.update(
+        elapsed=elapsed, journal_mode=journal_mode, lost=len(committed - stored),
+        writes=sum(writer["writes"] for writer in writers),
+        edit_ms=[ms for writer in writers for ms in writer["edit_ms"]],
+        write_errors=sum(writer["write_errors"] for writer in writers),
+        other_errors=results["other_errors"] + sum(writer["other_errors"] for writer in writers),
+    )
+    return results
+
+
+def report(label: str, results: dict) -> None:
+    read_ms = results["read_ms"]
+    print(f"{label} (journal_mode={results['journal_mode']}):")
+    export_ms = results["export_ms"]
+    print(f"  reads: {results['reads'] / results['elapsed']:.0f}/s, lookup latency p50 {percentile(read_ms, 0.5):.1f} ms, "
+          f"p95 {percentile(read_ms, 0.95):.1f} ms, p99 {percentile(read_ms, 0.99):.1f} ms, max {max(read_ms, default=0):.1f} ms; "
+          f"export p50 {percentile(export_ms, 0.5):.0f} ms, max {max(export_ms, default=0):.0f} ms")
+    edit_ms = results["edit_ms"]
+    print(f"  writes: {results['writes'] / results['elapsed']:.0f} POs/s, single-PO save latency p50 {percentile(edit_ms, 0.5):.1f} ms, "
+          f"p99 {percentile(edit_ms, 0.99):.1f} ms, max {max(edit_ms, default=0):.1f} ms")
+    print(f"  'database is locked': {results['read_errors']} reads, {results['write_errors']} writes; "
+          f"other errors: {results['other_errors']}; committed POs missing: {results['lost']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Stress-test concurrent SQLite reads and writes, default vs tuned engine.")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--pos", type=int, default=2000, help="POs in the database before the run.")
+    parser.add_argument("--writer-processes", type=int, default=2, help="Processes writing alongside the readers (job workers, web workers).")
+    parser.add_argument("--ingest-threads", type=int, default=1, help="Batch writers per writer process.")
+    parser.add_argument("--batch-size", type=int, default=50, help="POs per ingest transaction.")
+    parser.add_argument("--ingest-pause-ms", type=float, default=50.0, help="Pause between batches (download and LLM time).")
+    parser.add_argument("--edit-threads", type=int, default=1, help="Single-PO writers per writer process.")
+    parser.add_argument("--edit-pause-ms", type=float, default=20.0)
+    parser.add_argument("--readers", type=int, default=4, help="Reader threads in the measuring process.")
+    parser.add_argument("--read-pause-ms", type=float, default=10.0)
+    parser.add_argument("--export-share", type=float, default=0.05, help="Share of reads that stream every PO with its milestones.")
+    args = parser.parse_args()
+    logging.getLogger("invoice_app").setLevel(logging.CRITICAL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = run(Path(tmp) / "default.db", False, args)
+        tuned = run(Path(tmp) / "tuned.db", True, args)
+
+    report("default engine", baseline)
+    report("tuned engine", tuned)
+    for label, key in (("Lookup", "read_ms"), ("Save", "edit_ms")):
+        ratio = percentile(baseline[key], 0.99) / max(percentile(tuned[key], 0.99), 0.001)
+        print(f"{label} p99 latency {ratio:.1f}x lower with the tuned engine")
+    failed = bool(tuned["read_errors"] or tuned["write_errors"] or tuned["other_errors"] or tuned["lost"] or baseline["lost"])
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+Measures cold-start time of the Flask app module.
+
+Every run starts a fresh interpreter and imports app.py, so nothing is shared
+between runs. With --compare-ref the same measurement is made on another git
+revision (exported to a temporary directory), and the benchmark fails unless
+the current tree starts at least --min-improvement faster.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --compare-ref HEAD~1 --min-improvement 0.3
+    python -m benchmarks.bench_startup --max-ms 1500 --importtime
+"""
+import io
+import os
+import sys
+import json
+import tarfile
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+from typing import List
+
+# app.py is loaded by path because the app/ package shadows the module name.
+IMPORT_SNIPPET = """
+import sys, time, json, importlib.util
+sys.path.insert(0, ".")
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("app_main", "app.py")
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = (time.perf_counter() - started) * 1000
+print("STARTUP_RESULT " + json.dumps({"import_ms": elapsed, "modules": len(sys.modules)}))
+"""
+
+
+def measure_startup(tree: Path, runs: int) -> dict:
+    """Imports app.py in `runs` fresh interpreters inside `tree` and returns timing stats."""
+    samples: List[float] = []
+    modules = 0
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            cwd=tree, capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        )
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("STARTUP_RESULT ")]
+        if proc.returncode != 0 or not lines:
+            raise RuntimeError(f"Importing app.py in {tree} failed:\n{proc.stderr[-2000:]}")
+        result = json.loads(lines[-1][len("STARTUP_RESULT "):])
+        samples.append(result["import_ms"])
+        modules = result["modules"]
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+        "modules_loaded": modules,
+    }
+
+
+def slowest_imports(tree: Path, limit: int = 10) -> List[str]:
+    """Returns the slowest top-level imports of app.py, from python -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SNIPPET],
+        cwd=tree, capture_output=True, text=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented; keep only the top-level ones.
+        if name.startswith(" ") and not name.startswith("  "):
+            rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return [f"{cumulative / 1000:8.1f} ms  {name}" for cumulative, name in rows[:limit]]
+
+
+def export_revision(ref: str, target: Path) -> None:
+    archive = subprocess.run(["git", "archive", ref], capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of app.py.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement.")
+    parser.add_argument("--compare-ref", help="Git revision to compare against (e.g. HEAD~1).")
+    parser.add_argument("--min-improvement", type=float, default=0.0, help="Required fractional speed-up over --compare-ref (0.3 = 30%%).")
+    parser.add_argument("--max-ms", type=float, help="Fail if the median start-up time exceeds this.")
+    parser.add_argument("--importtime", action="store_true", help="Also list the slowest top-level imports.")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON.")
+    args = parser.parse_args()
+
+    tree = Path.cwd()
+    results = {"current": measure_startup(tree, args.runs)}
+    print(f"Current tree: median {results['current']['median_ms']} ms "
+          f"(min {results['current']['min_ms']}, max {results['current']['max_ms']}), "
+          f"{results['current']['modules_loaded']} modules loaded")
+
+    failed = False
+    if args.compare_ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            export_revision(args.compare_ref, Path(tmp))
+            results["baseline"] = measure_startup(Path(tmp), args.runs)
+        results["baseline"]["ref"] = args.compare_ref
+        improvement = 1 - results["current"]["median_ms"] / results["baseline"]["median_ms"]
+        results["improvement"] = round(improvement, 3)
+        print(f"{args.compare_ref}: median {results['baseline']['median_ms']} ms, "
+              f"{results['baseline']['modules_loaded']} modules loaded")
+        print(f"Improvement: {improvement:.1%} (required {args.min_improvement:.0%})")
+        failed |= improvement < args.min_improvement
+
+    if args.max_ms is not None and results["current"]["median_ms"] > args.max_ms:
+        print(f"Median start-up time exceeds {args.max_ms} ms")
+        failed = True
+
+    if args.importtime:
+        print("Slowest top-level imports:")
+        print("\n".join(slowest_imports(tree)))
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
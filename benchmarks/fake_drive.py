@@ -0,0 +1,276 @@
+"""
+An in-memory stand-in for the Google Drive v3 service, for benchmarks and
+local checks of the Drive sync code without network access or credentials.
+
+It supports the calls the app makes: files().list (parents / trashed /
+mimeType queries, paging and field selection), files().get, files().get_media
+(ranged downloads through MediaIoBaseDownload), and changes().getStartPageToken
+and changes().list. Every API call is counted, and can be given a simulated
+round-trip latency.
+"""
+import re
+import time
+import hashlib
+import itertools
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+PDF_MIME_TYPE = "application/pdf"
+BASE_TIME = datetime(2025, 1, 1)
+
+
+def _http_error(status: int, message: str) -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), message.encode("utf-8"))
+
+
+def _select_fields(item: dict, fields: Optional[str]) -> dict:
+    """Keeps only the file fields named in a 'files(a, b)' or 'a, b' fields string."""
+    if not fields:
+        return dict(item)
+    match = re.search(r"files\(([^)]*)\)", fields)
+    names = match.group(1) if match else fields
+    wanted = {name.strip() for name in names.split(",")}
+    return {key: value for key, value in item.items() if key in wanted}
+
+
+class _Request:
+    def __init__(self, drive: "FakeDrive", method: str, fn):
+        self._drive = drive
+        self._method = method
+        self._fn = fn
+
+    def execute(self):
+        self._drive._record_call(self._method)
+        return self._fn()
+
+
+class _MediaHttp:
+    """Serves ranged GETs of one file's content, as MediaIoBaseDownload expects."""
+
+    def __init__(self, drive: "FakeDrive", content: bytes):
+        self._drive = drive
+        self._content = content
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        self._drive._record_call("files.get_media")
+        start, end = 0, len(self._content) - 1
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        if match:
+            start, end = int(match.group(1)), min(int(match.group(2)), len(self._content) - 1)
+        chunk = self._content[start:end + 1]
+        resp = httplib2.Response({"status": 206, "content-range": f"bytes {start}-{end}/{len(self._content)}"})
+        return resp, chunk
+
+
+class _Files:
+    def __init__(self, drive: "FakeDrive"):
+        self._drive = drive
+
+    def list(self, q: str = "", fields: Optional[str] = None, pageSize: int = 100, pageToken: Optional[str] = None, **kwargs):
+        return _Request(self._drive, "files.list", lambda: self._drive._list(q, fields, pageSize, pageToken))
+
+    def get(self, fileId: str, fields: Optional[str] = None, **kwargs):
+        def run():
+            item = self._drive.items.get(fileId)
+            if item is None:
+                raise _http_error(404, f"File not found: {fileId}")
+            return _select_fields(self._drive._metadata(item), fields)
+        return _Request(self._drive, "files.get", run)
+
+    def get_media(self, fileId: str, **kwargs):
+        item = self._drive.items.get(fileId)
+        if item is None:
+            raise _http_error(404, f"File not found: {fileId}")
+        return HttpRequest(_MediaHttp(self._drive, item["content"]), None, f"https://fake.drive/files/{fileId}?alt=media", headers={})
+
+
+class _Changes:
+    def __init__(self, drive: "FakeDrive"):
+        self._drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        return _Request(self._drive, "changes.getStartPageToken", lambda: {"startPageToken": self._drive._page_token(len(self._drive.change_log))})
+
+    def list(self, pageToken: str, pageSize: int = 100, includeRemoved: bool = True, **kwargs):
+        return _Request(self._drive, "changes.list", lambda: self._drive._list_changes(pageToken, pageSize))
+
+
+class FakeDriveService:
+    """The object returned by googleapiclient's build('drive', 'v3'), backed by a FakeDrive."""
+
+    def __init__(self, drive: "FakeDrive"):
+        self._drive = drive
+
+    def files(self) -> _Files:
+        return _Files(self._drive)
+
+    def changes(self) -> _Changes:
+        return _Changes(self._drive)
+
+    def close(self) -> None:
+        pass
+
+
+class FakeDrive:
+    """
+    The state of a fake Drive: files and folders, a change log, and API call counters.
+
+    Args:
+        latency_ms: Simulated round-trip time added to every API call.
+        max_page_size: Upper bound on files().list and changes().list page sizes.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, max_page_size: int = 1000):
+        self.latency_ms = latency_ms
+        self.max_page_size = max_page_size
+        self.items: Dict[str, dict] = {}
+        self.change_log: List[str] = []
+        self.token_epoch = 0
+        self.calls = Counter()
+        self._ids = itertools.count(1)
+        self._clock = itertools.count(1)
+        self._lock = threading.Lock()
+        self.items["root"] = {"id": "root", "name": "My Drive", "mimeType": FOLDER_MIME_TYPE, "parents": [], "trashed": False,
+                              "modifiedTime": self._timestamp(), "content": b""}
+
+    def service(self) -> FakeDriveService:
+        return FakeDriveService(self)
+
+    def _record_call(self, method: str) -> None:
+        with self._lock:
+            self.calls[method] += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _timestamp(self) -> str:
+        # Every modification gets a distinct, increasing modifiedTime.
+        return (BASE_TIME + timedelta(seconds=next(self._clock))).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    def _touch(self, file_id: str) -> None:
+        self.change_log.append(file_id)
+
+    def _metadata(self, item: dict) -> dict:
+        meta = {key: value for key, value in item.items() if key != "content"}
+        if item["mimeType"] != FOLDER_MIME_TYPE:
+            meta["size"] = str(len(item["content"]))
+            meta["md5Checksum"] = hashlib.md5(item["content"]).hexdigest()
+        return meta
+
+    # --- Mutations -------------------------------------------------------
+
+    def add_folder(self, name: str, parent: str = "root") -> str:
+        folder_id = f"folder{next(self._ids)}"
+        self.items[folder_id] = {"id": folder_id, "name": name, "mimeType": FOLDER_MIME_TYPE, "parents": [parent],
+                                 "trashed": False, "modifiedTime": self._timestamp(), "content": b""}
+        self._touch(folder_id)
+        return folder_id
+
+    def add_file(self, name: str, parent: str, content: bytes = b"%PDF-1.4", mime_type: str = PDF_MIME_TYPE) -> str:
+        file_id = f"file{next(self._ids)}"
+        self.items[file_id] = {"id": file_id, "name": name, "mimeType": mime_type, "parents": [parent],
+                               "trashed": False, "modifiedTime": self._timestamp(), "content": content}
+        self._touch(file_id)
+        return file_id
+
+    def update_file(self, file_id: str, content: Optional[bytes] = None, name: Optional[str] = None) -> None:
+        item = self.items[file_id]
+        if content is not None:
+            item["content"] = content
+        if name is not None:
+            item["name"] = name
+        item["modifiedTime"] = self._timestamp()
+        self._touch(file_id)
+
+    def move(self, file_id: str, new_parent: str) -> None:
+        self.items[file_id]["parents"] = [new_parent]
+        self._touch(file_id)
+
+    def trash(self, file_id: str) -> None:
+        self.items[file_id]["trashed"] = True
+        self._touch(file_id)
+
+    def delete(self, file_id: str) -> None:
+        del self.items[file_id]
+        self._touch(file_id)
+
+    def expire_tokens(self) -> None:
+        """Makes every page token issued so far invalid, as Drive does for old tokens."""
+        self.token_epoch += 1
+
+    def _page_token(self, position: int, offset: Optional[int] = None) -> str:
+        token = f"{self.token_epoch}.{position}"
+        return token if offset is None else f"{token}:{offset}"
+
+    def reset_calls(self) -> None:
+        self.calls.clear()
+
+    # --- Queries ---------------------------------------------------------
+
+    def _matches(self, item: dict, q: str) -> bool:
+        parents = re.findall(r"'([^']+)' in parents", q)
+        if parents and not any(parent in item["parents"] for parent in parents):
+            return False
+        if "trashed = false" in q and item["trashed"]:
+            return False
+        for op, mime in re.findall(r"mimeType\s*(!?=)\s*'([^']+)'", q):
+            if (item["mimeType"] == mime) != (op == "="):
+                return False
+        return True
+
+    def _list(self, q: str, fields: Optional[str], page_size: int, page_token: Optional[str]) -> dict:
+        matches = sorted((item for item in self.items.values() if item["id"] != "root" and self._matches(item, q)),
+                         key=lambda item: item["id"])
+        offset = int(page_token or 0)
+        size = min(page_size or 100, self.max_page_size)
+        page = matches[offset:offset + size]
+        response = {"files": [_select_fields(self._metadata(item), fields) for item in page]}
+        if offset + size < len(matches):
+            response["nextPageToken"] = str(offset + size)
+        return response
+
+    def _list_changes(self, page_token: str, page_size: int) -> dict:
+        token, _, offset = page_token.partition(":")
+        epoch, _, start = token.partition(".")
+        if int(epoch) != self.token_epoch:
+            raise _http_error(404, f"Invalid page token: {page_token}")
+        start, offset = int(start), int(offset or 0)
+        # Like Drive, report each changed file once, with its current state.
+        changed_ids = list(dict.fromkeys(reversed(self.change_log[start:])))[::-1]
+        size = min(page_size or 100, self.max_page_size)
+        changes = []
+        for file_id in changed_ids[offset:offset + size]:
+            item = self.items.get(file_id)
+            if item is None:
+                changes.append({"fileId": file_id, "removed": True})
+            else:
+                changes.append({"fileId": file_id, "removed": False, "file": self._metadata(item)})
+        response = {"changes": changes}
+        if offset + size < len(changed_ids):
+            response["nextPageToken"] = self._page_token(start, offset + size)
+        else:
+            response["newStartPageToken"] = self._page_token(len(self.change_log))
+        return response
+
+
+def build_hierarchy(drive: FakeDrive, clients: int = 3, years: int = 2, months: int = 12, files_per_folder: int = 5,
+                    parent: str = "root") -> str:
+    """
+    Builds a client/year/month folder hierarchy of small PDFs and returns the top folder's ID.
+    """
+    top = drive.add_folder("POs", parent)
+    for c in range(clients):
+        client = drive.add_folder(f"Client {c + 1}", top)
+        for y in range(years):
+            year = drive.add_folder(str(2024 + y), client)
+            for m in range(months):
+                month = drive.add_folder(f"{m + 1:02d}", year)
+                for f in range(files_per_folder):
+                    drive.add_file(f"PO-{c + 1}-{2024 + y}-{m + 1:02d}-{f + 1}.pdf", month,
+                                   content=f"%PDF-1.4 client {c} year {y} month {m} file {f}".encode("utf-8"))
+    return top
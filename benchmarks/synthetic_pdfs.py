@@ -0,0 +1,92 @@
+"""
+Builds enlarged PDF variants of the sample POs for benchmarking.
+
+The variants are generated in memory with PyMuPDF, so no large fixtures need
+to be committed:
+- "pages": a sample PO followed by many pages of annexure text
+- "tables": a sample PO followed by pages full of ruled payment tables
+"""
+import fitz
+from pathlib import Path
+from typing import Dict, List
+
+SAMPLE_PO_DIR = Path("input") / "POs"
+
+ANNEXURE_TEXT = (
+    "Annexure {page}: Statement of Work. The supplier shall provide the services described in this "
+    "annexure in accordance with the terms of the master services agreement. Deliverables are subject "
+    "to acceptance by the client project lead. All work products remain the property of the client. "
+)
+
+
+def sample_pdfs() -> Dict[str, bytes]:
+    """Returns the bundled sample POs as {file name: PDF bytes}."""
+    return {path.name: path.read_bytes() for path in sorted(SAMPLE_PO_DIR.glob("*.pdf"))}
+
+
+def _add_annexure_page(doc: "fitz.Document", page_number: int) -> None:
+    page = doc.new_page()
+    text = (ANNEXURE_TEXT.format(page=page_number) * 12).strip()
+    page.insert_textbox(fitz.Rect(50, 50, 545, 790), text, fontsize=9)
+
+
+def _draw_table(page: "fitz.Page", top: float, rows: List[List[str]], col_width: float = 160, row_height: float = 18) -> float:
+    """Draws a ruled table at the given height and returns the y coordinate below it."""
+    left = 50
+    width = col_width * len(rows[0])
+    for r, row in enumerate(rows):
+        y = top + r * row_height
+        for c, cell in enumerate(row):
+            page.insert_text((left + c * col_width + 4, y + 13), cell, fontsize=9)
+    for r in range(len(rows) + 1):
+        y = top + r * row_height
+        page.draw_line((left, y), (left + width, y))
+    for c in range(len(rows[0]) + 1):
+        x = left + c * col_width
+        page.draw_line((x, top), (x, top + len(rows) * row_height))
+    return top + len(rows) * row_height
+
+
+def _add_table_page(doc: "fitz.Document", page_number: int, tables_per_page: int) -> None:
+    page = doc.new_page()
+    top = 50
+    for t in range(tables_per_page):
+        rows = [["Payment Date", "Amount", "Description"]]
+        rows += [[f"{(r % 28) + 1:02d}/{(t % 12) + 1:02d}/2026", f"${(r + 1) * 1000:,}", f"Instalment {page_number}.{t}.{r}"] for r in range(6)]
+        top = _draw_table(page, top, rows) + 20
+
+
+def enlarged_pdf(base: bytes, extra_pages: int = 40, table_pages: int = 0, tables_per_page: int = 5) -> bytes:
+    """
+    Appends annexure text pages and/or ruled table pages to a sample PO.
+
+    Args:
+        base: The sample PO bytes.
+        extra_pages: Number of text-only annexure pages to add.
+        table_pages: Number of pages of payment tables to add.
+        tables_per_page: Ruled tables drawn on each table page.
+
+    Returns:
+        bytes: The enlarged PDF.
+    """
+    with fitz.open(stream=base, filetype="pdf") as src, fitz.open() as doc:
+        doc.insert_pdf(src)
+        for i in range(extra_pages):
+            _add_annexure_page(doc, i + 1)
+        for i in range(table_pages):
+            _add_table_page(doc, i + 1, tables_per_page)
+        return doc.tobytes(garbage=3, deflate=True)
+
+
+def benchmark_corpus(pages: int = 40, table_pages: int = 10) -> Dict[str, bytes]:
+    """
+    Returns the sample POs plus an enlarged "many pages" and "many tables"
+    variant of the first sample.
+    """
+    corpus = sample_pdfs()
+    if not corpus:
+        raise FileNotFoundError(f"No sample PDFs found in {SAMPLE_PO_DIR}")
+    base = next(iter(corpus.values()))
+    corpus[f"synthetic-{pages}-pages.pdf"] = enlarged_pdf(base, extra_pages=pages)
+    corpus[f"synthetic-{table_pages}-table-pages.pdf"] = enlarged_pdf(base, extra_pages=0, table_pages=table_pages)
+    return corpus
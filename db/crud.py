@@ -1,67 +1,77 @@
-from db.database import SessionLocal, PurchaseOrder, Milestone, PaymentSchedule, DriveFile
-from datetime import datetime
+import json
+from db.database import SessionLocal, PurchaseOrder, Milestone, PaymentSchedule, DriveFile, DriveSyncState, SyncJob, SyncJobFile
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, insert, delete, update, case, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app.core.logger import setup_logger
 
 logger = setup_logger()
 
-def insert_or_replace_po(po_dict: dict):
-    session = SessionLocal()
+# Rows per drive_files INSERT or DELETE statement, well under SQLite's bound-parameter limit.
+DRIVE_FILE_BATCH_SIZE = 500
+
+def _upsert_po(session, po_dict: dict):
+    """Adds or updates one PO and its milestones/payment schedule in an open session, without committing."""
     po_id = po_dict.get("po_id")
-    try:
-        logger.info(f"Upserting PO: {po_id}")
-        existing_po = session.query(PurchaseOrder).filter_by(po_id=po_id).first()
-        if existing_po:
-            logger.info(f"Updating existing PO: {po_id}")
-            existing_po.client_name = po_dict.get("client_name")
-            existing_po.amount = po_dict.get("amount")
-            existing_po.status = po_dict.get("status")
-            existing_po.payment_terms = po_dict.get("payment_terms")
-            existing_po.payment_type = po_dict.get("payment_type")
-            existing_po.start_date = po_dict.get("start_date")
-            existing_po.end_date = po_dict.get("end_date")
-            existing_po.duration_months = po_dict.get("duration_months")
-            existing_po.payment_frequency = po_dict.get("payment_frequency")
-            existing_po.project_owner = po_dict.get("project_owner")
-            session.query(Milestone).filter_by(po_id=po_id).delete()
-            session.query(PaymentSchedule).filter_by(po_id=po_id).delete()
-            if existing_po.payment_type == "milestone":
-                for ms in po_dict.get("milestones", []):
-                    logger.debug(f"Adding milestone for PO {po_id}: {ms}")
-                    session.add(Milestone(po_id=po_id, **ms))
-            elif existing_po.payment_type == "distributed":
-                for sched in po_dict.get("payment_schedule", []):
-                    logger.debug(f"Adding payment schedule for PO {po_id}: {sched}")
-                    session.add(PaymentSchedule(po_id=po_id, **sched))
-            session.commit()
-            logger.info(f"PO {po_id} updated successfully.")
-            return
-
-        # PO does not exist, proceed with insertion
-        logger.info(f"Inserting new PO: {po_id}")
-        po = PurchaseOrder(
-            po_id=po_dict["po_id"],
-            client_name=po_dict.get("client_name"),
-            amount=po_dict.get("amount"),
-            status=po_dict.get("status"),
-            payment_terms=po_dict.get("payment_terms"),
-            payment_type=po_dict.get("payment_type"),
-            start_date=po_dict.get("start_date"),
-            end_date=po_dict.get("end_date"),
-            duration_months=po_dict.get("duration_months"),
-            payment_frequency=po_dict.get("payment_frequency"),
-            project_owner=po_dict.get("project_owner")
-        )
-        session.add(po)
-        if po.payment_type == "milestone":
+    logger.info(f"Upserting PO: {po_id}")
+    existing_po = session.query(PurchaseOrder).filter_by(po_id=po_id).first()
+    if existing_po:
+        logger.info(f"Updating existing PO: {po_id}")
+        existing_po.client_name = po_dict.get("client_name")
+        existing_po.amount = po_dict.get("amount")
+        existing_po.status = po_dict.get("status")
+        existing_po.payment_terms = po_dict.get("payment_terms")
+        existing_po.payment_type = po_dict.get("payment_type")
+        existing_po.start_date = po_dict.get("start_date")
+        existing_po.end_date = po_dict.get("end_date")
+        existing_po.duration_months = po_dict.get("duration_months")
+        existing_po.payment_frequency = po_dict.get("payment_frequency")
+        existing_po.project_owner = po_dict.get("project_owner")
+        session.query(Milestone).filter_by(po_id=po_id).delete()
+        session.query(PaymentSchedule).filter_by(po_id=po_id).delete()
+        if existing_po.payment_type == "milestone":
             for ms in po_dict.get("milestones", []):
-                logger.debug(f"Adding milestone for new PO {po_id}: {ms}")
+                logger.debug(f"Adding milestone for PO {po_id}: {ms}")
                 session.add(Milestone(po_id=po_id, **ms))
-        elif po.payment_type == "distributed":
+        elif existing_po.payment_type == "distributed":
             for sched in po_dict.get("payment_schedule", []):
-                logger.debug(f"Adding payment schedule for new PO {po_id}: {sched}")
+                logger.debug(f"Adding payment schedule for PO {po_id}: {sched}")
                 session.add(PaymentSchedule(po_id=po_id, **sched))
+        return
+
+    # PO does not exist, proceed with insertion
+    logger.info(f"Inserting new PO: {po_id}")
+    po = PurchaseOrder(
+        po_id=po_dict["po_id"],
+        client_name=po_dict.get("client_name"),
+        amount=po_dict.get("amount"),
+        status=po_dict.get("status"),
+        payment_terms=po_dict.get("payment_terms"),
+        payment_type=po_dict.get("payment_type"),
+        start_date=po_dict.get("start_date"),
+        end_date=po_dict.get("end_date"),
+        duration_months=po_dict.get("duration_months"),
+        payment_frequency=po_dict.get("payment_frequency"),
+        project_owner=po_dict.get("project_owner")
+    )
+    session.add(po)
+    if po.payment_type == "milestone":
+        for ms in po_dict.get("milestones", []):
+            logger.debug(f"Adding milestone for new PO {po_id}: {ms}")
+            session.add(Milestone(po_id=po_id, **ms))
+    elif po.payment_type == "distributed":
+        for sched in po_dict.get("payment_schedule", []):
+            logger.debug(f"Adding payment schedule for new PO {po_id}: {sched}")
+            session.add(PaymentSchedule(po_id=po_id, **sched))
+
+
+def insert_or_replace_po(po_dict: dict):
+    session = SessionLocal()
+    po_id = po_dict.get("po_id")
+    try:
+        _upsert_po(session, po_dict)
         session.commit()
-        logger.info(f"PO {po_id} inserted successfully.")
+        logger.info(f"PO {po_id} upserted successfully.")
     except Exception as e:
         session.rollback()
         logger.error(f"Error upserting PO {po_id}: {e}")
@@ -70,6 +80,30 @@ def insert_or_replace_po(po_dict: dict):
         session.close()
 
 
+def insert_or_replace_pos(po_dicts: list[dict]):
+    """
+    Upserts several POs in a single transaction.
+
+    Either every PO in the batch is stored or, on error, none of them are.
+
+    Args:
+        po_dicts: PO dictionaries in the same shape accepted by insert_or_replace_po.
+    """
+    session = SessionLocal()
+    try:
+        logger.info(f"Upserting batch of {len(po_dicts)} POs.")
+        for po_dict in po_dicts:
+            _upsert_po(session, po_dict)
+        session.commit()
+        logger.info(f"Batch of {len(po_dicts)} POs upserted successfully.")
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error upserting batch of {len(po_dicts)} POs: {e}")
+        raise
+    finally:
+        session.close()
+
+
 def get_po_with_schedule(po_id: str):
     session = SessionLocal()
     try:
@@ -118,111 +152,479 @@ def get_po_with_schedule(po_id: str):
         session.close()
 
 
-def upsert_drive_files_sqlalchemy(files_data: list[dict]):
+def parse_drive_time(value):
+    """
+    Parses a Drive RFC 3339 timestamp such as '2025-06-01T10:00:00.000Z'.
+
+    Returns a naive UTC datetime, as SQLite stores and returns it, so stored
+    and freshly listed times compare equal.
     """
-    Upserts (updates or inserts) DriveFile records using SQLAlchemy.
-    Deletes records from the DB that are not in the provided files_data list based on ID.
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    except ValueError:
+        logger.warning(f"Could not parse Drive timestamp: {value}")
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _drive_file_row(file_data: dict, root_id: str) -> dict:
+    size = file_data.get('size')
+    return {
+        'id': file_data['id'],
+        'name': file_data.get('name'),
+        'last_edited': parse_drive_time(file_data.get('modifiedTime')) or datetime.utcnow(),
+        'md5_checksum': file_data.get('md5Checksum'),
+        'size': int(size) if size is not None else None,
+        'mime_type': file_data.get('mimeType'),
+        'sync_root': root_id,
+    }
+
+
+def _drive_file_state(row) -> tuple:
+    return (row['name'], row['last_edited'], row['md5_checksum'], row['size'], row['mime_type'], row['sync_root'])
+
+
+def _write_drive_file_rows(session, rows: list[dict]) -> None:
+    """
+    Inserts or updates drive_files rows with batched INSERT ... ON CONFLICT DO
+    UPDATE statements. A row keeps its PO link only while its checksum is
+    unchanged.
+    """
+    if not rows:
+        return
+    stmt = sqlite_insert(DriveFile)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DriveFile.id],
+        set_={
+            "name": stmt.excluded.name,
+            "last_edited": stmt.excluded.last_edited,
+            "md5_checksum": stmt.excluded.md5_checksum,
+            "size": stmt.excluded.size,
+            "mime_type": stmt.excluded.mime_type,
+            "sync_root": stmt.excluded.sync_root,
+            "po_id": case((DriveFile.md5_checksum == stmt.excluded.md5_checksum, DriveFile.po_id), else_=None),
+        },
+    )
+    for i in range(0, len(rows), DRIVE_FILE_BATCH_SIZE):
+        session.execute(stmt, rows[i:i + DRIVE_FILE_BATCH_SIZE])
+
+
+def upsert_drive_files_sqlalchemy(files_data: list[dict], root_id: str) -> dict:
+    """
+    Syncs the drive_files rows of one synced folder to a full listing of it.
+
+    The current rows are read in one query and compared in memory. Only new
+    or changed files are written, with batched SQLite INSERT ... ON CONFLICT
+    DO UPDATE statements. Rows of this folder whose IDs are no longer listed
+    are deleted in bulk; rows listed under other folders are left alone.
+    Everything runs in one short transaction.
 
     Args:
         files_data: A list of dictionaries, where each dictionary
                     represents a file and contains 'id', 'name',
-                    and 'modifiedTime' (as an ISO 8601 string).
-    """
-    session = SessionLocal()
-    try:
-        logger.info(f"Upserting {len(files_data)} DriveFile records.")
-        current_db_file_ids = {db_file.id for db_file in session.query(DriveFile.id).all()}
-        processed_ids = set()
-
-        for file_data in files_data:
-            file_id = file_data.get('id')
-            file_name = file_data.get('name')
-            logger.debug(f"Processing DriveFile: id={file_id}, name={file_name}")
-            processed_ids.add(file_id)
-
-            modified_time_str = file_data.get('modifiedTime')
-            last_edited_dt = None
-            if modified_time_str:
-                try:
-                    if modified_time_str.endswith('Z'):
-                        last_edited_dt = datetime.fromisoformat(modified_time_str[:-1] + '+00:00')
-                    else:
-                        last_edited_dt = datetime.fromisoformat(modified_time_str)
-                except Exception as ve:
-                    logger.error(f"Could not parse modifiedTime for file {file_id}: {modified_time_str}. Error: {ve}")
-                    last_edited_dt = datetime.utcnow()
-            else:
-                logger.warning(f"No modifiedTime for file {file_id}, using current UTC time.")
-                last_edited_dt = datetime.utcnow()
-
-            existing_file = session.query(DriveFile).filter_by(id=file_id).first()
-
-            if existing_file:
-                if existing_file.name != file_name or existing_file.last_edited != last_edited_dt:
-                    logger.info(f"Updating DriveFile {file_id}")
-                    existing_file.name = file_name
-                    existing_file.last_edited = last_edited_dt
-                else:
-                    logger.debug(f"No update needed for DriveFile {file_id}")
-            else:
-                logger.info(f"Inserting new DriveFile {file_id}")
-                new_file = DriveFile(
-                    id=file_id,
-                    name=file_name,
-                    last_edited=last_edited_dt
-                )
-                session.add(new_file)
-
-        ids_to_delete = current_db_file_ids - processed_ids
-        if ids_to_delete:
-            logger.info(f"Deleting DriveFiles from DB: {ids_to_delete}")
-            session.query(DriveFile).filter(DriveFile.id.in_(ids_to_delete)).delete(synchronize_session=False)
-        else:
-            logger.debug("No DriveFiles to delete from DB.")
+                    and 'modifiedTime' (as an ISO 8601 string), plus
+                    'md5Checksum' and 'size' when Drive reports them.
+        root_id: The ID of the folder that was listed.
+
+    Returns:
+        dict: Counts of "inserted", "updated", "deleted" and "unchanged" rows.
+    """
+    rows = {}
+    for file_data in files_data:
+        row = _drive_file_row(file_data, root_id)
+        rows[row['id']] = row
+    session = SessionLocal()
+    try:
+        columns = (DriveFile.id, DriveFile.name, DriveFile.last_edited, DriveFile.md5_checksum, DriveFile.size, DriveFile.mime_type,
+                   DriveFile.sync_root)
+        # This folder's rows, plus rows of listed files stored under another folder (or none yet).
+        current = {
+            file_id: tuple(state)
+            for file_id, *state in session.execute(select(*columns).where(DriveFile.sync_root == root_id))
+        }
+        listed_elsewhere = [file_id for file_id in rows if file_id not in current]
+        for i in range(0, len(listed_elsewhere), DRIVE_FILE_BATCH_SIZE):
+            current.update(
+                (file_id, tuple(state))
+                for file_id, *state in session.execute(select(*columns).where(DriveFile.id.in_(listed_elsewhere[i:i + DRIVE_FILE_BATCH_SIZE])))
+            )
+        changed = [row for file_id, row in rows.items() if current.get(file_id) != _drive_file_state(row)]
+        inserted = sum(1 for row in changed if row['id'] not in current)
+        vanished = [file_id for file_id, state in current.items() if file_id not in rows and state[-1] == root_id]
+        _write_drive_file_rows(session, changed)
+        for i in range(0, len(vanished), DRIVE_FILE_BATCH_SIZE):
+            session.execute(delete(DriveFile).where(DriveFile.id.in_(vanished[i:i + DRIVE_FILE_BATCH_SIZE])))
         session.commit()
-        logger.info("DriveFile upsert committed successfully.")
+        counts = {
+            "inserted": inserted,
+            "updated": len(changed) - inserted,
+            "deleted": len(vanished),
+            "unchanged": len(rows) - len(changed),
+        }
+        logger.info(f"Synced {len(rows)} DriveFile records: {counts}")
+        return counts
     except Exception as e:
         session.rollback()
         logger.error(f"Exception in upsert_drive_files_sqlalchemy: {e}")
         raise
     finally:
         session.close()
-        logger.debug("upsert_drive_files_sqlalchemy session closed.")
 
 
-def get_all_drive_files():
+def get_drive_file_index():
     """
-    Returns a dict mapping file name to (last_edited, id) for all files in the drive_files table.
+    Returns every drive_files row by file ID, for deciding what to extract.
+
+    Returns:
+        dict: {file_id: {"name", "last_edited", "md5_checksum", "size", "mime_type", "po_id", "sync_root"}}
     """
     session = SessionLocal()
     try:
-        logger.info("Fetching all DriveFiles from DB.")
-        files = session.query(DriveFile).all()
-        result = {f.name: (f.last_edited, f.id) for f in files}
-        logger.debug(f"Fetched {len(result)} DriveFiles.")
-        return result
+        rows = session.execute(select(DriveFile.id, DriveFile.name, DriveFile.last_edited, DriveFile.md5_checksum, DriveFile.size,
+                                      DriveFile.mime_type, DriveFile.po_id, DriveFile.sync_root))
+        index = {
+            file_id: {"name": name, "last_edited": last_edited, "md5_checksum": md5_checksum, "size": size,
+                      "mime_type": mime_type, "po_id": po_id, "sync_root": sync_root}
+            for file_id, name, last_edited, md5_checksum, size, mime_type, po_id, sync_root in rows
+        }
+        logger.debug(f"Fetched index of {len(index)} DriveFiles.")
+        return index
     finally:
         session.close()
 
 
-def delete_po_by_drive_file_id(file_id):
+def link_drive_files_to_pos(links: dict) -> None:
+    """Records which PO each Drive file's content was extracted into ({file_id: po_id})."""
+    if not links:
+        return
+    session = SessionLocal()
+    try:
+        session.execute(update(DriveFile), [{"id": file_id, "po_id": po_id} for file_id, po_id in links.items()])
+        session.commit()
+        logger.info(f"Linked {len(links)} DriveFiles to their POs.")
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error linking DriveFiles to POs: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def delete_unreferenced_pos(po_ids) -> int:
     """
-    Deletes all PO-related data (purchase order, milestones, payment schedule) for a given drive file id.
-    Assumes PO id is the same as drive file id or can be mapped (adjust as needed).
+    Deletes the given POs (with their milestones and payment schedule) unless
+    a Drive file still links to them, e.g. an identical copy elsewhere.
+
+    Returns:
+        int: The number of POs deleted.
     """
+    po_ids = {po_id for po_id in po_ids if po_id}
+    if not po_ids:
+        return 0
     session = SessionLocal()
     try:
-        logger.info(f"Deleting PO and related data for drive file id: {file_id}")
-        po = session.query(PurchaseOrder).filter_by(po_id=file_id).first()
-        if po:
+        referenced = set(session.scalars(select(DriveFile.po_id).where(DriveFile.po_id.in_(po_ids))))
+        orphaned = po_ids - referenced
+        pos = session.query(PurchaseOrder).filter(PurchaseOrder.po_id.in_(orphaned)).all() if orphaned else []
+        for po in pos:
             session.delete(po)
+        session.commit()
+        if pos:
+            logger.info(f"Deleted {len(pos)} POs no Drive file links to: {[po.po_id for po in pos]}")
+        return len(pos)
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error deleting unreferenced POs: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def apply_drive_file_changes(changed_files: list[dict], removed_ids, root_id: str):
+    """
+    Applies an incremental Drive sync to the drive_files table: upserts the
+    changed or added files and deletes the removed ones, leaving every other
+    row untouched.
+
+    Args:
+        changed_files: Drive file dicts with 'id', 'name' and 'modifiedTime'.
+        removed_ids: IDs of files that were deleted, trashed or moved out of
+            the synced folder.
+        root_id: The ID of the synced folder.
+    """
+    session = SessionLocal()
+    try:
+        logger.info(f"Applying Drive changes: {len(changed_files)} changed, {len(removed_ids)} removed.")
+        _write_drive_file_rows(session, [_drive_file_row(file_data, root_id) for file_data in changed_files])
+        removed_ids = list(removed_ids)
+        for i in range(0, len(removed_ids), DRIVE_FILE_BATCH_SIZE):
+            session.execute(delete(DriveFile).where(DriveFile.id.in_(removed_ids[i:i + DRIVE_FILE_BATCH_SIZE]),
+                                                    DriveFile.sync_root == root_id))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error applying Drive changes: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def get_drive_sync_state(folder_id: str):
+    """
+    Returns the saved incremental sync state for a watched folder, or None.
+
+    Returns:
+        dict: "start_page_token", "folder_ids" (the folders in its tree) and
+        "last_synced".
+    """
+    session = SessionLocal()
+    try:
+        state = session.get(DriveSyncState, folder_id)
+        if state is None:
+            return None
+        return {
+            "start_page_token": state.start_page_token,
+            "folder_ids": json.loads(state.folder_ids),
+            "last_synced": state.last_synced,
+        }
+    finally:
+        session.close()
+
+
+def save_drive_sync_state(folder_id: str, start_page_token: str, folder_ids):
+    """Stores the changes start-page token to resume from on the next sync of a folder."""
+    session = SessionLocal()
+    try:
+        session.merge(DriveSyncState(
+            folder_id=folder_id,
+            start_page_token=start_page_token,
+            folder_ids=json.dumps(sorted(folder_ids)),
+            last_synced=datetime.utcnow(),
+        ))
+        session.commit()
+        logger.info(f"Saved Drive sync token for folder {folder_id}.")
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error saving Drive sync state for folder {folder_id}: {e}")
+        raise
+    finally:
+        session.close()
+
+
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+
+def _load_json(value):
+    return json.loads(value) if value else None
+
+
+def _sync_job_dict(job: SyncJob) -> dict:
+    return {
+        "id": job.id,
+        "user": job.user,
+        "folder_id": job.folder_id,
+        "folder_name": job.folder_name,
+        "status": job.status,
+        "phase": job.phase,
+        "credentials": _load_json(job.credentials),
+        "state": _load_json(job.state),
+        "progress": _load_json(job.progress) or {},
+        "result": _load_json(job.result),
+        "error": job.error,
+        "attempts": job.attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def enqueue_sync_job(user: str, folder_id: str, folder_name: str, credentials: dict) -> tuple:
+    """
+    Queues a Drive folder sync, unless the user already has one queued or
+    running for the folder.
+
+    The credentials are stored without their client_secret; the worker adds
+    it back from the app's client secrets file.
+
+    Returns:
+        tuple: The job ID, and whether a new job was created.
+    """
+    session = SessionLocal()
+    try:
+        active = session.scalars(
+            select(SyncJob.id).where(SyncJob.user == user, SyncJob.folder_id == folder_id, SyncJob.status.in_(ACTIVE_JOB_STATUSES))
+        ).first()
+        if active is not None:
+            logger.info(f"Sync of folder {folder_id} for {user} is already queued as job {active}.")
+            return active, False
+        job = SyncJob(user=user, folder_id=folder_id, folder_name=folder_name, status="queued", attempts=0,
+                      credentials=json.dumps({key: value for key, value in credentials.items() if key != "client_secret"}),
+                      created_at=datetime.utcnow())
+        session.add(job)
+        session.commit()
+        logger.info(f"Queued sync job {job.id} for folder {folder_id} ({user}).")
+        return job.id, True
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error queueing sync job for folder {folder_id}: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def claim_sync_job(worker: str, stale_seconds: float, max_attempts: int):
+    """
+    Hands the oldest queued job to a worker, marking it running.
+
+    Running jobs whose worker has not sent a heartbeat for stale_seconds (it
+    crashed or was restarted) are queued again first, so they resume from
+    their checkpoints. A stale job that has already been claimed max_attempts
+    times is marked failed instead, and its credentials are dropped.
+
+    Returns:
+        dict: The claimed job (see get_sync_job), or None if the queue is empty.
+    """
+    session = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        stale = (SyncJob.status == "running", SyncJob.heartbeat_at < now - timedelta(seconds=stale_seconds))
+        abandoned = session.execute(
+            update(SyncJob)
+            .where(*stale, SyncJob.attempts >= max_attempts)
+            .values(status="failed", worker=None, credentials=None, finished_at=now,
+                    error=f"The worker stopped responding on all {max_attempts} attempts.")
+        ).rowcount
+        if abandoned:
+            logger.error(f"Marked {abandoned} sync jobs failed after {max_attempts} attempts.")
+        requeued = session.execute(
+            update(SyncJob).where(*stale).values(status="queued", worker=None)
+        ).rowcount
+        if requeued:
+            logger.warning(f"Requeued {requeued} sync jobs whose worker stopped responding.")
+        job_id = session.scalars(select(SyncJob.id).where(SyncJob.status == "queued").order_by(SyncJob.id).limit(1)).first()
+        if job_id is None:
             session.commit()
-            logger.info(f"PO {file_id} and related data deleted.")
-        else:
-            logger.warning(f"No PO found for drive file id: {file_id}")
+            return None
+        # The status check makes the claim atomic when several workers race for the job.
+        claimed = session.execute(
+            update(SyncJob)
+            .where(SyncJob.id == job_id, SyncJob.status == "queued")
+            .values(status="running", worker=worker, attempts=SyncJob.attempts + 1,
+                    started_at=func.coalesce(SyncJob.started_at, now), heartbeat_at=now)
+        ).rowcount
+        session.commit()
+        if not claimed:
+            return None
+        return _sync_job_dict(session.get(SyncJob, job_id))
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error claiming a sync job: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def update_sync_job(job_id: int, **fields) -> None:
+    """Updates a job's columns (dicts and lists are stored as JSON) and its heartbeat."""
+    values = {key: json.dumps(value) if isinstance(value, (dict, list)) else value for key, value in fields.items()}
+    values["heartbeat_at"] = datetime.utcnow()
+    session = SessionLocal()
+    try:
+        session.execute(update(SyncJob).where(SyncJob.id == job_id).values(**values))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error updating sync job {job_id}: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def finish_sync_job(job_id: int, status: str, result: dict = None, error: str = None) -> None:
+    """Marks a job done or failed and drops its stored credentials."""
+    update_sync_job(job_id, status=status, result=result, error=error, credentials=None, finished_at=datetime.utcnow())
+    logger.info(f"Sync job {job_id} {status}.")
+
+
+def save_sync_job_plan(job_id: int, state: dict, files: list[dict]) -> None:
+    """Stores a job's sync checkpoint and one pending checkpoint per file to extract, in one transaction."""
+    session = SessionLocal()
+    try:
+        session.execute(update(SyncJob).where(SyncJob.id == job_id).values(state=json.dumps(state), heartbeat_at=datetime.utcnow()))
+        session.execute(delete(SyncJobFile).where(SyncJobFile.job_id == job_id))
+        if files:
+            session.execute(insert(SyncJobFile), [
+                {"job_id": job_id, "file_id": file["id"], "position": position, "name": file.get("name"),
+                 "file": json.dumps(file), "status": "pending"}
+                for position, file in enumerate(files)
+            ])
+        session.commit()
+        logger.info(f"Saved plan of sync job {job_id}: {len(files)} files to extract.")
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Error saving plan of sync job {job_id}: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def checkpoint_sync_job_file(job_id: int, file_id: str, status: str, po_id: str = None, message: str = None) -> None:
+    """Records the outcome of one file of a job, so a resumed job does not extract it again."""
+    now = datetime.utcnow()
+    session = SessionLocal()
+    try:
+        session.execute(
+            update(SyncJobFile)
+            .where(SyncJobFile.job_id == job_id, SyncJobFile.file_id == file_id)
+            .values(status=status, po_id=po_id, message=message)
+        )
+        session.execute(update(SyncJob).where(SyncJob.id == job_id).values(heartbeat_at=now))
+        session.commit()
     except Exception as e:
         session.rollback()
-        logger.error(f"Error deleting PO for drive file id {file_id}: {e}")
+        logger.error(f"Error checkpointing file {file_id} of sync job {job_id}: {e}")
         raise
     finally:
         session.close()
+
+
+def get_sync_job_files(job_id: int) -> list[dict]:
+    """Returns a job's file checkpoints in plan order, as {file_id, name, file, status, po_id, message}."""
+    session = SessionLocal()
+    try:
+        rows = session.scalars(select(SyncJobFile).where(SyncJobFile.job_id == job_id).order_by(SyncJobFile.position))
+        return [{"file_id": row.file_id, "name": row.name, "file": json.loads(row.file), "status": row.status,
+                 "po_id": row.po_id, "message": row.message} for row in rows]
+    finally:
+        session.close()
+
+
+def get_sync_job(job_id: int):
+    """
+    Returns a job with its progress, or None.
+
+    The progress counters include "total", "pending", "done" and "failed"
+    files, counted from the job's checkpoints.
+    """
+    session = SessionLocal()
+    try:
+        job = session.get(SyncJob, job_id)
+        if job is None:
+            return None
+        result = _sync_job_dict(job)
+        counts = dict(session.execute(
+            select(SyncJobFile.status, func.count()).where(SyncJobFile.job_id == job_id).group_by(SyncJobFile.status)
+        ).all())
+        result["progress"].update({
+            "total": sum(counts.values()),
+            "pending": counts.get("pending", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+        })
+        return result
+    finally:
+        session.close()
@@ -1,8 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Float, ForeignKey, DateTime, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from pathlib import Path
 from app.core.logger import setup_logger
+from db.profiling import install_sql_profiler
+from db.storage import configure_sqlite_engine
 
 logger = setup_logger()
 
@@ -12,7 +14,11 @@ DB_FILE_PATH = DATABASE_DIR / "po_database.db"
 # DATABASE_URL = "sqlite:///po_database.db"
 DB_URL = f"sqlite:///{DB_FILE_PATH.resolve()}"
 
-engine = create_engine(DB_URL, echo=True)
+# Statements are timed per request and job by db.profiling; set SQL_ECHO=true to log every one.
+engine = create_engine(DB_URL)
+# WAL, pragmas and one write transaction at a time; see db.storage.get_sqlite_settings.
+sqlite_writer = configure_sqlite_engine(engine)
+install_sql_profiler()
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
@@ -57,12 +63,76 @@ class DriveFile(Base):
     id = Column(String, primary_key=True)
     name = Column(String, index=True)
     last_edited = Column(DateTime, nullable=True)
+    md5_checksum = Column(String, nullable=True, index=True)  # Drive's md5Checksum of the content
+    size = Column(Integer, nullable=True)
+    mime_type = Column(String, nullable=True)
+    po_id = Column(String, nullable=True, index=True)  # The PO extracted from this content, shared by identical copies
+    sync_root = Column(String, nullable=True, index=True)  # The synced folder this file was listed under
+
+class DriveSyncState(Base):
+    """Drive changes start-page token for a watched folder, and the IDs of the folders in its tree."""
+    __tablename__ = "drive_sync_state"
+    folder_id = Column(String, primary_key=True)
+    start_page_token = Column(String, nullable=False)
+    folder_ids = Column(Text, nullable=False)  # JSON list
+    last_synced = Column(DateTime, nullable=True)
+
+class SyncJob(Base):
+    """A queued Drive folder sync and extraction, run by a background worker (see app.services.jobs)."""
+    __tablename__ = "sync_jobs"
+    id = Column(Integer, primary_key=True)
+    user = Column(String, index=True)
+    folder_id = Column(String, nullable=False)
+    folder_name = Column(String, nullable=True)
+    status = Column(String, nullable=False, index=True)  # queued, running, done, failed
+    phase = Column(String, nullable=True)  # listing, extracting, recording
+    credentials = Column(Text, nullable=True)  # JSON OAuth credentials; cleared once the job ends
+    state = Column(Text, nullable=True)  # JSON checkpoint of the sync and extraction plan
+    progress = Column(Text, nullable=True)  # JSON counters
+    result = Column(Text, nullable=True)  # JSON summary
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class SyncJobFile(Base):
+    """Per-file checkpoint of a sync job: files still pending are extracted when the job resumes."""
+    __tablename__ = "sync_job_files"
+    job_id = Column(Integer, ForeignKey("sync_jobs.id"), primary_key=True)
+    file_id = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False)
+    name = Column(String)
+    file = Column(Text, nullable=False)  # JSON Drive file dict
+    status = Column(String, nullable=False, index=True)  # pending, done, failed
+    po_id = Column(String, nullable=True)
+    message = Column(Text, nullable=True)
 
 def init_db():
     DATABASE_DIR.mkdir(parents=True, exist_ok=True)
 
     if not DB_FILE_PATH.exists():
         logger.info(f"Creating database at: {DB_FILE_PATH}")
-        Base.metadata.create_all(bind=engine)
     else:
-        logger.info(f"Database already exists at: {DB_FILE_PATH}")
\ No newline at end of file
+        logger.info(f"Database already exists at: {DB_FILE_PATH}")
+    # create_all only adds missing tables, so tables introduced since the
+    # database was created are added and existing ones are left alone.
+    Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+
+
+def _add_missing_columns():
+    """Adds columns (and their indexes) introduced since an existing table was created."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            missing = [column for column in table.columns if column.name not in existing]
+            for column in missing:
+                logger.info(f"Adding column {table.name}.{column.name}")
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"))
+            if missing:
+                for index in table.indexes:
+                    index.create(bind=conn, checkfirst=True)
@@ -0,0 +1,218 @@
+import os
+import re
+import time
+import heapq
+import threading
+import contextvars
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+# Query profile of the request or job running on this thread/context.
+_current_profile = contextvars.ContextVar("sql_profile", default=None)
+
+_history = None
+_routes = {}  # label -> totals over every profile with that label
+_history_lock = threading.Lock()
+_default_settings = None  # used for statements run outside a profile
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r"\s+")
+
+
+def get_sql_profile_settings() -> dict:
+    """
+    Returns the SQL profiling options.
+
+    Read from SQL_ECHO (default false; log every statement, as the engine's
+    echo flag), SQL_SLOW_QUERY_MS (default 100; statements slower than this
+    are logged), SQL_N_PLUS_ONE_THRESHOLD (default 10; a SELECT of the same
+    shape run this many times in one request or job is reported as N+1),
+    SQL_PROFILE_SLOWEST (default 5; slowest statements kept per profile) and
+    SQL_PROFILE_HISTORY (default 50; recent profiles kept for /diagnostics/sql).
+    """
+    return {
+        "echo": os.getenv("SQL_ECHO", "false").lower() in {"1", "true", "yes"},
+        "slow_query_ms": float(os.getenv("SQL_SLOW_QUERY_MS", "100")),
+        "n_plus_one_threshold": max(2, int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))),
+        "slowest": max(1, int(os.getenv("SQL_PROFILE_SLOWEST", "5"))),
+        "history": max(1, int(os.getenv("SQL_PROFILE_HISTORY", "50"))),
+    }
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Normalizes a statement so executions that differ only in their values
+    compare equal: literals become ?, expanded IN lists collapse to (?) and
+    whitespace is folded.
+    """
+    shape = _STRING.sub("?", statement)
+    shape = _NUMBER.sub("?", shape)
+    shape = _IN_LIST.sub("(?)", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+class QueryProfile:
+    """
+    The statements run by one request or job: their count, total time, the
+    slowest ones, and how often each statement shape was run.
+
+    An executemany (a batched INSERT or UPDATE) counts as one statement.
+    """
+
+    def __init__(self, label: str, settings: dict, context: Optional[dict] = None):
+        self.label = label
+        self.context = context or {}
+        self.settings = settings
+        self.queries = 0
+        self.db_ms = 0.0
+        self.shapes = Counter()
+        self.shape_ms = Counter()
+        self._slowest = []  # min-heap of (ms, sequence, statement)
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        shape = statement_shape(statement)
+        with self._lock:
+            self.queries += 1
+            self.db_ms += elapsed_ms
+            self.shapes[shape] += 1
+            self.shape_ms[shape] += elapsed_ms
+            entry = (elapsed_ms, self.queries, shape)
+            if len(self._slowest) < self.settings["slowest"]:
+                heapq.heappush(self._slowest, entry)
+            elif entry > self._slowest[0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def n_plus_one(self) -> list:
+        """SELECT shapes run at least n_plus_one_threshold times, most frequent first."""
+        threshold = self.settings["n_plus_one_threshold"]
+        return [
+            {"statement": shape, "count": count, "db_ms": round(self.shape_ms[shape], 3)}
+            for shape, count in self.shapes.most_common()
+            if count >= threshold and shape.upper().startswith("SELECT")
+        ]
+
+    def describe(self) -> str:
+        return " ".join([self.label] + [f"{key}={value}" for key, value in self.context.items()])
+
+    def report(self) -> dict:
+        with self._lock:
+            slowest = sorted(self._slowest, reverse=True)
+        return {
+            "label": self.label,
+            **self.context,
+            "queries": self.queries,
+            "db_ms": round(self.db_ms, 3),
+            "wall_ms": round((time.perf_counter() - self._started) * 1000, 3),
+            "distinct_statements": len(self.shapes),
+            "slowest": [{"statement": shape, "ms": round(ms, 3)} for ms, _, shape in slowest],
+            "n_plus_one": self.n_plus_one(),
+        }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_started"].pop()) * 1000
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.record(statement, elapsed_ms)
+        settings = profile.settings
+    else:
+        settings = _default_settings
+    if settings["echo"]:
+        logger.info(f"SQL ({elapsed_ms:.2f} ms{', executemany' if executemany else ''}): {statement}")
+    elif elapsed_ms >= settings["slow_query_ms"]:
+        logger.warning(f"Slow SQL ({elapsed_ms:.0f} ms) in {profile.describe() if profile else 'unprofiled code'}: {statement_shape(statement)[:500]}")
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute.
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def install_sql_profiler() -> None:
+    """Times every statement run on any engine and records it on the current profile. Safe to call more than once."""
+    global _default_settings
+    with _history_lock:
+        if _default_settings is not None:
+            return
+        _default_settings = get_sql_profile_settings()
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def start_query_profile(label: str, **context) -> contextvars.Token:
+    """
+    Starts recording the statements run in the current context.
+
+    Profiles are totalled per `label` (a route or job type); `context` fields
+    (a path, a job ID) are only added to this profile's report. Pass the
+    returned token to finish_query_profile(). Statements run on other threads
+    are not recorded.
+    """
+    return _current_profile.set(QueryProfile(label, get_sql_profile_settings(), context))
+
+
+def current_query_profile() -> Optional[QueryProfile]:
+    return _current_profile.get()
+
+
+def finish_query_profile(token: contextvars.Token) -> Optional[dict]:
+    """Stops the profile started with `token`, logs it, adds it to the diagnostics history and returns its report."""
+    global _history
+    profile = _current_profile.get()
+    _current_profile.reset(token)
+    if profile is None:
+        return None
+    report = profile.report()
+    with _history_lock:
+        if _history is None:
+            _history = deque(maxlen=profile.settings["history"])
+        _history.append(report)
+        totals = _routes.setdefault(profile.label, {"runs": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0, "n_plus_one_runs": 0})
+        totals["runs"] += 1
+        totals["queries"] += report["queries"]
+        totals["db_ms"] = round(totals["db_ms"] + report["db_ms"], 3)
+        totals["max_queries"] = max(totals["max_queries"], report["queries"])
+        totals["n_plus_one_runs"] += bool(report["n_plus_one"])
+    if report["queries"]:
+        logger.info(f"SQL for {profile.describe()}: {report['queries']} queries, {report['db_ms']:.1f} ms in the database "
+                    f"({report['wall_ms']:.0f} ms total)")
+    for pattern in report["n_plus_one"]:
+        logger.warning(f"Possible N+1 in {profile.describe()}: {pattern['count']} x {pattern['statement'][:300]} "
+                       f"({pattern['db_ms']:.1f} ms)")
+    return report
+
+
+@contextmanager
+def profile_queries(label: str, **context):
+    """Records the statements run inside the block as one profile (see start_query_profile); yields the QueryProfile."""
+    token = start_query_profile(label, **context)
+    try:
+        yield _current_profile.get()
+    finally:
+        finish_query_profile(token)
+
+
+def get_sql_diagnostics() -> dict:
+    """Per-label totals, the most recent profiles (newest first) and the database writer's wait times, for the diagnostics endpoint."""
+    with _history_lock:
+        recent = list(reversed(_history)) if _history else []
+        routes = {label: dict(totals, avg_queries=round(totals["queries"] / totals["runs"], 1))
+                  for label, totals in sorted(_routes.items())}
+    from db.database import sqlite_writer
+    return {"routes": routes, "recent": recent, "writer": sqlite_writer.snapshot() if sqlite_writer else None}
@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from sqlalchemy import event
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+# Statements that need SQLite's write lock; everything else is a read.
+_WRITE_VERBS = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "ALTER", "DROP")
+
+
+def get_sqlite_settings() -> dict:
+    """
+    Returns the SQLite connection options.
+
+    Read from SQLITE_JOURNAL_MODE (default WAL; readers never wait for the
+    writer, and the writer never waits for readers), SQLITE_SYNCHRONOUS
+    (default NORMAL; safe with WAL, fsyncs only at checkpoints),
+    SQLITE_BUSY_TIMEOUT_MS (default 10000; how long a statement waits for
+    another process's lock), SQLITE_CACHE_SIZE_MB (default 64; page cache per
+    connection), SQLITE_MMAP_SIZE_MB (default 128; 0 to disable memory-mapped
+    reads) and SQLITE_SERIALIZE_WRITES (default true; write transactions in
+    this process take turns instead of retrying on "database is locked").
+    """
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper(),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper(),
+        "busy_timeout_ms": max(0, int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))),
+        "cache_size_mb": max(1, int(os.getenv("SQLITE_CACHE_SIZE_MB", "64"))),
+        "mmap_size_mb": max(0, int(os.getenv("SQLITE_MMAP_SIZE_MB", "128"))),
+        "serialize_writes": os.getenv("SQLITE_SERIALIZE_WRITES", "true").lower() in {"1", "true", "yes"},
+    }
+
+
+class SerializedWriter:
+    """
+    Lets one write transaction at a time run on an engine in this process.
+
+    A connection takes the writer at its first write statement and gives it
+    back when it returns to the pool, i.e. after its commit or rollback, so
+    other threads queue here instead of in SQLite's busy handler. Reads never
+    take the writer. Other processes are still kept in order by SQLite's own
+    lock and the busy timeout.
+    """
+
+    def __init__(self, timeout_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self._lock = threading.Lock()
+        self._owner = None
+        self._stats_lock = threading.Lock()
+        self.stats = {"transactions": 0, "waited": 0, "wait_ms": 0.0, "max_wait_ms": 0.0, "max_hold_ms": 0.0, "timeouts": 0}
+
+    def acquire(self) -> bool:
+        """Waits for the writer. Returns False if it was not taken (already held by this thread, or timed out)."""
+        if self._owner == threading.get_ident():
+            # A second connection on the writing thread would wait for itself; leave it to SQLite.
+            return False
+        started = time.perf_counter()
+        acquired = self._lock.acquire(timeout=self.timeout_seconds)
+        waited_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            if not acquired:
+                self.stats["timeouts"] += 1
+            else:
+                self.stats["transactions"] += 1
+                self.stats["wait_ms"] += waited_ms
+                self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], waited_ms)
+                if waited_ms >= 1:
+                    self.stats["waited"] += 1
+        if not acquired:
+            logger.warning(f"Waited {waited_ms:.0f} ms for the database writer; writing without it")
+            return False
+        self._owner = threading.get_ident()
+        return True
+
+    def release(self, held_since: float) -> None:
+        held_ms = (time.perf_counter() - held_since) * 1000
+        with self._stats_lock:
+            self.stats["max_hold_ms"] = max(self.stats["max_hold_ms"], held_ms)
+        self._owner = None
+        self._lock.release()
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            return {key: round(value, 3) if isinstance(value, float) else value for key, value in self.stats.items()}
+
+
+def configure_sqlite_engine(engine, settings: dict = None):
+    """
+    Applies the pragmas from get_sqlite_settings() to every new connection
+    of `engine` and, unless disabled, serializes its write transactions.
+
+    Returns the engine's SerializedWriter, or None when writes are not serialized.
+    """
+    settings = settings or get_sqlite_settings()
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {settings['busy_timeout_ms']}")
+            cursor.execute(f"PRAGMA journal_mode = {settings['journal_mode']}")
+            cursor.execute(f"PRAGMA synchronous = {settings['synchronous']}")
+            cursor.execute(f"PRAGMA cache_size = -{settings['cache_size_mb'] * 1024}")
+            cursor.execute(f"PRAGMA mmap_size = {settings['mmap_size_mb'] * 1024 * 1024}")
+            cursor.execute("PRAGMA temp_store = MEMORY")
+        finally:
+            cursor.close()
+
+    if not settings["serialize_writes"]:
+        return None
+    writer = SerializedWriter(settings["busy_timeout_ms"] / 1000)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def take_writer(conn, cursor, statement, parameters, context, executemany):
+        if "writer_since" not in conn.info and statement.lstrip()[:7].upper().startswith(_WRITE_VERBS):
+            if writer.acquire():
+                conn.info["writer_since"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def give_back_writer(dbapi_connection, connection_record):
+        if connection_record is not None and "writer_since" in connection_record.info:
+            writer.release(connection_record.info.pop("writer_since"))
+
+    @event.listens_for(engine, "invalidate")
+    def give_back_writer_on_invalidate(dbapi_connection, connection_record, exception):
+        give_back_writer(dbapi_connection, connection_record)
+
+    return writer
@@ -0,0 +1,130 @@
+import os
+import json
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import List
+from dotenv import load_dotenv
+from app.core.logger import setup_logger
+from db.crud import insert_or_replace_po, insert_or_replace_pos
+from db.database import init_db
+from extractor.run_extraction import prepare_document, extract_document
+from extractor.metrics import aggregate_metrics, format_metrics_summary
+from extractor.llm_client import get_llm_usage
+
+logger = setup_logger()
+load_dotenv()
+
+
+def find_pdfs(input_dir: Path) -> List[Path]:
+    return sorted(p for p in input_dir.rglob("*") if p.is_file() and p.suffix.lower() == ".pdf")
+
+
+def _write_batch(batch: List[dict]) -> int:
+    """Writes a batch of POs in one transaction, falling back to one-by-one writes if the batch fails."""
+    try:
+        insert_or_replace_pos(batch)
+        return len(batch)
+    except Exception:
+        logger.warning(f"Batch write of {len(batch)} POs failed; retrying them one at a time.")
+    written = 0
+    for po in batch:
+        try:
+            insert_or_replace_po(po)
+            written += 1
+        except Exception as e:
+            logger.error(f"Failed to store PO {po.get('po_id')}: {e}")
+    return written
+
+
+def run_batch(input_dir: Path, parse_workers: int, llm_workers: int, batch_size: int, run_forecast: bool = True) -> dict:
+    """
+    Extracts every PDF under input_dir and stores the results in the database.
+
+    PDF parsing is spread across a process pool, LLM calls go through a
+    thread pool limited to llm_workers, and POs are written in transactions of
+    batch_size. The JSON/CSV exports and the forecast are rebuilt once at the end.
+
+    Returns:
+        dict: Counts of PDFs found, POs stored, and failures, plus the
+        aggregated per-stage "metrics" for the batch.
+    """
+    pdfs = find_pdfs(input_dir)
+    logger.info(f"Found {len(pdfs)} PDFs under {input_dir}")
+    summary = {"pdfs": len(pdfs), "stored": 0, "empty": 0, "failed": 0}
+    if not pdfs:
+        summary["metrics"] = aggregate_metrics([])
+        return summary
+
+    init_db()
+    pending: List[dict] = []
+    document_metrics: List[dict] = []
+    with ProcessPoolExecutor(max_workers=parse_workers) as parse_pool, \
+            ThreadPoolExecutor(max_workers=llm_workers) as llm_pool:
+        parse_futures = {parse_pool.submit(prepare_document, str(path)): path for path in pdfs}
+        llm_futures = {}
+        for future in as_completed(parse_futures):
+            path = parse_futures[future]
+            try:
+                prepared = future.result()
+            except Exception as e:
+                logger.error(f"Failed to parse {path}: {e}")
+                summary["failed"] += 1
+                continue
+            document_metrics.append(prepared["metrics"])
+            llm_futures[llm_pool.submit(extract_document, prepared)] = path
+
+        for future in as_completed(llm_futures):
+            path = llm_futures[future]
+            try:
+                po = future.result()
+            except Exception as e:
+                logger.error(f"Failed to extract {path}: {e}")
+                summary["failed"] += 1
+                continue
+            if not po:
+                logger.warning(f"No data extracted from {path}.")
+                summary["empty"] += 1
+                continue
+            pending.append(po)
+            if len(pending) >= batch_size:
+                summary["stored"] += _write_batch(pending)
+                pending = []
+
+    if pending:
+        summary["stored"] += _write_batch(pending)
+
+    if run_forecast:
+        from extractor.export import export_all_pos_json, export_all_csvs, LLM_OUTPUT_DIR
+        from forecast_processor import run_forecast_processing
+        logger.info("Exporting all POs to JSON and CSV after batch ingestion...")
+        export_all_pos_json()
+        export_all_csvs()
+        logger.info("Running forecast processing after batch ingestion...")
+        run_forecast_processing(input_json_path=LLM_OUTPUT_DIR / "purchase_orders.json")
+
+    summary["metrics"] = aggregate_metrics(document_metrics)
+    summary["llm_usage"] = get_llm_usage()
+    logger.info(f"Batch ingestion complete: {json.dumps(summary)}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract purchase orders from a directory of PDFs into the database.")
+    parser.add_argument("input_dir", type=Path, nargs="?", default=Path("input/POs"), help="Directory to scan for PDFs (recursively).")
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1, help="Processes used for PDF parsing.")
+    parser.add_argument("--llm-workers", type=int, default=int(os.getenv("INGEST_LLM_WORKERS", "4")), help="Concurrent LLM calls.")
+    parser.add_argument("--batch-size", type=int, default=50, help="POs written per database transaction.")
+    parser.add_argument("--no-forecast", action="store_true", help="Skip the export and forecast rebuild at the end.")
+    args = parser.parse_args()
+
+    summary = run_batch(args.input_dir, args.parse_workers, args.llm_workers, args.batch_size, run_forecast=not args.no_forecast)
+    print(f"Processed {summary['pdfs']} PDFs: {summary['stored']} stored, {summary['empty']} empty, {summary['failed']} failed.")
+    print("\n".join(format_metrics_summary(summary["metrics"])))
+    for backend in summary["llm_usage"]:
+        print(f"LLM backend {backend['name']}: {backend['requests']} requests, {backend['tokens']} tokens, "
+              f"{backend['rate_limited']} rate limited, {backend['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
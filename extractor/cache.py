@@ -0,0 +1,112 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+BASE_OUTPUT_DIR = Path('output')
+CACHE_DIR = BASE_OUTPUT_DIR / "cache"
+
+
+class DiskCache:
+    """
+    A small persistent key/value cache stored in a local SQLite file.
+
+    Values are stored as JSON. Entries older than ``max_age_seconds`` are
+    treated as misses and removed, and when the total stored size grows past
+    ``max_bytes`` the least recently used entries are evicted first.
+    """
+
+    def __init__(self, db_path: Path, max_bytes: int, max_age_seconds: Optional[float] = None):
+        self.db_path = Path(db_path)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at ON cache_entries (accessed_at)")
+        self._conn.commit()
+        logger.info(f"Opened disk cache at {self.db_path} (max_bytes={max_bytes}, max_age_seconds={max_age_seconds})")
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.max_age_seconds is not None and now - created_at > self.max_age_seconds:
+                logger.debug(f"Cache entry expired: {key}")
+                self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._evict_locked(now)
+            self._conn.commit()
+
+    def evict(self) -> None:
+        with self._lock:
+            self._evict_locked(time.time())
+            self._conn.commit()
+
+    def _evict_locked(self, now: float) -> None:
+        if self.max_age_seconds is not None:
+            expired = self._conn.execute(
+                "DELETE FROM cache_entries WHERE created_at < ?", (now - self.max_age_seconds,)
+            ).rowcount
+            if expired:
+                logger.info(f"Evicted {expired} expired entries from {self.db_path.name}")
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM cache_entries ORDER BY accessed_at ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"Evicted {evicted} least recently used entries from {self.db_path.name}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
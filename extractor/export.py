@@ -1,11 +1,10 @@
 import os
 import json
 import pandas as pd
-from sqlalchemy import create_engine
 from db.database import PurchaseOrder, SessionLocal
 from app.core.logger import setup_logger
 from pathlib import Path
-from db.database import DB_URL, DATABASE_DIR 
+from db.database import engine
 
 logger = setup_logger()
 
@@ -70,15 +69,17 @@ def export_all_pos_json(output_path: Path = LLM_OUTPUT_DIR / "purchase_orders.js
     session.close()
     logger.info(f"Exported {len(export_data)} purchase orders. Writing to {output_path}")
     
-    with open(output_path, "w") as f:
+    # Written aside and swapped in, so a forecast run reading the file never sees half of it.
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
         json.dump(export_data, f, indent=2)
+    os.replace(tmp_path, output_path)
 
     logger.info(f"Exported {len(export_data)} purchase orders with nested data to {output_path}")
     
 
 def export_all_csvs(output_dir: Path = LLM_OUTPUT_DIR) -> None:    
     output_dir.mkdir(parents=True, exist_ok=True)
-    engine = create_engine(DB_URL)
 
     logger.info("Starting export of all tables to CSV files.")
     
@@ -0,0 +1,81 @@
+from dotenv import load_dotenv
+from app.core.logger import setup_logger
+from extractor.llm_client import get_chain
+
+logger = setup_logger()
+load_dotenv()
+
+COMBINED_PROMPT = """
+You are an assistant that classifies a project payment Purchase Order and extracts its structured data in one step.
+
+First decide the payment_type, exactly one of:
+- "periodic": only the start date and end date are mentioned, and sometimes how frequently the payment will happen.
+- "distributed": the payment is distributed among different dates and those dates are mentioned in the document.
+- "milestone": milestones are mentioned, or divisions of the payment are given in percentages.
+
+Extract these common fields exactly:
+- client_name (string)
+- po_id (string)
+- amount (number in USD, no currency symbols)
+- status (exactly one of [\"Confirmed\", \"Quote Sent\", \"Under Discussion\", \"Negotiation\"])
+- payment_terms (integer, days)
+- payment_type (exactly one of \"periodic\", \"distributed\", \"milestone\")
+- start_date (DD-MM-YYYY; if only MM-YYYY given, treat as 1st day of month)
+- end_date (DD-MM-YYYY; if only MM-YYYY given, treat as last day of month)
+- duration_months (float or null; do NOT calculate from dates, only explicit mention)
+
+Then extract only the fields for the chosen payment_type:
+- periodic:
+    - payment_frequency: integer number of months between payments (default to 1 if not mentioned)
+- distributed:
+    - payment_schedule: a list of payment entries, each with:
+        - payment_date (DD-MM-YYYY)
+        - payment_amount (number, USD)
+        - payment_description (optional string)
+- milestone:
+    - milestones: a list of milestones, each with:
+        - milestone_name (string; initial should be named as \"initial\", rest should be named as \"milestone_1\", \"milestone_2\", and so on)
+        - milestone_description (string, optional)
+        - milestone_due_date (DD-MM-YYYY; if not mentioned leave it empty)
+        - milestone_percentage (float, payment percentage)
+
+Return only a valid JSON object.
+
+Purchase Order text:
+\"\"\"
+{po_text}
+\"\"\"
+"""
+
+# Type-specific keys that only belong to one payment_type.
+TYPE_SPECIFIC_FIELDS = {
+    "periodic": {"payment_frequency"},
+    "distributed": {"payment_schedule"},
+    "milestone": {"milestones"},
+}
+
+def extract_combined_payment_details(po_text: str) -> dict:
+    logger.info("Starting combined classification and extraction of payment details from PO text.")
+    chain = get_chain("combined", COMBINED_PROMPT)
+
+    try:
+        result = chain.invoke({"po_text": po_text})
+        logger.info("Successfully classified and extracted payment details from PO text.")
+    except Exception as e:
+        logger.error("Failed to extract or parse JSON from LLM response.")
+        logger.debug(str(e))
+        raise e
+
+    payment_type = str(result.get("payment_type", "")).strip().lower()
+    if payment_type not in TYPE_SPECIFIC_FIELDS:
+        logger.error(f"Unexpected payment_type returned: {payment_type}")
+        raise ValueError(f"Unexpected payment_type returned: {payment_type}")
+    result["payment_type"] = payment_type
+
+    # Route afterwards: drop keys that belong to the other payment types.
+    for other_type, fields in TYPE_SPECIFIC_FIELDS.items():
+        if other_type != payment_type:
+            for field in fields:
+                result.pop(field, None)
+    logger.info(f"LLM classified and extracted payment_type as: {payment_type}")
+    return result
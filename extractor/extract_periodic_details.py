@@ -1,6 +1,6 @@
 from dotenv import load_dotenv
 from app.core.logger import setup_logger
-from extractor.llm_client import get_llm, get_prompt, get_json_parser
+from extractor.llm_client import get_chain
 
 logger = setup_logger()
 load_dotenv()
@@ -32,10 +32,7 @@ Purchase Order text:
 
 def extract_periodic_payment_details(po_text: str) -> dict:
     logger.info("Starting extraction of periodic payment details from PO text.")
-    llm = get_llm()
-    prompt = get_prompt(PERIODIC_PROMPT)
-    parser = get_json_parser()
-    chain = prompt | llm | parser
+    chain = get_chain("periodic", PERIODIC_PROMPT)
 
     try:
         result = chain.invoke({"po_text": po_text})
@@ -0,0 +1,120 @@
+import os
+import hashlib
+import threading
+from typing import Optional
+from app.core.logger import setup_logger
+from extractor.cache import CACHE_DIR, DiskCache
+from extractor.llm_client import get_llm_backend_models, get_extraction_mode
+from extractor.pdf_processing.parse_document import get_table_backend, get_table_extraction_settings
+from extractor.pdf_processing.format_po import FORMAT_VERSION, get_compaction_settings
+from extractor.fast_classifier import get_fast_classify_settings
+from extractor.po_extractor import CLASSIFY_PROMPT
+from extractor.extract_periodic_details import PERIODIC_PROMPT
+from extractor.extract_distributed_details import DISTRIBUTED_PROMPT
+from extractor.extract_milestone_details import MILESTONE_PROMPT
+from extractor.extract_combined_details import COMBINED_PROMPT
+
+logger = setup_logger()
+
+EXTRACTION_CACHE_PATH = CACHE_DIR / "extraction_cache.db"
+
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+
+def is_extraction_cache_enabled() -> bool:
+    return os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+
+
+def get_extraction_cache() -> Optional[DiskCache]:
+    """
+    Returns the process-wide extraction cache, or None when it is disabled.
+
+    The cache lives outside the PO database so it survives a reset by
+    init_output_files.py. Size and age limits come from
+    EXTRACTION_CACHE_MAX_MB and EXTRACTION_CACHE_MAX_AGE_DAYS.
+    """
+    global _extraction_cache
+    if not is_extraction_cache_enabled():
+        return None
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            max_mb = float(os.getenv("EXTRACTION_CACHE_MAX_MB", "256"))
+            max_age_days = float(os.getenv("EXTRACTION_CACHE_MAX_AGE_DAYS", "90"))
+            _extraction_cache = DiskCache(
+                EXTRACTION_CACHE_PATH,
+                max_bytes=int(max_mb * 1024 * 1024),
+                max_age_seconds=max_age_days * 24 * 3600,
+            )
+    return _extraction_cache
+
+
+def pdf_sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path, chunk_size: int = 1024 * 1024) -> str:
+    """Hashes a file on disk in chunks, so it is never read into memory whole."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fingerprint(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def parse_fingerprint() -> str:
+    """Identifies everything that affects the formatted PO text for a given PDF."""
+    compact, token_budget = get_compaction_settings()
+    precheck = get_table_extraction_settings()["precheck"]
+    return _fingerprint(FORMAT_VERSION, get_table_backend(), str(precheck), str(compact), str(token_budget))
+
+
+def extraction_fingerprint() -> str:
+    """Identifies everything that affects the extracted JSON for a given PO text."""
+    fast_enabled, fast_min_confidence = get_fast_classify_settings()
+    return _fingerprint(
+        parse_fingerprint(),
+        ",".join(get_llm_backend_models()),
+        get_extraction_mode(),
+        str(fast_enabled),
+        str(fast_min_confidence),
+        CLASSIFY_PROMPT,
+        PERIODIC_PROMPT,
+        DISTRIBUTED_PROMPT,
+        MILESTONE_PROMPT,
+        COMBINED_PROMPT,
+    )
+
+
+def get_cached_po_text(pdf_hash: str) -> Optional[str]:
+    cache = get_extraction_cache()
+    if cache is None:
+        return None
+    return cache.get(f"text:{pdf_hash}:{parse_fingerprint()}")
+
+
+def set_cached_po_text(pdf_hash: str, formatted_po: str) -> None:
+    cache = get_extraction_cache()
+    if cache is not None:
+        cache.set(f"text:{pdf_hash}:{parse_fingerprint()}", formatted_po)
+
+
+def get_cached_extraction(pdf_hash: str) -> Optional[dict]:
+    cache = get_extraction_cache()
+    if cache is None:
+        return None
+    return cache.get(f"result:{pdf_hash}:{extraction_fingerprint()}")
+
+
+def set_cached_extraction(pdf_hash: str, result: dict) -> None:
+    cache = get_extraction_cache()
+    if cache is not None:
+        cache.set(f"result:{pdf_hash}:{extraction_fingerprint()}", result)
@@ -0,0 +1,183 @@
+import os
+import re
+import threading
+from typing import Optional, Tuple
+from app.core.logger import setup_logger
+from extractor.metrics import stage
+
+logger = setup_logger()
+
+MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+FULL_DATE_RE = re.compile(
+    r"\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b|"
+    rf"\b\d{{1,2}}(?:st|nd|rd|th)?\s+{MONTHS},?\s+\d{{4}}\b|"
+    rf"\b{MONTHS}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}\b",
+    re.IGNORECASE,
+)
+AMOUNT_RE = re.compile(r"\$\s?\d[\d,]*(?:\.\d+)?|\b\d[\d,]*(?:\.\d+)?\s?(?:USD|INR|EUR)\b", re.IGNORECASE)
+PERCENT_RE = re.compile(r"\b(\d{1,3}(?:\.\d+)?)\s?%")
+FREQUENCY_RE = re.compile(
+    r"\b(monthly|quarterly|annually|yearly|half[- ]yearly|bi-?annual(?:ly)?|"
+    r"(?:every|per|each)\s+(?:month|quarter|year|\d+\s+months))\b",
+    re.IGNORECASE,
+)
+MILESTONE_RE = re.compile(r"\bmilestones?\b", re.IGNORECASE)
+DATE_RANGE_RE = re.compile(r"\bto\b|\s[-–]\s", re.IGNORECASE)
+RANGE_WORD_RE = re.compile(r"^(?:to|till|until|[-–])$", re.IGNORECASE)
+
+# Fewer dated amounts than this could be a header date and a total, not a schedule.
+MIN_SCHEDULE_ROWS = 3
+# Confidence of the weaker rules; always below the default threshold, so they only log a guess.
+GUESS_CONFIDENCE = 0.7
+
+_stats = {"total": 0, "fast_path": 0}
+_stats_lock = threading.Lock()
+
+
+def get_fast_classify_settings() -> Tuple[bool, float]:
+    """
+    Returns (enabled, min_confidence) for the rule-based classifier.
+
+    Read from PO_FAST_CLASSIFY_ENABLED (default true) and
+    PO_FAST_CLASSIFY_MIN_CONFIDENCE (default 0.85, above GUESS_CONFIDENCE).
+    """
+    enabled = os.getenv("PO_FAST_CLASSIFY_ENABLED", "true").lower() in {"1", "true", "yes"}
+    min_confidence = float(os.getenv("PO_FAST_CLASSIFY_MIN_CONFIDENCE", "0.85"))
+    return enabled, min_confidence
+
+
+def _is_header_or_range(lines, i: int, match) -> bool:
+    """
+    Checks whether a date is a labelled header field ("Sent On : ...") or one
+    end of a date range ("01 Jun 2025 To 31 Aug 2026"), not a schedule row.
+    """
+    line = lines[i]
+    previous = lines[i - 1] if i > 0 else ""
+    following = lines[i + 1] if i + 1 < len(lines) else ""
+    if line[:match.start()].rstrip().endswith(":"):
+        return True
+    if previous.endswith(":") and not line[match.end():].strip():
+        # "Sent On :" with the date alone on the next line.
+        return True
+    if len(FULL_DATE_RE.findall(line)) >= 2 and DATE_RANGE_RE.search(line):
+        return True
+    return bool(RANGE_WORD_RE.match(previous) or RANGE_WORD_RE.match(following))
+
+
+def _count_dated_amounts(lines) -> int:
+    """
+    Counts distinct dates that have an amount on the same or the following
+    line, leaving out header fields and date ranges.
+    """
+    dates = set()
+    for i, line in enumerate(lines):
+        for match in FULL_DATE_RE.finditer(line):
+            if _is_header_or_range(lines, i, match):
+                continue
+            rest = line[match.end():]
+            following = lines[i + 1] if i + 1 < len(lines) else ""
+            if AMOUNT_RE.search(rest) or (not rest.strip() and AMOUNT_RE.search(following) and not FULL_DATE_RE.search(following)):
+                dates.add(match.group(0).lower())
+    return len(dates)
+
+
+def _has_date_range(lines) -> bool:
+    """Checks for a start and end date, either on one line or split around 'To'."""
+    for i, line in enumerate(lines):
+        window = " ".join(lines[i:i + 3])
+        dates = FULL_DATE_RE.findall(window)
+        if len(dates) >= 2 and DATE_RANGE_RE.search(window):
+            return True
+    return False
+
+
+def extract_features(po_text: str) -> dict:
+    lines = [line.strip() for line in po_text.splitlines() if line.strip()]
+    percentages = [float(p) for p in PERCENT_RE.findall(po_text)]
+    return {
+        "dated_amounts": _count_dated_amounts(lines),
+        "percent_count": len(percentages),
+        "percent_total": sum(percentages),
+        "has_milestone_word": bool(MILESTONE_RE.search(po_text)),
+        "has_frequency": bool(FREQUENCY_RE.search(po_text)),
+        "has_date_range": _has_date_range(lines),
+    }
+
+
+def fast_classify(po_text: str) -> dict:
+    """
+    Classifies a PO's payment type from its text without calling the LLM.
+
+    Uses the same definitions as the LLM classification prompt:
+    - distributed: several dates (at least MIN_SCHEDULE_ROWS), each with its
+      own payment amount
+    - milestone: a split of the payment into percentages (or named milestones)
+    - periodic: a start and end date with a payment frequency
+
+    Args:
+        po_text: The formatted PO text (text blocks and tables).
+
+    Returns:
+        dict: "payment_type" (or None when no rule applies), "confidence"
+        between 0 and 1, and the "features" the decision was based on.
+    """
+    features = extract_features(po_text)
+    payment_type: Optional[str] = None
+    confidence = 0.0
+
+    percent_split = features["percent_count"] >= 2 and 99 <= features["percent_total"] <= 101
+    schedule = features["dated_amounts"] >= MIN_SCHEDULE_ROWS
+    # Two dated amounts may or may not be a schedule; the other rules do not apply either.
+    possible_schedule = features["dated_amounts"] >= 2
+
+    if schedule and not percent_split and not features["has_milestone_word"]:
+        payment_type = "distributed"
+        confidence = 0.95
+    elif possible_schedule and not schedule:
+        payment_type = "distributed"
+        confidence = GUESS_CONFIDENCE
+    elif percent_split and not schedule:
+        payment_type = "milestone"
+        confidence = 0.95 if features["has_milestone_word"] else 0.9
+    elif features["has_milestone_word"] and not schedule:
+        payment_type = "milestone"
+        confidence = GUESS_CONFIDENCE
+    elif features["has_date_range"] and not schedule and not features["percent_count"]:
+        payment_type = "periodic"
+        confidence = 0.9 if features["has_frequency"] else GUESS_CONFIDENCE
+
+    logger.debug(f"Fast classifier features: {features}")
+    return {"payment_type": payment_type, "confidence": confidence, "features": features}
+
+
+def classify_without_llm(po_text: str) -> Optional[str]:
+    """
+    Returns the payment type when the rule-based classifier is confident
+    enough, or None when the LLM should decide. Logs the running share of
+    documents decided by the fast path.
+    """
+    enabled, min_confidence = get_fast_classify_settings()
+    if not enabled:
+        return None
+
+    with stage("fast_classify") as span:
+        decision = fast_classify(po_text)
+        decided = decision["payment_type"] is not None and decision["confidence"] >= min_confidence
+        span["fast_path"] = int(decided)
+    with _stats_lock:
+        _stats["total"] += 1
+        if decided:
+            _stats["fast_path"] += 1
+        total, fast_path = _stats["total"], _stats["fast_path"]
+
+    if decided:
+        logger.info(f"Fast path classified payment_type as: {decision['payment_type']} (confidence {decision['confidence']:.2f})")
+    else:
+        logger.info(f"Fast path not confident (guess: {decision['payment_type']}, confidence {decision['confidence']:.2f}); falling back to LLM.")
+    logger.info(f"Fast-path classification rate: {fast_path}/{total} ({fast_path / total:.0%})")
+    return decision["payment_type"] if decided else None
+
+
+def get_fast_path_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
@@ -1,31 +1,276 @@
 import os
+import json
+import time
+import hashlib
+import threading
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from app.core.logger import setup_logger
+from extractor.cache import CACHE_DIR, DiskCache
+from extractor.replay_llm import build_replay_llm, record_fixture, render_messages
+from extractor.metrics import stage
+from extractor.pdf_processing.format_po import estimate_tokens
+from extractor.llm_scheduler import LLMBackend, LLMScheduler, load_backend_configs
 
 logger = setup_logger()
 
-def get_llm():
+LLM_CACHE_PATH = CACHE_DIR / "llm_cache.db"
+# Tokens reserved for the response when checking a backend's TPM budget.
+RESPONSE_TOKEN_RESERVE = 512
+
+# Process-wide registries so each provider/model client and each prompt chain
+# is built once and then shared by every request and worker thread.
+_llm_registry = {}
+_chain_registry = {}
+_registry_lock = threading.Lock()
+_response_cache = None
+_scheduler = None
+_scheduler_signature = None
+
+def get_llm_config():
     provider = os.getenv("LLM_PROVIDER", "gemini").lower()
     model_name = os.getenv("LLM_MODEL_NAME", "gemini-1.5-flash")
-    api_key = os.getenv("LLM_API_KEY") or os.getenv("GEMINI_API_KEY")
+    return provider, model_name
+
+def get_llm_backend_models():
+    """
+    Returns the sorted "provider:model" pairs of the configured backend pool
+    (see load_backend_configs), i.e. every model that may answer a request.
+    """
+    configs = load_backend_configs(*get_llm_config())
+    return sorted(f"{config['provider']}:{config['model']}" for config in configs)
+
+EXTRACTION_MODES = {"two_call", "single_call"}
+
+def get_extraction_mode():
+    """
+    Returns how POs are sent to the LLM, read from LLM_EXTRACTION_MODE.
+
+    "two_call" (default) classifies first and then runs the type-specific
+    extractor. "single_call" classifies and extracts in one request.
+    """
+    mode = os.getenv("LLM_EXTRACTION_MODE", "two_call").lower()
+    if mode not in EXTRACTION_MODES:
+        logger.error(f"Unsupported LLM extraction mode: {mode}")
+        raise ValueError(f"Unsupported LLM extraction mode: {mode}")
+    return mode
+
+def _build_llm(provider: str, model_name: str, api_key: str):
     logger.info(f"Initializing LLM with provider: {provider}, model: {model_name}")
     if provider == "gemini":
         if not api_key:
             logger.error("Google Gemini API key not found in environment variables.")
             raise ValueError("Google Gemini API key not found.")
+        # Provider SDKs are imported on first use; each one is slow to import.
+        from langchain_google_genai import ChatGoogleGenerativeAI
         return ChatGoogleGenerativeAI(model=model_name, google_api_key=api_key)
     elif provider == "openai":
         if not api_key:
             logger.error("OpenAI API key not found in environment variables.")
             raise ValueError("OpenAI API key not found.")
-        return ChatOpenAI(model=model_name, api_key=api_key)
+        import httpx
+        from langchain_openai import ChatOpenAI
+        max_connections = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+        http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        return ChatOpenAI(model=model_name, api_key=api_key, http_client=http_client)
+    elif provider == "replay":
+        return build_replay_llm()
     else:
         logger.error(f"Unsupported LLM provider: {provider}")
         raise ValueError(f"Unsupported LLM provider: {provider}")
 
+def _llm_key():
+    provider, model_name = get_llm_config()
+    api_key = os.getenv("LLM_API_KEY") or os.getenv("GEMINI_API_KEY")
+    return provider, model_name, api_key
+
+def get_llm(provider: str = None, model_name: str = None, api_key: str = None):
+    """
+    Returns the shared chat model client for a provider, model and API key,
+    defaulting to the configured LLM_PROVIDER and LLM_MODEL_NAME.
+
+    The client is built on first use and reused for the rest of the process,
+    so its HTTP connections (and TLS sessions) are pooled across calls.
+    """
+    key = (provider, model_name, api_key) if provider else _llm_key()
+    llm = _llm_registry.get(key)
+    if llm is not None:
+        return llm
+    with _registry_lock:
+        llm = _llm_registry.get(key)
+        if llm is None:
+            llm = _build_llm(*key)
+            _llm_registry[key] = llm
+    return llm
+
+def _scheduler_env_signature():
+    names = ["LLM_BACKENDS", "LLM_BACKENDS_FILE", "LLM_RPM", "LLM_TPM",
+             "LLM_SCHEDULER_MAX_RETRIES", "LLM_SCHEDULER_BACKOFF_SECONDS", "LLM_SCHEDULER_MAX_WAIT_SECONDS"]
+    return _llm_key() + tuple(os.getenv(name) for name in names)
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Returns the process-wide scheduler over the configured LLM backends.
+
+    See load_backend_configs for how the backend pool is configured. The
+    scheduler is rebuilt only when that configuration changes, so usage
+    counters and rate-limit windows persist across requests.
+    """
+    global _scheduler, _scheduler_signature
+    signature = _scheduler_env_signature()
+    if _scheduler is not None and _scheduler_signature == signature:
+        return _scheduler
+    provider, model_name = get_llm_config()
+    configs = load_backend_configs(provider, model_name)
+    backends = [
+        LLMBackend(
+            config["name"], config["provider"], config["model"],
+            get_llm(config["provider"], config["model"], config["api_key"]),
+            rpm=config["rpm"], tpm=config["tpm"],
+        )
+        for config in configs
+    ]
+    with _registry_lock:
+        if _scheduler is None or _scheduler_signature != signature:
+            _scheduler = LLMScheduler(
+                backends,
+                max_retries=int(os.getenv("LLM_SCHEDULER_MAX_RETRIES", "4")),
+                backoff_seconds=float(os.getenv("LLM_SCHEDULER_BACKOFF_SECONDS", "2")),
+                max_wait_seconds=float(os.getenv("LLM_SCHEDULER_MAX_WAIT_SECONDS", "120")),
+            )
+            _scheduler_signature = signature
+            logger.info(f"LLM scheduler ready with {len(backends)} backend(s): {', '.join(b.name for b in backends)}")
+    return _scheduler
+
+def get_llm_usage():
+    """Returns per-backend usage (requests, tokens, rate limits) since start-up."""
+    return get_scheduler().usage()
+
+def is_llm_cache_enabled():
+    return os.getenv("LLM_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+
+def get_llm_response_cache():
+    """
+    Returns the process-wide LLM response cache, or None when it is disabled.
+
+    Responses are kept in output/cache/llm_cache.db for LLM_CACHE_TTL_HOURS
+    and the file is capped at LLM_CACHE_MAX_MB, evicting least recently used
+    responses first.
+    """
+    global _response_cache
+    if not is_llm_cache_enabled():
+        return None
+    with _registry_lock:
+        if _response_cache is None:
+            ttl_hours = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+            max_mb = float(os.getenv("LLM_CACHE_MAX_MB", "64"))
+            _response_cache = DiskCache(
+                LLM_CACHE_PATH,
+                max_bytes=int(max_mb * 1024 * 1024),
+                max_age_seconds=ttl_hours * 3600,
+            )
+    return _response_cache
+
+class CachedChain:
+    """
+    Wraps a compiled prompt chain with the persistent LLM response cache.
+
+    The cache key covers the backend pool's providers and models, a hash of
+    the prompt template and the rendered input variables, so any change to
+    those misses the cache. Misses are sent through the LLM scheduler, which
+    picks the backend. The replay provider bypasses the cache, since its
+    responses are already local. When LLM_REPLAY_RECORD_DIR is set, real
+    responses are also recorded as replay fixtures.
+    """
+
+    def __init__(self, name, template, parser, scheduler):
+        self.name = name
+        self.prompt = get_prompt(template)
+        self.parser = parser
+        self.scheduler = scheduler
+        self._chains = {}
+        self._key_prefix = f"{scheduler.fingerprint}:{hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]}"
+
+    def cache_key(self, variables: dict) -> str:
+        rendered = json.dumps(variables, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(f"{self._key_prefix}:{rendered}".encode("utf-8")).hexdigest()
+
+    def _chain_for(self, backend):
+        chain = self._chains.get(backend.name)
+        if chain is None:
+            chain = self._chains.setdefault(backend.name, self.prompt | backend.llm | self.parser)
+        return chain
+
+    def _call(self, variables: dict, prompt_text: str, span: dict):
+        def call(backend):
+            span["backend"] = backend.name
+            output = self._chain_for(backend).invoke(variables)
+            record_dir = os.getenv("LLM_REPLAY_RECORD_DIR")
+            if record_dir and backend.provider != "replay":
+                record_fixture(record_dir, self.name, prompt_text, output)
+            return output
+
+        tokens = estimate_tokens(prompt_text) + RESPONSE_TOKEN_RESERVE
+        return self.scheduler.invoke(call, tokens)
+
+    def invoke(self, variables: dict):
+        prompt_text = render_messages(self.prompt.format_messages(**variables))
+        with stage(f"llm_{self.name}", prompt_chars=len(prompt_text), prompt_tokens=estimate_tokens(prompt_text)) as span:
+            output = self._invoke_cached(variables, prompt_text, span)
+            span["response_chars"] = len(output if isinstance(output, str) else json.dumps(output))
+        return output
+
+    def _invoke_cached(self, variables: dict, prompt_text: str, span: dict):
+        cache = get_llm_response_cache() if not self.scheduler.is_replay_only else None
+        if cache is None:
+            return self._call(variables, prompt_text, span)
+
+        key = self.cache_key(variables)
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"LLM response cache hit for '{self.name}' (hits={cache.hits}, misses={cache.misses})")
+            span["cache_hits"] = 1
+            return cached["output"]
+
+        logger.info(f"LLM response cache miss for '{self.name}' (hits={cache.hits}, misses={cache.misses})")
+        output = self._call(variables, prompt_text, span)
+        cache.set(key, {"output": output})
+        return output
+
+def get_chain(name: str, template: str, json_output: bool = True):
+    """
+    Returns the compiled prompt chain for one of the extraction prompts.
+
+    Chains are compiled once per prompt and backend pool, then reused. The
+    time spent getting the chain is logged so per-call setup overhead can be
+    tracked. Every chain goes through the persistent LLM response cache and
+    the LLM scheduler.
+
+    Args:
+        name: A short, stable name for the prompt (e.g. "classify").
+        template: The prompt template text.
+        json_output: Whether the chain parses the response as JSON. Otherwise
+            the response text is returned as a string.
+    """
+    started = time.perf_counter()
+    scheduler = get_scheduler()
+    key = (name, json_output, id(scheduler))
+    chain = _chain_registry.get(key)
+    built = False
+    if chain is None:
+        with _registry_lock:
+            chain = _chain_registry.get(key)
+            if chain is None:
+                parser = get_json_parser() if json_output else StrOutputParser()
+                chain = CachedChain(name, template, parser, scheduler)
+                _chain_registry[key] = chain
+                built = True
+    setup_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"LLM chain '{name}' setup took {setup_ms:.3f} ms ({'built' if built else 'reused'})")
+    return chain
+
 def get_json_parser():
     logger.debug("Creating JsonOutputParser instance.")
     return JsonOutputParser()
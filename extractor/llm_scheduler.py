@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+WINDOW_SECONDS = 60.0
+
+_rate_limit_types = None
+
+
+class LLMRateLimitError(RuntimeError):
+    """Raised when no backend can take a request within the scheduler's wait limit."""
+
+
+def _get_rate_limit_types() -> tuple:
+    """The rate-limit exception types of the provider SDKs that are installed."""
+    global _rate_limit_types
+    if _rate_limit_types is None:
+        types = []
+        try:
+            from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+            types += [ResourceExhausted, TooManyRequests]
+        except ImportError:
+            pass
+        try:
+            from openai import RateLimitError
+            types.append(RateLimitError)
+        except ImportError:
+            pass
+        try:
+            from langchain_core.exceptions import ModelRateLimitError
+            types.append(ModelRateLimitError)
+        except ImportError:
+            pass
+        _rate_limit_types = tuple(types)
+    return _rate_limit_types
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Recognises HTTP 429 / quota errors from the Gemini and OpenAI clients, by
+    the provider's exception type or the HTTP status code, on the error or
+    on the errors it was raised from.
+
+    The message is never inspected: parser errors echo the model's output,
+    which may well contain "429" or "quota".
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, _get_rate_limit_types()):
+            return True
+        for status in (getattr(error, "status_code", None), getattr(error, "code", None),
+                       getattr(getattr(error, "response", None), "status_code", None)):
+            if isinstance(status, int) and status == 429:
+                return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def load_backend_configs(default_provider: str, default_model: str) -> List[dict]:
+    """
+    Reads the LLM backend pool.
+
+    The pool is a JSON list from LLM_BACKENDS_FILE or LLM_BACKENDS, each entry
+    with "provider", "model", either "api_key" or "api_key_env" (the name of
+    an environment variable holding the key), and optional "name", "rpm" and
+    "tpm" budgets (0 or missing means unlimited). Without either variable, a
+    single backend is built from LLM_PROVIDER, LLM_MODEL_NAME, LLM_API_KEY
+    (or GEMINI_API_KEY), LLM_RPM and LLM_TPM.
+    """
+    path = os.getenv("LLM_BACKENDS_FILE")
+    raw = Path(path).read_text(encoding="utf-8") if path else os.getenv("LLM_BACKENDS")
+    if not raw:
+        return [{
+            "name": f"{default_provider}-1",
+            "provider": default_provider,
+            "model": default_model,
+            "api_key": os.getenv("LLM_API_KEY") or os.getenv("GEMINI_API_KEY"),
+            "rpm": int(os.getenv("LLM_RPM", "0")),
+            "tpm": int(os.getenv("LLM_TPM", "0")),
+        }]
+
+    configs = []
+    for index, entry in enumerate(json.loads(raw), start=1):
+        provider = entry.get("provider", default_provider).lower()
+        api_key = entry.get("api_key") or (os.getenv(entry["api_key_env"]) if entry.get("api_key_env") else None)
+        configs.append({
+            "name": entry.get("name", f"{provider}-{index}"),
+            "provider": provider,
+            "model": entry.get("model", default_model),
+            "api_key": api_key,
+            "rpm": int(entry.get("rpm", 0)),
+            "tpm": int(entry.get("tpm", 0)),
+        })
+    return configs
+
+
+class LLMBackend:
+    """One provider/model/API key with its own requests- and tokens-per-minute budget."""
+
+    def __init__(self, name: str, provider: str, model_name: str, llm, rpm: int = 0, tpm: int = 0):
+        self.name = name
+        self.provider = provider
+        self.model_name = model_name
+        self.llm = llm
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = deque()  # (timestamp, tokens) of requests in the last minute
+        self.window_tokens = 0
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_rate_limits = 0
+        self.totals = {"requests": 0, "tokens": 0, "rate_limited": 0, "errors": 0}
+
+    def _trim(self, now: float) -> None:
+        while self.window and self.window[0][0] <= now - WINDOW_SECONDS:
+            _, tokens = self.window.popleft()
+            self.window_tokens -= tokens
+
+    def ready_at(self, now: float, tokens: int) -> float:
+        """Earliest time this backend can take a request of `tokens` within its budgets."""
+        self._trim(now)
+        ready = max(now, self.cooldown_until)
+        if self.rpm and len(self.window) >= self.rpm:
+            ready = max(ready, self.window[len(self.window) - self.rpm][0] + WINDOW_SECONDS)
+        if self.tpm and self.window and self.window_tokens + tokens > self.tpm:
+            # Wait until enough of the window has expired to fit this request.
+            needed = self.window_tokens + tokens - self.tpm
+            for timestamp, used in self.window:
+                needed -= used
+                if needed <= 0:
+                    ready = max(ready, timestamp + WINDOW_SECONDS)
+                    break
+        return ready
+
+    def load(self) -> float:
+        """Share of the per-minute budget in use, plus requests still in flight."""
+        utilisation = 0.0
+        if self.rpm:
+            utilisation = max(utilisation, len(self.window) / self.rpm)
+        if self.tpm:
+            utilisation = max(utilisation, self.window_tokens / self.tpm)
+        return utilisation + self.in_flight * 1e-3
+
+    def reserve(self, now: float, tokens: int) -> None:
+        self.window.append((now, tokens))
+        self.window_tokens += tokens
+        self.in_flight += 1
+        self.totals["requests"] += 1
+        self.totals["tokens"] += tokens
+
+    def usage(self, now: float) -> dict:
+        self._trim(now)
+        return {
+            "name": self.name,
+            "provider": self.provider,
+            "model": self.model_name,
+            "rpm_limit": self.rpm or None,
+            "tpm_limit": self.tpm or None,
+            "requests_last_minute": len(self.window),
+            "tokens_last_minute": self.window_tokens,
+            "in_flight": self.in_flight,
+            "cooling_down_seconds": round(max(0.0, self.cooldown_until - now), 1),
+            **self.totals,
+        }
+
+
+class LLMScheduler:
+    """
+    Routes LLM calls across a pool of backends (keys and providers).
+
+    Each call goes to the least-loaded backend that has room in its
+    requests-per-minute and tokens-per-minute budgets, waiting for room when
+    none has. A rate-limited (429) backend is put into an exponential backoff
+    and the call is retried on a different backend.
+    """
+
+    def __init__(self, backends: List[LLMBackend], max_retries: int = 4, backoff_seconds: float = 2.0, max_wait_seconds: float = 120.0):
+        if not backends:
+            raise ValueError("The LLM scheduler needs at least one backend.")
+        self.backends = backends
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self._condition = threading.Condition()
+        self.fingerprint = hashlib.sha256(
+            "|".join(sorted(f"{b.provider}:{b.model_name}" for b in backends)).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @property
+    def is_replay_only(self) -> bool:
+        return all(backend.provider == "replay" for backend in self.backends)
+
+    def _acquire(self, tokens: int, exclude: set) -> LLMBackend:
+        deadline = time.monotonic() + self.max_wait_seconds
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                candidates = [b for b in self.backends if b.name not in exclude] or self.backends
+                ready_times = {b.name: b.ready_at(now, tokens) for b in candidates}
+                ready = [b for b in candidates if ready_times[b.name] <= now]
+                if ready:
+                    backend = min(ready, key=lambda b: b.load())
+                    backend.reserve(now, tokens)
+                    return backend
+                wake_at = min(ready_times.values())
+                if wake_at > deadline:
+                    raise LLMRateLimitError(f"No LLM backend has capacity for {tokens} tokens within {self.max_wait_seconds:.0f}s")
+                logger.info(f"All LLM backends are at their budget; waiting {wake_at - now:.1f}s")
+                self._condition.wait(timeout=max(0.01, wake_at - now))
+
+    def _release(self, backend: LLMBackend, outcome: str, error: Optional[Exception] = None) -> None:
+        with self._condition:
+            backend.in_flight -= 1
+            if outcome == "ok":
+                backend.consecutive_rate_limits = 0
+            elif outcome == "rate_limited":
+                backend.totals["rate_limited"] += 1
+                backend.consecutive_rate_limits += 1
+                delay = _retry_after_seconds(error) or self.backoff_seconds * 2 ** (backend.consecutive_rate_limits - 1)
+                backend.cooldown_until = time.monotonic() + delay
+                logger.warning(f"LLM backend '{backend.name}' was rate limited; backing off for {delay:.1f}s")
+            else:
+                backend.totals["errors"] += 1
+            self._condition.notify_all()
+
+    def invoke(self, call: Callable[[LLMBackend], Any], tokens: int):
+        """
+        Runs call(backend) on a scheduled backend, retrying rate-limited calls
+        on other backends.
+
+        Args:
+            call: Performs the request with the given backend's client.
+            tokens: Estimated tokens the request will use, for the TPM budget.
+        """
+        tried = set()
+        for attempt in range(self.max_retries + 1):
+            backend = self._acquire(tokens, tried)
+            logger.debug(f"Routing LLM call to backend '{backend.name}' (attempt {attempt + 1})")
+            try:
+                result = call(backend)
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < self.max_retries:
+                    self._release(backend, "rate_limited", e)
+                    tried.add(backend.name)
+                    if len(tried) == len(self.backends):
+                        tried.clear()
+                    continue
+                self._release(backend, "rate_limited" if is_rate_limit_error(e) else "error", e)
+                raise
+            self._release(backend, "ok")
+            return result
+
+    def usage(self) -> List[dict]:
+        with self._condition:
+            now = time.monotonic()
+            return [backend.usage(now) for backend in self.backends]
@@ -0,0 +1,112 @@
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+# Metrics of the document currently being processed on this thread/context.
+_current_metrics = contextvars.ContextVar("pipeline_metrics", default=None)
+
+# Span fields that are not summed when aggregating.
+_TIMING_FIELDS = {"stage", "wall_ms", "cpu_ms"}
+
+
+def new_document_metrics(document: Optional[str] = None) -> dict:
+    """Creates an empty metrics record for one document."""
+    return {"document": document, "spans": []}
+
+
+@contextmanager
+def collect_metrics(metrics: Optional[dict]):
+    """
+    Records every stage run inside the block into the given document metrics.
+
+    The record can be re-entered later (for example on another thread, or after
+    being returned from a worker process) to add the remaining stages.
+    """
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """
+    Times one pipeline stage and records it as a span on the current document.
+
+    Wall time comes from perf_counter and CPU time from thread_time, so CPU
+    spent by other threads or processes is not attributed to the stage. Size
+    fields (bytes, blocks, tables, prompt characters, ...) can be passed up
+    front or set on the yielded span dict.
+    """
+    span = {"stage": name, **fields}
+    wall_started = time.perf_counter()
+    cpu_started = time.thread_time()
+    try:
+        yield span
+    finally:
+        span["wall_ms"] = round((time.perf_counter() - wall_started) * 1000, 3)
+        span["cpu_ms"] = round((time.thread_time() - cpu_started) * 1000, 3)
+        metrics = _current_metrics.get()
+        if metrics is not None:
+            metrics["spans"].append(span)
+
+
+def summarize_document(metrics: dict) -> dict:
+    """Returns per-stage totals for one document, plus its overall wall time."""
+    summary = aggregate_metrics([metrics])
+    summary["document"] = metrics.get("document")
+    return summary
+
+
+def aggregate_metrics(documents: Iterable[Optional[dict]]) -> dict:
+    """
+    Aggregates document metrics into per-stage totals for a batch.
+
+    Returns:
+        dict: "documents" (count), "total_wall_ms" and "stages", a dict of stage
+        name to call count, total/mean/max wall time, total CPU time and the
+        sum of every numeric size field recorded for the stage.
+    """
+    documents = [doc for doc in documents if doc]
+    stages = {}
+    for doc in documents:
+        for span in doc["spans"]:
+            totals = stages.setdefault(span["stage"], {"count": 0, "wall_ms": 0.0, "max_wall_ms": 0.0, "cpu_ms": 0.0})
+            totals["count"] += 1
+            totals["wall_ms"] += span["wall_ms"]
+            totals["max_wall_ms"] = max(totals["max_wall_ms"], span["wall_ms"])
+            totals["cpu_ms"] += span["cpu_ms"]
+            for key, value in span.items():
+                if key in _TIMING_FIELDS or isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                totals[key] = totals.get(key, 0) + value
+    for totals in stages.values():
+        totals["mean_wall_ms"] = totals["wall_ms"] / totals["count"]
+        for key in ("wall_ms", "max_wall_ms", "mean_wall_ms", "cpu_ms"):
+            totals[key] = round(totals[key], 3)
+    return {
+        "documents": len(documents),
+        "total_wall_ms": round(sum(totals["wall_ms"] for totals in stages.values()), 3),
+        "stages": stages,
+    }
+
+
+def format_metrics_summary(summary: dict) -> List[str]:
+    """Renders an aggregated summary as short human-readable lines for the UI."""
+    lines = [f"Pipeline timings for {summary['documents']} document(s), {summary['total_wall_ms'] / 1000:.2f} s in total:"]
+    for name, totals in summary["stages"].items():
+        sizes = ", ".join(
+            f"{key}={value:g}" for key, value in totals.items()
+            if key not in {"count", "wall_ms", "max_wall_ms", "mean_wall_ms", "cpu_ms"}
+        )
+        line = (
+            f"{name}: {totals['count']} call(s), {totals['wall_ms']:.1f} ms wall "
+            f"(mean {totals['mean_wall_ms']:.1f}, max {totals['max_wall_ms']:.1f}), {totals['cpu_ms']:.1f} ms CPU"
+        )
+        lines.append(f"{line}; {sizes}" if sizes else line)
+    return lines
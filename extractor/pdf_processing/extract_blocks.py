@@ -1,22 +1,23 @@
 import fitz
 from typing import List
 from app.core.logger import setup_logger
+from extractor.pdf_processing.parse_document import PdfSource, TextBlock, read_pdf_bytes, page_text_blocks
 
 logger = setup_logger()
 
-def extract_blocks(pdf_path: str) -> List[str]:
+def extract_blocks(pdf_path: PdfSource) -> List[TextBlock]:
     """
     Extracts layout-aware text blocks from a PDF using PyMuPDF.
 
     Args:
-        pdf_path (str): Path to the PDF file.
+        pdf_path (PdfSource): Path to the PDF file, or its raw bytes / a binary stream.
 
     Returns:
-        List[str]: A list of extracted text blocks, each representing a logical section or paragraph from the PDF.
+        List[TextBlock]: A list of (page number, text) blocks, each representing a logical section or paragraph from the PDF.
     """
-    logger.info(f"Opening PDF file: {pdf_path}")
+    logger.info(f"Opening PDF for block extraction: {pdf_path if isinstance(pdf_path, str) else type(pdf_path).__name__}")
     try:
-        doc = fitz.open(pdf_path)
+        doc = fitz.open(stream=read_pdf_bytes(pdf_path), filetype="pdf")
     except Exception as e:
         logger.error(f"Failed to open PDF file '{pdf_path}': {e}")
         raise
@@ -24,25 +25,17 @@ def extract_blocks(pdf_path: str) -> List[str]:
     all_blocks = []
     logger.info(f"Number of pages in PDF: {len(doc)}")
 
-    for page_num, page in enumerate(doc, start=1):
-        logger.info(f"Processing page {page_num}")
-        try:
-            blocks = page.get_text("dict")["blocks"]
-        except Exception as e:
-            logger.error(f"Failed to extract blocks from page {page_num}: {e}")
-            continue
+    with doc:
+        for page_num, page in enumerate(doc, start=1):
+            logger.info(f"Processing page {page_num}")
+            try:
+                blocks = page_text_blocks(page)
+            except Exception as e:
+                logger.error(f"Failed to extract blocks from page {page_num}: {e}")
+                continue
 
-        logger.debug(f"Found {len(blocks)} blocks on page {page_num}")
-        for b_idx, b in enumerate(blocks):
-            if "lines" in b:
-                lines = []
-                for l_idx, l in enumerate(b["lines"]):
-                    spans = [s["text"] for s in l["spans"] if s["text"].strip()]
-                    if spans:
-                        lines.append(" ".join(spans))
-                if lines:
-                    logger.debug(f"Block {b_idx} on page {page_num} has {len(lines)} lines")
-                    all_blocks.append("\n".join(lines))
+            logger.debug(f"Found {len(blocks)} blocks on page {page_num}")
+            all_blocks.extend((page_num, block) for block in blocks)
 
     logger.info(f"Extracted {len(all_blocks)} text blocks from PDF")
     return all_blocks
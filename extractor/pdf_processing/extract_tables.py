@@ -1,36 +1,48 @@
-import pdfplumber
+import fitz
 from typing import List
 from app.core.logger import setup_logger
+from extractor.pdf_processing.parse_document import (
+    PdfSource,
+    read_pdf_bytes,
+    page_has_table_layout,
+    extract_tables_by_page,
+    get_table_extraction_settings,
+)
 
 logger = setup_logger()
 
-def extract_tables(pdf_path: str) -> List[List[List[str]]]:
+def extract_tables(pdf_path: PdfSource) -> List[List[List[str]]]:
     """
     Extracts tables from a PDF using pdfplumber.
 
+    Pages without ruling lines are skipped after a cheap PyMuPDF pre-check, and
+    large documents can be split across processes by page range (see
+    get_table_extraction_settings).
+
     Args:
-        pdf_path (str): Path to the PDF file.
+        pdf_path (PdfSource): Path to the PDF file, or its raw bytes / a binary stream.
 
     Returns:
         List[List[List[str]]]: A list of tables, where each table is a list of rows, and each row is a list of cell values.
     """
-    logger.info(f"Opening PDF file for table extraction: {pdf_path}")
-    tables = []
+    logger.info(f"Opening PDF for table extraction: {pdf_path if isinstance(pdf_path, str) else type(pdf_path).__name__}")
+    settings = get_table_extraction_settings()
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            logger.info(f"Number of pages in PDF: {len(pdf.pages)}")
-            for page_num, page in enumerate(pdf.pages, start=1):
-                logger.info(f"Extracting tables from page {page_num}")
-                try:
-                    extracted = page.extract_tables()
-                    logger.debug(f"Found {len(extracted)} tables on page {page_num}")
-                    for t_idx, table in enumerate(extracted):
-                        logger.debug(f"Appending table {t_idx+1} from page {page_num}")
-                        tables.append(table)
-                except Exception as e:
-                    logger.error(f"Failed to extract tables from page {page_num}: {e}")
+        data = read_pdf_bytes(pdf_path)
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            logger.info(f"Number of pages in PDF: {len(doc)}")
+            pages = [
+                page_num for page_num, page in enumerate(doc)
+                if not settings["precheck"] or page_has_table_layout(page)
+            ]
     except Exception as e:
         logger.error(f"Failed to open PDF file '{pdf_path}': {e}")
         raise
+    logger.info(f"Extracting tables from {len(pages)} pages with table-like layout")
+    tables = extract_tables_by_page(
+        data, "pdfplumber", pages,
+        workers=settings["workers"],
+        parallel_min_pages=settings["parallel_min_pages"],
+    )
     logger.info(f"Extracted {len(tables)} tables from PDF")
     return tables
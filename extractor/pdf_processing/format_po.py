@@ -1,34 +1,229 @@
-from typing import List
+import os
+import re
+import math
+from typing import List, Optional, Tuple
 from app.core.logger import setup_logger
+from extractor.pdf_processing.parse_document import TextBlock
 
 logger = setup_logger()
 
-def format_po_for_llm(text_blocks: List[str], tables: List[List[List[str]]]) -> str:
+PAGE_NUMBER_RE = re.compile(r"^page\s*\d+(\s*(of|/)\s*\d+)?$", re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"[ \t ]+")
+PAYMENT_SIGNAL_RE = re.compile(
+    r"\b(payments?|milestones?|invoices?|amount|total|usd|instal\w*|schedule|monthly|quarterly|annual\w*|"
+    r"frequency|terms|advance|due|performance|duration|purchase order)\b|\$|%",
+    re.IGNORECASE,
+)
+DATE_RE = re.compile(
+    r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2}\b|"
+    r"\b\d{1,2}\s+(jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)",
+    re.IGNORECASE,
+)
+# Shortest text (ignoring whitespace) that is treated as a repeated header or footer.
+MIN_REPEATED_CHARS = 20
+# Table cell lines shorter than this ("1", "EA") say nothing about whether the table is a duplicate.
+MIN_CELL_CHARS = 3
+# Bump when compaction changes, so PO text cached with the old rules is rebuilt.
+FORMAT_VERSION = "3"
+
+
+def get_compaction_settings() -> Tuple[bool, int]:
+    """
+    Returns (enabled, token_budget) for PO text compaction.
+
+    Read from PO_COMPACTION_ENABLED (default true) and PO_TOKEN_BUDGET
+    (default 6000; 0 disables the budget).
+    """
+    enabled = os.getenv("PO_COMPACTION_ENABLED", "true").lower() in {"1", "true", "yes"}
+    token_budget = int(os.getenv("PO_TOKEN_BUDGET", "6000"))
+    return enabled, token_budget
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximates the number of LLM input tokens in a text.
+
+    Uses the common ~4 characters per token rule, which is close enough for
+    budgeting across both Gemini and OpenAI tokenizers.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def _collapse_whitespace(text: str) -> str:
+    lines = [WHITESPACE_RE.sub(" ", line).strip() for line in text.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def _squash(text: str) -> str:
+    """Removes all whitespace, so differently wrapped copies of the same text compare equal."""
+    return re.sub(r"\s+", "", text).lower()
+
+
+def _dedupe_blocks(text_blocks: List[TextBlock]) -> List[TextBlock]:
+    """
+    Collapses whitespace and drops page numbers and running headers/footers.
+
+    A block is only dropped as a header or footer when the same text, at least
+    MIN_REPEATED_CHARS long, was already seen on an earlier page. Repeats on
+    the same page and short repeats (amounts, dates, "Total") are kept.
+    """
+    first_page = {}
+    blocks = []
+    for page, block in text_blocks:
+        block = _collapse_whitespace(block)
+        if not block or PAGE_NUMBER_RE.match(block):
+            continue
+        key = _squash(block)
+        if len(key) >= MIN_REPEATED_CHARS:
+            if first_page.setdefault(key, page) != page:
+                continue
+        blocks.append((page, block))
+    return blocks
+
+
+def _clean_table(table: List[List[str]]) -> List[List[str]]:
+    """Normalises cells and drops rows and columns that are entirely empty."""
+    rows = [[_collapse_whitespace(str(cell)) if cell is not None else "" for cell in row] for row in table]
+    rows = [["" if PAGE_NUMBER_RE.match(cell) else cell for cell in row] for row in rows]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return []
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    keep = [i for i in range(width) if any(row[i] for row in rows)]
+    return [[row[i] for i in keep] for row in rows]
+
+
+def _table_covered_by_blocks(table: List[List[str]], squashed_blocks: str, threshold: float = 0.9) -> bool:
+    """
+    Checks whether (almost) all of a table's text already appears in the text blocks.
+
+    Coverage is measured per cell line, weighted by its length; lines shorter
+    than MIN_CELL_CHARS are left out.
+    """
+    total = covered = 0
+    for row in table:
+        for cell in row:
+            for line in cell.splitlines():
+                key = _squash(line)
+                if len(key) < MIN_CELL_CHARS:
+                    continue
+                total += len(key)
+                if key in squashed_blocks:
+                    covered += len(key)
+    return total == 0 or covered / total >= threshold
+
+
+def _payment_score(segment: str) -> int:
+    return len(PAYMENT_SIGNAL_RE.findall(segment)) + 2 * len(DATE_RE.findall(segment))
+
+
+def _render(blocks: List[TextBlock], tables: List[List[List[str]]]) -> str:
+    formatted_text = "\n\n".join(block for _, block in blocks)
+    formatted_tables = ""
+    for idx, table in enumerate(tables, start=1):
+        logger.debug(f"Formatting table {idx} with {len(table)} rows.")
+        table_rows = ["\t".join(map(str, row)) for row in table]
+        table_str = "\n".join(table_rows)
+        formatted_tables += f"\n\nTable {idx}:\n{table_str}"
+    return formatted_text + formatted_tables
+
+
+def _apply_token_budget(blocks: List[TextBlock], tables: List[List[List[str]]], token_budget: int):
+    """
+    Keeps the most payment-relevant blocks and tables that fit in the budget.
+
+    Segments are ranked by payment signals (amounts, dates, percentages,
+    payment keywords) per token, so short header fields such as the client
+    name and PO number survive ahead of long boilerplate. Kept segments are
+    emitted in their original document order.
+    """
+    segments = [("block", i, block) for i, (_, block) in enumerate(blocks)]
+    segments += [("table", i, _render([], [table])) for i, table in enumerate(tables)]
+    costs = [estimate_tokens(seg[2]) + 1 for seg in segments]
+    ranked = sorted(
+        range(len(segments)),
+        key=lambda s: (-(_payment_score(segments[s][2]) + 1) / costs[s], s),
+    )
+    kept = set()
+    used = 0
+    for s in ranked:
+        cost = costs[s]
+        if used + cost > token_budget:
+            continue
+        kept.add(s)
+        used += cost
+    kept_blocks = [blocks[seg[1]] for s, seg in enumerate(segments) if s in kept and seg[0] == "block"]
+    kept_tables = [tables[seg[1]] for s, seg in enumerate(segments) if s in kept and seg[0] == "table"]
+    logger.info(f"Token budget {token_budget}: kept {len(kept_blocks)}/{len(blocks)} blocks and {len(kept_tables)}/{len(tables)} tables.")
+    return kept_blocks, kept_tables
+
+
+def compact_po_content(text_blocks: List[TextBlock], tables: List[List[List[str]]], token_budget: int = 0):
+    """
+    Removes duplicated and low-value content before the PO is sent to the LLM.
+
+    Args:
+        text_blocks: (page number, text) blocks extracted from the PDF.
+        tables: Tables extracted from the PDF.
+        token_budget: Maximum approximate tokens to keep; 0 means no limit.
+
+    Returns:
+        Tuple[List[TextBlock], List[List[List[str]]]]: The compacted blocks and tables.
+    """
+    blocks = _dedupe_blocks(text_blocks)
+    squashed_blocks = _squash("\n".join(block for _, block in blocks))
+
+    kept_tables = []
+    for idx, table in enumerate(tables, start=1):
+        table = _clean_table(table)
+        if not table:
+            logger.debug(f"Dropping empty table {idx}.")
+            continue
+        if _table_covered_by_blocks(table, squashed_blocks):
+            logger.debug(f"Dropping table {idx}; its content is already present in the text blocks.")
+            continue
+        kept_tables.append(table)
+    logger.info(f"Compaction kept {len(blocks)}/{len(text_blocks)} blocks and {len(kept_tables)}/{len(tables)} tables.")
+
+    if token_budget and estimate_tokens(_render(blocks, kept_tables)) > token_budget:
+        blocks, kept_tables = _apply_token_budget(blocks, kept_tables, token_budget)
+    return blocks, kept_tables
+
+
+def format_po_for_llm(text_blocks: List[TextBlock], tables: List[List[List[str]]], compact: Optional[bool] = None, token_budget: Optional[int] = None) -> str:
     """
     Format extracted text blocks and tables into a clean plain-text string
     suitable for input to an LLM.
 
     Args:
-        text_blocks: List of text blocks extracted from the PDF.
+        text_blocks: List of (page number, text) blocks extracted from the PDF.
         tables: List of tables, where each table is a list of rows,
                 and each row is a list of cell strings.
+        compact: Whether to remove repeated headers and footers, tables already present in
+                 the blocks, and extra whitespace. Defaults to PO_COMPACTION_ENABLED.
+        token_budget: Approximate token limit for the output (0 for none).
+                      Defaults to PO_TOKEN_BUDGET. Only applies when compacting.
 
     Returns:
         A single formatted string combining all text and tables for LLM consumption.
     """
     logger.info(f"Formatting {len(text_blocks)} text blocks and {len(tables)} tables for LLM input.")
-    
-    formatted_text = "\n\n".join(text_blocks)
-    logger.debug("Formatted text blocks.")
-    
-    # Format each table into a readable plain text table
-    formatted_tables = ""
-    for idx, table in enumerate(tables, start=1):
-        logger.debug(f"Formatting table {idx} with {len(table)} rows.")
-        table_rows = ["\t".join(map(str, row)) for row in table]
-        table_str = "\n".join(table_rows)
-        formatted_tables += f"\n\nTable {idx}:\n{table_str}"
+    default_compact, default_budget = get_compaction_settings()
+    compact = default_compact if compact is None else compact
+    token_budget = default_budget if token_budget is None else token_budget
+
+    if compact:
+        raw_tokens = estimate_tokens(_render(text_blocks, tables))
+        text_blocks, tables = compact_po_content(text_blocks, tables, token_budget)
 
+    formatted = _render(text_blocks, tables)
+
+    tokens = estimate_tokens(formatted)
+    if compact:
+        logger.info(f"PO input size: ~{tokens} tokens after compaction (~{raw_tokens} before).")
+    else:
+        logger.info(f"PO input size: ~{tokens} tokens.")
     logger.info("Finished formatting text and tables for LLM.")
 
-    return formatted_text + formatted_tables
+    return formatted
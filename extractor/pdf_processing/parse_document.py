@@ -0,0 +1,373 @@
+import io
+import os
+import threading
+import fitz
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Sequence, Tuple, Union
+from app.core.logger import setup_logger
+from extractor.metrics import stage
+
+logger = setup_logger()
+
+PdfSource = Union[str, Path, bytes, bytearray, memoryview, BinaryIO]
+# A text block with the 1-based number of the page it was found on.
+TextBlock = Tuple[int, str]
+
+TABLE_BACKENDS = {"pdfplumber", "pymupdf"}
+DEFAULT_TABLE_BACKEND = "pdfplumber"
+
+# Minimum ruling lines in each direction for a page to be worth running table detection on.
+MIN_RULING_LINES = 2
+
+_table_pool = None
+_table_pool_lock = threading.Lock()
+
+
+def get_table_backend() -> str:
+    """
+    Returns the table extraction backend configured for this deployment.
+
+    The backend is read from the PDF_TABLE_BACKEND environment variable and
+    defaults to pdfplumber, which matches the original extraction behaviour.
+    """
+    backend = os.getenv("PDF_TABLE_BACKEND", DEFAULT_TABLE_BACKEND).lower()
+    if backend not in TABLE_BACKENDS:
+        logger.error(f"Unsupported PDF table backend: {backend}")
+        raise ValueError(f"Unsupported PDF table backend: {backend}")
+    return backend
+
+
+def get_table_extraction_settings() -> dict:
+    """
+    Returns the table extraction tuning options.
+
+    Read from PDF_TABLE_PRECHECK (default true; skip pages without ruling
+    lines), PDF_TABLE_WORKERS (default 1; processes used for table extraction)
+    and PDF_TABLE_PARALLEL_MIN_PAGES (default 8; fewer candidate pages are
+    handled in-process).
+    """
+    return {
+        "precheck": os.getenv("PDF_TABLE_PRECHECK", "true").lower() in {"1", "true", "yes"},
+        "workers": max(1, int(os.getenv("PDF_TABLE_WORKERS", "1"))),
+        "parallel_min_pages": max(1, int(os.getenv("PDF_TABLE_PARALLEL_MIN_PAGES", "8"))),
+    }
+
+
+def read_pdf_bytes(source: PdfSource) -> Union[bytes, bytearray, memoryview]:
+    """
+    Normalises a PDF source into in-memory bytes.
+
+    Byte buffers (bytes, bytearray, memoryview) are returned as they are, so a
+    download buffer reaches the parsers without being copied.
+
+    Args:
+        source: A file path, a bytes-like object, or a binary file-like object.
+
+    Returns:
+        The raw PDF content.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if isinstance(source, (str, Path)):
+        logger.debug(f"Reading PDF file into memory: {source}")
+        return Path(source).read_bytes()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+
+class BufferStream(io.RawIOBase):
+    """A read-only, seekable file object over a bytes-like buffer that never copies it."""
+
+    def __init__(self, data):
+        self._view = memoryview(data)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+def open_fitz(data) -> "fitz.Document":
+    """Opens a PDF with PyMuPDF from a file path or a bytes-like buffer."""
+    if isinstance(data, (str, Path)):
+        return fitz.open(str(data), filetype="pdf")
+    return fitz.open(stream=data, filetype="pdf")
+
+
+def open_pdfplumber(data):
+    """Opens a PDF with pdfplumber from a file path or a bytes-like buffer, without copying the buffer."""
+    import pdfplumber
+    if isinstance(data, (str, Path)):
+        return pdfplumber.open(str(data))
+    return pdfplumber.open(io.BufferedReader(BufferStream(data)))
+
+
+def pdf_size(data) -> int:
+    return os.path.getsize(data) if isinstance(data, (str, Path)) else len(data)
+
+
+def page_text_blocks(page: "fitz.Page") -> List[str]:
+    """
+    Extracts the text blocks of a single PyMuPDF page.
+
+    Uses the lightweight "blocks" text mode instead of "dict", so no font or
+    span metadata is materialised for content we do not use.
+
+    Args:
+        page: An open PyMuPDF page.
+
+    Returns:
+        List[str]: Non-empty text blocks with blank lines removed.
+    """
+    blocks = []
+    # Each entry is (x0, y0, x1, y1, text, block_no, block_type); type 0 is text.
+    for b in page.get_text("blocks"):
+        if b[6] != 0:
+            continue
+        lines = [line.strip() for line in b[4].splitlines() if line.strip()]
+        if lines:
+            blocks.append("\n".join(lines))
+    return blocks
+
+
+def page_tables_pymupdf(page: "fitz.Page") -> List[List[List[str]]]:
+    """
+    Extracts tables from a single PyMuPDF page using its native table finder.
+
+    Args:
+        page: An open PyMuPDF page.
+
+    Returns:
+        List[List[List[str]]]: Tables found on the page, as lists of rows.
+    """
+    return [table.extract() for table in page.find_tables().tables]
+
+
+def page_has_table_layout(page: "fitz.Page") -> bool:
+    """
+    Cheaply checks whether a page has ruling lines that could form a table.
+
+    Both table backends detect tables from drawn lines by default, so a page
+    without at least two horizontal and two vertical rulings (rectangles count
+    for both) cannot yield a table and can be skipped.
+
+    Args:
+        page: An open PyMuPDF page.
+
+    Returns:
+        bool: True if table detection should run on the page.
+    """
+    horizontal = vertical = 0
+    # get_cdrawings returns plain tuples and is several times faster than get_drawings.
+    for drawing in page.get_cdrawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                (x0, y0), (x1, y1) = item[1], item[2]
+                width, height = abs(x1 - x0), abs(y1 - y0)
+            elif item[0] == "re":
+                x0, y0, x1, y1 = item[1]
+                width, height = abs(x1 - x0), abs(y1 - y0)
+            elif item[0] == "qu":
+                horizontal += 2
+                vertical += 2
+                continue
+            else:
+                continue
+
+            if width < 2 and height < 2:
+                continue
+            if item[0] == "l" or height < 2 or width < 2:
+                # A line, or a thin rectangle drawn as a ruling.
+                if height < 2:
+                    horizontal += 1
+                elif width < 2:
+                    vertical += 1
+            else:
+                horizontal += 2
+                vertical += 2
+            if horizontal >= MIN_RULING_LINES and vertical >= MIN_RULING_LINES:
+                return True
+    return False
+
+
+def extract_page_tables(data, backend: str, page_numbers: Sequence[int]) -> List[Tuple[int, List[List[List[str]]]]]:
+    """
+    Extracts tables from the given pages of a PDF.
+
+    Runs in table worker processes as well as in-process, so it opens its own
+    document from the bytes or file path.
+
+    Args:
+        data: The raw PDF content, or the path of a PDF on disk.
+        backend: "pdfplumber" or "pymupdf".
+        page_numbers: Zero-based page indexes to process.
+
+    Returns:
+        List[Tuple[int, List[List[List[str]]]]]: (page index, tables) pairs.
+    """
+    results = []
+    if backend == "pdfplumber":
+        pdf = open_pdfplumber(data)
+        get_tables = lambda index: pdf.pages[index].extract_tables()
+    else:
+        pdf = open_fitz(data)
+        get_tables = lambda index: page_tables_pymupdf(pdf[index])
+    try:
+        for index in page_numbers:
+            try:
+                tables = get_tables(index)
+                logger.debug(f"Found {len(tables)} tables on page {index + 1}")
+                results.append((index, tables))
+            except Exception as e:
+                logger.error(f"Failed to extract tables from page {index + 1}: {e}")
+    finally:
+        pdf.close()
+        if backend == "pdfplumber":
+            # pdfplumber leaves streams it did not open itself open.
+            pdf.stream.close()
+    return results
+
+
+def _get_table_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    global _table_pool
+    with _table_pool_lock:
+        if _table_pool is None:
+            try:
+                _table_pool = ProcessPoolExecutor(max_workers=workers)
+                logger.info(f"Started table extraction pool with {workers} processes")
+            except Exception as e:
+                logger.warning(f"Could not start table extraction pool, extracting serially: {e}")
+                return None
+    return _table_pool
+
+
+def _split_pages(page_numbers: List[int], chunks: int) -> List[List[int]]:
+    """Splits pages into contiguous ranges of roughly equal size."""
+    size = -(-len(page_numbers) // chunks)
+    return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+
+def extract_tables_by_page(data, backend: str, page_numbers: List[int], workers: int = 1, parallel_min_pages: int = 8) -> List[List[List[str]]]:
+    """
+    Extracts tables from the given pages, in page order.
+
+    With more than one worker and at least parallel_min_pages pages, the pages
+    are split into contiguous ranges that are processed by a shared process
+    pool. Otherwise, or if the pool is unavailable, pages are handled in-process.
+
+    Returns:
+        List[List[List[str]]]: All tables, ordered by page.
+    """
+    results = None
+    if workers > 1 and len(page_numbers) >= parallel_min_pages:
+        pool = _get_table_pool(workers)
+        if pool is not None:
+            ranges = _split_pages(page_numbers, workers)
+            logger.info(f"Extracting tables from {len(page_numbers)} pages in {len(ranges)} parallel page ranges")
+            # Buffers cannot be pickled to the workers; paths and bytes can.
+            shared = data if isinstance(data, (bytes, str, Path)) else bytes(data)
+            try:
+                futures = [pool.submit(extract_page_tables, shared, backend, pages) for pages in ranges]
+                results = [pair for future in futures for pair in future.result()]
+            except Exception as e:
+                logger.warning(f"Parallel table extraction failed, extracting serially: {e}")
+                results = None
+    if results is None:
+        results = extract_page_tables(data, backend, page_numbers)
+
+    results.sort(key=lambda pair: pair[0])
+    return [table for _, tables in results for table in tables]
+
+
+def parse_pdf(source: PdfSource, table_backend: Optional[str] = None) -> Tuple[List[TextBlock], List[List[List[str]]]]:
+    """
+    Parses a PDF once and returns its text blocks and tables.
+
+    The document is opened once with PyMuPDF to read the text blocks and to
+    pre-check each page for ruling lines. Table detection then only runs on
+    pages that could contain a table, using the configured backend on the same
+    in-memory buffer, optionally spread across processes by page range (see
+    get_table_extraction_settings). File paths are opened from disk rather
+    than read into memory, so large downloads spilled to a temporary file are
+    never held in memory whole.
+
+    Args:
+        source: A file path, a bytes-like buffer, or a binary file-like object.
+        table_backend: "pdfplumber" or "pymupdf". Defaults to PDF_TABLE_BACKEND.
+
+    Returns:
+        Tuple[List[TextBlock], List[List[List[str]]]]: The (page number, text)
+        blocks and the tables.
+    """
+    backend = table_backend or get_table_backend()
+    settings = get_table_extraction_settings()
+    data = source if isinstance(source, (str, Path)) else read_pdf_bytes(source)
+    size = pdf_size(data)
+    logger.info(f"Parsing PDF {'from disk' if isinstance(data, (str, Path)) else 'from memory'} ({size} bytes) with table backend: {backend}")
+
+    try:
+        doc = open_fitz(data)
+    except Exception as e:
+        logger.error(f"Failed to open PDF stream: {e}")
+        raise
+
+    all_blocks: List[TextBlock] = []
+    table_pages: List[int] = []
+    with stage("parse_text", bytes_in=size) as span:
+        try:
+            logger.info(f"Number of pages in PDF: {len(doc)}")
+            for page_num, page in enumerate(doc, start=1):
+                logger.debug(f"Processing page {page_num}")
+                try:
+                    all_blocks.extend((page_num, block) for block in page_text_blocks(page))
+                except Exception as e:
+                    logger.error(f"Failed to extract blocks from page {page_num}: {e}")
+
+                try:
+                    if not settings["precheck"] or page_has_table_layout(page):
+                        table_pages.append(page_num - 1)
+                    else:
+                        logger.debug(f"Skipping table detection on page {page_num}; no ruling lines found")
+                except Exception as e:
+                    logger.warning(f"Table pre-check failed on page {page_num}, running table detection anyway: {e}")
+                    table_pages.append(page_num - 1)
+            page_count = len(doc)
+        finally:
+            doc.close()
+        span["pages"] = page_count
+        span["blocks"] = len(all_blocks)
+
+    logger.info(f"Running table detection on {len(table_pages)}/{page_count} pages")
+    with stage("parse_tables", backend=backend, pages=len(table_pages)) as span:
+        all_tables = extract_tables_by_page(
+            data, backend, table_pages,
+            workers=settings["workers"],
+            parallel_min_pages=settings["parallel_min_pages"],
+        ) if table_pages else []
+        span["tables"] = len(all_tables)
+
+    logger.info(f"Parsed {len(all_blocks)} text blocks and {len(all_tables)} tables from PDF")
+    return all_blocks, all_tables
@@ -1,8 +1,10 @@
 from extractor.extract_distributed_details import extract_distributed_payment_details
 from extractor.extract_milestone_details import extract_milestone_payment_details
 from extractor.extract_periodic_details import extract_periodic_payment_details
+from extractor.extract_combined_details import extract_combined_payment_details
 from app.core.logger import setup_logger
-from extractor.llm_client import get_llm, get_prompt
+from extractor.llm_client import get_chain, get_extraction_mode
+from extractor.fast_classifier import classify_without_llm
 
 logger = setup_logger()
 
@@ -23,11 +25,13 @@ Purchase Order text:
 Category:
 """
 
-def classify_project_payment_category(po_text: str) -> str:
+def _classify_with_llm(po_text: str):
+    """Returns the LLM's payment type, or None in single_call mode, where classification and extraction share one call."""
+    if get_extraction_mode() == "single_call":
+        return None
+
     logger.info("Classifying project payment category using LLM.")
-    llm = get_llm()
-    prompt = get_prompt(CLASSIFY_PROMPT)
-    chain = prompt | llm
+    chain = get_chain("classify", CLASSIFY_PROMPT, json_output=False)
     try:
         classification_resp = chain.invoke({"po_text": po_text})
         if hasattr(classification_resp, "content"):
@@ -38,6 +42,15 @@ def classify_project_payment_category(po_text: str) -> str:
     except Exception as e:
         logger.error(f"Failed to classify payment type: {e}")
         raise
+    return payment_type
+
+def classify_project_payment_category(po_text: str) -> str:
+    payment_type = classify_without_llm(po_text)
+    if payment_type is None:
+        payment_type = _classify_with_llm(po_text)
+        if payment_type is None:
+            logger.info("Classifying and extracting project payment details in a single LLM call.")
+            return extract_combined_payment_details(po_text)
 
     if payment_type not in {"periodic", "distributed", "milestone"}:
         logger.error(f"Unexpected payment_type returned: {payment_type}")
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from app.core.logger import setup_logger
+
+logger = setup_logger()
+
+REPLAY_FIXTURES_DIR = Path("input") / "llm_replay"
+RECORDED_FIXTURES_FILE = "recorded.jsonl"
+
+# Identifies which prompt a rendered request came from, using its opening line.
+# The combined prompt is checked first because it also mentions classification.
+PROMPT_KIND_MARKERS = [
+    ("classifies a project payment Purchase Order and extracts", "combined"),
+    ("You are a classification assistant", "classify"),
+    ("from a Periodic project payment", "periodic"),
+    ("from a Distributed project payment", "distributed"),
+    ("from a Milestone-based project payment", "milestone"),
+]
+
+_record_lock = threading.Lock()
+
+
+def detect_prompt_kind(prompt_text: str) -> Optional[str]:
+    for marker, kind in PROMPT_KIND_MARKERS:
+        if marker in prompt_text:
+            return kind
+    return None
+
+
+def prompt_sha256(prompt_text: str) -> str:
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()
+
+
+def render_messages(messages: List[BaseMessage]) -> str:
+    """Joins the message contents into the text used for matching fixtures."""
+    return "\n".join(str(message.content) for message in messages)
+
+
+def load_fixtures(fixtures_dir: Path) -> List[dict]:
+    """
+    Loads replay fixtures from every *.json and *.jsonl file in fixtures_dir.
+
+    Each fixture is a dict with:
+        kind: The prompt it answers ("classify", "periodic", "distributed",
+            "milestone" or "combined").
+        response: The raw model response text.
+        prompt_sha256 (optional): Only answer this exact rendered prompt.
+        match (optional): Only answer prompts containing this text.
+    A fixture with neither prompt_sha256 nor match is the default for its kind.
+    """
+    fixtures = []
+    fixtures_dir = Path(fixtures_dir)
+    if not fixtures_dir.is_dir():
+        logger.warning(f"Replay fixtures directory not found: {fixtures_dir}")
+        return fixtures
+    for path in sorted(fixtures_dir.iterdir()):
+        if path.suffix == ".json":
+            data = json.loads(path.read_text(encoding="utf-8"))
+            fixtures.extend(data if isinstance(data, list) else [data])
+        elif path.suffix == ".jsonl":
+            with open(path, encoding="utf-8") as f:
+                fixtures.extend(json.loads(line) for line in f if line.strip())
+    logger.info(f"Loaded {len(fixtures)} replay fixtures from {fixtures_dir}")
+    return fixtures
+
+
+def record_fixture(record_dir: Path, kind: str, prompt_text: str, response: Any) -> None:
+    """Appends a real model response to the replay store so it can be replayed later."""
+    if not isinstance(response, str):
+        response = json.dumps(response, ensure_ascii=False)
+    entry = {"kind": kind, "prompt_sha256": prompt_sha256(prompt_text), "response": response}
+    record_dir = Path(record_dir)
+    with _record_lock:
+        record_dir.mkdir(parents=True, exist_ok=True)
+        with open(record_dir / RECORDED_FIXTURES_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    logger.debug(f"Recorded replay fixture for '{kind}' in {record_dir}")
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    A chat model that answers from recorded fixtures instead of calling an API.
+
+    Used with LLM_PROVIDER=replay to run the extraction pipeline offline and
+    deterministically. Responses are picked by exact prompt hash, then by the
+    first fixture whose `match` text appears in the prompt, then by the default
+    fixture for the prompt kind. An artificial delay of latency_ms +/- jitter_ms
+    is added to every call to simulate a real provider.
+    """
+
+    fixtures_dir: str = str(REPLAY_FIXTURES_DIR)
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    seed: Optional[int] = None
+
+    def model_post_init(self, __context: Any) -> None:
+        fixtures = load_fixtures(Path(self.fixtures_dir))
+        self._by_hash = {f["prompt_sha256"]: f for f in fixtures if f.get("prompt_sha256")}
+        self._matched = [f for f in fixtures if f.get("match") and not f.get("prompt_sha256")]
+        self._defaults = {}
+        for fixture in fixtures:
+            if not fixture.get("match") and not fixture.get("prompt_sha256"):
+                self._defaults.setdefault(fixture["kind"], fixture)
+        self._random = random.Random(self.seed)
+        self._random_lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _find_response(self, prompt_text: str) -> str:
+        fixture = self._by_hash.get(prompt_sha256(prompt_text))
+        kind = detect_prompt_kind(prompt_text)
+        if fixture is None:
+            fixture = next(
+                (f for f in self._matched if f["kind"] == kind and f["match"] in prompt_text),
+                None,
+            )
+        if fixture is None:
+            fixture = self._defaults.get(kind)
+        if fixture is None:
+            logger.error(f"No replay fixture found for prompt kind: {kind}")
+            raise ValueError(f"No replay fixture found for prompt kind: {kind}")
+        return fixture["response"]
+
+    def _delay_seconds(self) -> float:
+        with self._random_lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        prompt_text = render_messages(messages)
+        response = self._find_response(prompt_text)
+        delay = self._delay_seconds()
+        if delay:
+            time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=response))])
+
+
+def build_replay_llm() -> ReplayChatModel:
+    """
+    Builds the replay model from LLM_REPLAY_DIR, LLM_REPLAY_LATENCY_MS,
+    LLM_REPLAY_JITTER_MS and LLM_REPLAY_SEED.
+    """
+    seed = os.getenv("LLM_REPLAY_SEED")
+    return ReplayChatModel(
+        fixtures_dir=os.getenv("LLM_REPLAY_DIR", str(REPLAY_FIXTURES_DIR)),
+        latency_ms=float(os.getenv("LLM_REPLAY_LATENCY_MS", "0")),
+        jitter_ms=float(os.getenv("LLM_REPLAY_JITTER_MS", "0")),
+        seed=int(seed) if seed else None,
+    )
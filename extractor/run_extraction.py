@@ -1,45 +1,141 @@
-from extractor.pdf_processing.extract_tables import extract_tables
-from extractor.pdf_processing.extract_blocks import extract_blocks
+import json
+from pathlib import Path
+from typing import Optional, Tuple
+from extractor.pdf_processing.parse_document import PdfSource, parse_pdf, read_pdf_bytes, pdf_size
 from extractor.po_extractor import classify_project_payment_category
-from extractor.pdf_processing.format_po import format_po_for_llm
+from extractor.extraction_cache import (
+    pdf_sha256,
+    file_sha256,
+    get_cached_extraction,
+    set_cached_extraction,
+    get_cached_po_text,
+    set_cached_po_text,
+)
+from extractor.metrics import new_document_metrics, collect_metrics, stage, summarize_document
+from extractor.pdf_processing.format_po import format_po_for_llm, estimate_tokens
 from app.core.logger import setup_logger
 
 logger = setup_logger()
 
-def run_pipeline(pdf_path):
-    logger.info(f"Starting pipeline for {pdf_path}...")
-    print(f"Processing {pdf_path}...")
-
-    try:
-        blocks = extract_blocks(pdf_path)
-        logger.info(f"Extracted {len(blocks)} text blocks from PDF.")
-    except Exception as e:
-        logger.error(f"Failed to extract text blocks: {e}")
-        raise
-
-    try:
-        tables = extract_tables(pdf_path)
-        logger.info(f"Extracted {len(tables)} tables from PDF.")
-    except Exception as e:
-        logger.error(f"Failed to extract tables: {e}")
-        raise
-
-    try:
-        formatted_po = format_po_for_llm(blocks, tables)
-        logger.info("Formatted PO for LLM input.")
-    except Exception as e:
-        logger.error(f"Failed to format PO for LLM: {e}")
-        raise
-
-    # Classify the project payment category
-    try:
-        logger.info("Classifying project payment category.")
-        payment_category = classify_project_payment_category(formatted_po)
-        logger.info(f"Classification result: {payment_category}")
-        print(payment_category)
-    except Exception as e:
-        logger.error(f"Failed to classify project payment category: {e}")
-        raise
-
-    logger.info("Pipeline completed successfully.")
+def prepare_document(pdf_source: PdfSource, metrics: Optional[dict] = None) -> dict:
+    """
+    Runs the CPU-bound part of the pipeline: hashing, parsing and formatting.
+
+    Args:
+        pdf_source: Path to the PDF file, or its raw bytes / a buffer / a
+            binary stream. Paths are hashed and parsed from disk without
+            reading the whole file into memory.
+        metrics: Stage metrics to add to, e.g. with a download span already
+            recorded. A new record is started when omitted.
+
+    Returns:
+        dict: A prepared document with keys "pdf_hash", "formatted_po",
+        "result" and "metrics". "result" holds the cached extraction when there
+        is one, in which case "formatted_po" is None and no LLM call is needed.
+        "metrics" holds the stage spans recorded so far.
+    """
+    if metrics is None:
+        metrics = new_document_metrics(str(pdf_source) if isinstance(pdf_source, (str, Path)) else None)
+    with collect_metrics(metrics):
+        with stage("read") as span:
+            if isinstance(pdf_source, (str, Path)):
+                pdf_data = pdf_source
+                pdf_hash = file_sha256(pdf_source)
+            else:
+                pdf_data = read_pdf_bytes(pdf_source)
+                pdf_hash = pdf_sha256(pdf_data)
+            span["bytes_in"] = pdf_size(pdf_data)
+
+        cached_result = get_cached_extraction(pdf_hash)
+        if cached_result is not None:
+            logger.info(f"Extraction cache hit for PDF {pdf_hash[:12]}; skipping parsing and LLM calls.")
+            metrics["cache"] = "result"
+            return {"pdf_hash": pdf_hash, "formatted_po": None, "result": cached_result, "metrics": metrics}
+
+        formatted_po = get_cached_po_text(pdf_hash)
+        if formatted_po is not None:
+            logger.info(f"PO text cache hit for PDF {pdf_hash[:12]}; skipping parsing.")
+            metrics["cache"] = "text"
+        else:
+            try:
+                blocks, tables = parse_pdf(pdf_data)
+                logger.info(f"Extracted {len(blocks)} text blocks and {len(tables)} tables from PDF.")
+            except Exception as e:
+                logger.error(f"Failed to parse PDF: {e}")
+                raise
+
+            try:
+                with stage("format", blocks=len(blocks), tables=len(tables)) as span:
+                    formatted_po = format_po_for_llm(blocks, tables)
+                    span["prompt_chars"] = len(formatted_po)
+                    span["prompt_tokens"] = estimate_tokens(formatted_po)
+                logger.info("Formatted PO for LLM input.")
+            except Exception as e:
+                logger.error(f"Failed to format PO for LLM: {e}")
+                raise
+            set_cached_po_text(pdf_hash, formatted_po)
+
+    return {"pdf_hash": pdf_hash, "formatted_po": formatted_po, "result": None, "metrics": metrics}
+
+def extract_document(prepared: dict) -> dict:
+    """
+    Runs the LLM part of the pipeline on a document from prepare_document.
+
+    Stage spans for the LLM calls are added to prepared["metrics"].
+
+    Returns:
+        dict: The extracted purchase order details.
+    """
+    if prepared["result"] is not None:
+        return prepared["result"]
+
+    with collect_metrics(prepared.get("metrics")):
+        # Classify the project payment category
+        try:
+            logger.info("Classifying project payment category.")
+            payment_category = classify_project_payment_category(prepared["formatted_po"])
+            logger.info(f"Classification result: {payment_category}")
+            print(payment_category)
+        except Exception as e:
+            logger.error(f"Failed to classify project payment category: {e}")
+            raise
+
+    if payment_category:
+        set_cached_extraction(prepared["pdf_hash"], payment_category)
+    return payment_category
+
+def run_pipeline_with_metrics(pdf_source: PdfSource) -> Tuple[dict, dict]:
+    """
+    Runs the full extraction pipeline on a PDF and reports per-stage metrics.
+
+    Returns:
+        Tuple[dict, dict]: The extracted purchase order details, and a JSON-ready
+        summary of wall time, CPU time and sizes for each stage.
+    """
+    source_label = pdf_source if isinstance(pdf_source, str) else f"<{type(pdf_source).__name__}>"
+    logger.info(f"Starting pipeline for {source_label}...")
+    print(f"Processing {source_label}...")
+
+    prepared = prepare_document(pdf_source)
+    payment_category = extract_document(prepared)
+    summary = summarize_document(prepared["metrics"])
+
+    logger.info(f"Pipeline completed successfully. Stage metrics: {json.dumps(summary)}")
+    return payment_category, summary
+
+def run_pipeline(pdf_source: PdfSource):
+    """
+    Runs the full extraction pipeline on a PDF.
+
+    Results are cached by the SHA-256 of the PDF bytes, so a byte-identical
+    document skips parsing and both LLM calls on later runs.
+
+    Args:
+        pdf_source: Path to the PDF file, or its raw bytes / a binary stream.
+            In-memory sources are parsed directly without touching disk.
+
+    Returns:
+        dict: The extracted purchase order details.
+    """
+    payment_category, _ = run_pipeline_with_metrics(pdf_source)
     return payment_category
@@ -3,7 +3,6 @@ import json
 import pandas as pd
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
-import openpyxl
 from app.services.forecast import forecast_table
 from app.core.logger import setup_logger
 
@@ -91,7 +90,10 @@ def save_forecast_csv(df: pd.DataFrame, output_csv_path: Path) -> None:
     """Save the forecast DataFrame to CSV."""
     # Ensure directory exists before saving
     output_csv_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(output_csv_path, index=False, float_format='%.2f')
+    # Write aside and swap in, so /forecast never reads a half-written file.
+    tmp_path = output_csv_path.with_name(output_csv_path.name + ".tmp")
+    df.to_csv(tmp_path, index=False, float_format='%.2f')
+    os.replace(tmp_path, output_csv_path)
     logger.info(f"Saved forecast table to '{output_csv_path}'")
 
 # --- Changed pivot_excel_path type hint to Path ---
@@ -32,11 +32,12 @@ def create_or_empty_file(filepath: Path, filetype: Literal['csv', 'json', 'xlsx'
 
 def init_db() -> None:
     """
-    Initializes the database. If the database file exists, it is deleted first to ensure a fresh start.
+    Initializes the database. If the database file exists, it is deleted first to ensure a fresh start,
+    together with its WAL and shared-memory files, which would otherwise be replayed into the new database.
     """
-    db_path = DB_FILE_PATH
-    if db_path.exists():
-        db_path.unlink() # Use pathlib's unlink
+    for db_path in (DB_FILE_PATH, DB_FILE_PATH.with_name(DB_FILE_PATH.name + "-wal"), DB_FILE_PATH.with_name(DB_FILE_PATH.name + "-shm")):
+        if db_path.exists():
+            db_path.unlink() # Use pathlib's unlink
     # Now call the original initialization logic
     original_init_db()
 
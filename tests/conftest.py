@@ -0,0 +1,15 @@
+import pytest
+from sqlalchemy import create_engine
+from db.database import Base, SessionLocal
+
+
+@pytest.fixture
+def scratch_db(tmp_path):
+    """Points the app's sessions at a throwaway SQLite database for one test."""
+    original = SessionLocal.kw.get("bind")
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+    yield engine
+    SessionLocal.configure(bind=original)
+    engine.dispose()
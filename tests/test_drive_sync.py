@@ -0,0 +1,124 @@
+from types import SimpleNamespace
+import pytest
+from db.crud import (upsert_drive_files_sqlalchemy, apply_drive_file_changes, get_drive_file_index, enqueue_sync_job,
+                     link_drive_files_to_pos, get_sync_job_files)
+from app.services.drive_sync import sync_folder, commit_sync, folder_file_ids
+from app.services.drive_listing import list_all_files_in_folder
+from app.services.jobs import _plan_job
+from benchmarks.fake_drive import FakeDrive
+
+
+@pytest.fixture
+def drive(scratch_db, monkeypatch):
+    monkeypatch.setenv("DRIVE_SYNC_MODE", "incremental")
+    return FakeDrive()
+
+
+def run_sync(drive: FakeDrive, folder_id: str) -> dict:
+    """Runs one sync and stores its result, as a sync job does."""
+    sync = sync_folder(drive.service(), folder_id, list_all_files_in_folder, folder_file_ids(get_drive_file_index(), folder_id))
+    if sync["mode"] == "incremental":
+        apply_drive_file_changes(sync["changed"], sync["removed"], folder_id)
+    else:
+        upsert_drive_files_sqlalchemy(sync["files"], folder_id)
+    commit_sync(folder_id, sync)
+    return sync
+
+
+def stored_ids(folder_id: str) -> set:
+    return folder_file_ids(get_drive_file_index(), folder_id)
+
+
+def test_first_sync_lists_the_whole_tree(drive):
+    top = drive.add_folder("POs")
+    sub = drive.add_folder("2025", top)
+    ids = {drive.add_file("a.pdf", top), drive.add_file("b.pdf", sub)}
+    drive.add_file("elsewhere.pdf", "root")
+
+    sync = run_sync(drive, top)
+
+    assert sync["mode"] == "full"
+    assert {f["id"] for f in sync["files"]} == ids
+    assert stored_ids(top) == ids
+
+
+def test_incremental_sync_picks_up_changes(drive):
+    top = drive.add_folder("POs")
+    edited = drive.add_file("a.pdf", top, content=b"%PDF-1.4 v1")
+    untouched = drive.add_file("b.pdf", top)
+    run_sync(drive, top)
+
+    drive.update_file(edited, content=b"%PDF-1.4 v2")
+    added = drive.add_file("c.pdf", top)
+    drive.add_file("noise.pdf", "root")
+    drive.reset_calls()
+    sync = run_sync(drive, top)
+
+    assert sync["mode"] == "incremental"
+    assert drive.calls["files.list"] == 0
+    assert {f["id"] for f in sync["changed"]} == {edited, added}
+    assert sync["removed"] == set()
+    assert stored_ids(top) == {edited, untouched, added}
+    assert get_drive_file_index()[edited]["md5_checksum"] == next(f["md5Checksum"] for f in sync["changed"] if f["id"] == edited)
+
+
+def test_incremental_sync_removes_deleted_and_trashed_files(drive):
+    top = drive.add_folder("POs")
+    deleted = drive.add_file("a.pdf", top)
+    trashed = drive.add_file("b.pdf", top)
+    kept = drive.add_file("c.pdf", top)
+    run_sync(drive, top)
+
+    drive.delete(deleted)
+    drive.trash(trashed)
+    sync = run_sync(drive, top)
+
+    assert sync["mode"] == "incremental"
+    assert sync["removed"] == {deleted, trashed}
+    assert stored_ids(top) == {kept}
+
+
+def test_expired_token_falls_back_to_a_full_listing(drive):
+    top = drive.add_folder("POs")
+    first = drive.add_file("a.pdf", top)
+    run_sync(drive, top)
+
+    second = drive.add_file("b.pdf", top)
+    drive.delete(first)
+    drive.expire_tokens()
+    sync = run_sync(drive, top)
+
+    assert sync["mode"] == "full"
+    assert stored_ids(top) == {second}
+    assert run_sync(drive, top)["mode"] == "incremental"
+
+
+def test_failed_listing_aborts_the_sync(drive, monkeypatch):
+    top = drive.add_folder("POs")
+    kept = drive.add_file("a.pdf", top)
+    run_sync(drive, top)
+    drive.expire_tokens()
+
+    def broken_lister(*args, **kwargs):
+        raise RuntimeError("listing failed")
+
+    with pytest.raises(RuntimeError):
+        sync_folder(drive.service(), top, broken_lister, stored_ids(top))
+    assert stored_ids(top) == {kept}
+
+
+def test_incremental_job_retries_files_without_a_po(drive):
+    top = drive.add_folder("POs")
+    extracted = drive.add_file("a.pdf", top, content=b"%PDF-1.4 a")
+    failed = drive.add_file("b.pdf", top, content=b"%PDF-1.4 b")
+    drive.add_file("notes.txt", top, content=b"notes", mime_type="text/plain")
+    run_sync(drive, top)
+    link_drive_files_to_pos({extracted: "PO-A"})
+
+    job_id, _ = enqueue_sync_job("user", top, "POs", {"token": "t"})
+    lease = SimpleNamespace(service=drive.service(), new_service=drive.service)
+    state = _plan_job(job_id, top, lease, get_drive_file_index())
+
+    assert state["sync"]["mode"] == "incremental"
+    assert state["sync"]["changed"] == []
+    assert [checkpoint["file"]["id"] for checkpoint in get_sync_job_files(job_id)] == [failed]
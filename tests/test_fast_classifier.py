@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+import pytest
+from extractor.fast_classifier import fast_classify, get_fast_classify_settings, GUESS_CONFIDENCE
+from extractor.pdf_processing.parse_document import parse_pdf
+from extractor.pdf_processing.format_po import format_po_for_llm
+from extractor.run_extraction import run_pipeline
+
+SAMPLES_DIR = Path("input") / "POs"
+FIXTURES_DIR = Path("input") / "llm_replay"
+SAMPLES = sorted(SAMPLES_DIR.glob("*.pdf"))
+
+
+def fixture_payment_type(pdf_path: Path) -> str:
+    """The payment type the sample's replay fixture classifies it as."""
+    fixtures = json.loads((FIXTURES_DIR / f"{pdf_path.stem.lower().replace(' ', '_').replace('-', '_')}.json").read_text())
+    return next(f["response"] for f in fixtures if f["kind"] == "classify").strip().lower()
+
+
+@pytest.fixture
+def replay_llm(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "replay")
+    monkeypatch.setenv("LLM_EXTRACTION_MODE", "two_call")
+    monkeypatch.setenv("EXTRACTION_CACHE_ENABLED", "false")
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    monkeypatch.setenv("PO_FAST_CLASSIFY_ENABLED", "true")
+    monkeypatch.delenv("PO_FAST_CLASSIFY_MIN_CONFIDENCE", raising=False)
+
+
+def test_samples_are_bundled():
+    assert len(SAMPLES) == 3
+
+
+@pytest.mark.parametrize("pdf_path", SAMPLES, ids=lambda path: path.stem)
+def test_fast_path_never_contradicts_fixture(pdf_path, replay_llm):
+    blocks, tables = parse_pdf(pdf_path)
+    decision = fast_classify(format_po_for_llm(blocks, tables))
+    _, min_confidence = get_fast_classify_settings()
+    if decision["confidence"] >= min_confidence:
+        assert decision["payment_type"] == fixture_payment_type(pdf_path)
+
+
+@pytest.mark.parametrize("pdf_path", SAMPLES, ids=lambda path: path.stem)
+def test_pipeline_keeps_fixture_payment_type(pdf_path, replay_llm):
+    result = run_pipeline(str(pdf_path))
+    assert result["payment_type"].lower() == fixture_payment_type(pdf_path)
+
+
+def test_default_threshold_is_above_guesses(replay_llm):
+    _, min_confidence = get_fast_classify_settings()
+    assert min_confidence > GUESS_CONFIDENCE
+
+
+def test_header_date_and_date_range_are_not_a_schedule():
+    text = "\n".join([
+        "Sent On :", "01/6/2025", "Performance From :", "01 jun 2025 To 31 Aug, 2026 95,000 USD",
+        "Sent On : 01/6/2025 95,000 USD",
+    ])
+    decision = fast_classify(text)
+    assert decision["features"]["dated_amounts"] == 0
+    assert decision["payment_type"] == "periodic"
+    assert decision["confidence"] < get_fast_classify_settings()[1]
+
+
+def test_two_dated_amounts_are_only_a_guess():
+    decision = fast_classify("April 15, 2025 $5,000\nMay 1, 2025 $5,000")
+    assert decision["payment_type"] == "distributed"
+    assert decision["confidence"] == GUESS_CONFIDENCE
+
+
+def test_schedule_rows_are_distributed():
+    decision = fast_classify("Payment Scope:\nApril 15, 2025 $5,000\nMay 1, 2025 $5,000\nJune 1, 2025 $10,000")
+    assert decision["payment_type"] == "distributed"
+    assert decision["confidence"] >= get_fast_classify_settings()[1]
@@ -0,0 +1,31 @@
+from pathlib import Path
+import pytest
+from extractor.pdf_processing.parse_document import parse_pdf
+from extractor.pdf_processing.format_po import compact_po_content, format_po_for_llm
+
+SAMPLES = sorted((Path("input") / "POs").glob("*.pdf"))
+
+
+@pytest.mark.parametrize("pdf_path", SAMPLES, ids=lambda path: path.stem)
+def test_layout_table_of_sample_is_dropped(pdf_path):
+    blocks, tables = parse_pdf(pdf_path)
+    assert tables
+    kept_blocks, kept_tables = compact_po_content(blocks, tables)
+    assert kept_tables == []
+    assert "Grand Total" in "\n".join(block for _, block in kept_blocks)
+
+
+def test_payment_table_missing_from_blocks_is_kept():
+    blocks = [(1, "Purchase Order : 4411\nClient: Globex"), (1, "Payment schedule below")]
+    tables = [[["Milestone", "Amount"], ["Design", "$5,000"], ["Build", "$7,500"]]]
+    _, kept_tables = compact_po_content(blocks, tables)
+    assert kept_tables == tables
+
+
+def test_running_footer_is_kept_once_and_repeats_on_a_page_are_kept():
+    footer = "Acme Corp Confidential - Purchase Order 4411"
+    blocks = [(1, "$5,000"), (1, footer), (2, "$5,000"), (2, "$5,000"), (2, footer), (2, "Page 2 of 3"), (3, footer)]
+    text = format_po_for_llm(blocks, [], compact=True, token_budget=0)
+    assert text.count(footer) == 1
+    assert text.count("$5,000") == 3
+    assert "Page 2" not in text
@@ -0,0 +1,56 @@
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+from langchain_core.exceptions import OutputParserException
+from extractor.llm_scheduler import LLMBackend, LLMScheduler, is_rate_limit_error
+
+
+def make_scheduler(*names):
+    backends = [LLMBackend(name, "replay", "replay", llm=None) for name in names]
+    return LLMScheduler(backends, max_retries=2, backoff_seconds=0.01, max_wait_seconds=1)
+
+
+def test_provider_rate_limit_is_recognised():
+    assert is_rate_limit_error(ResourceExhausted("Quota exceeded"))
+
+
+def test_rate_limit_raised_from_a_wrapper_is_recognised():
+    try:
+        try:
+            raise ResourceExhausted("Quota exceeded")
+        except ResourceExhausted as e:
+            raise RuntimeError("LLM call failed") from e
+    except RuntimeError as e:
+        assert is_rate_limit_error(e)
+
+
+@pytest.mark.parametrize("message", ["Invalid json output: {'amount': 14290}", "Failed to parse: quota of 3 rate limit"])
+def test_parser_errors_are_not_rate_limits(message):
+    assert not is_rate_limit_error(OutputParserException(message))
+
+
+def test_parser_error_is_raised_without_retrying_or_cooldown():
+    scheduler = make_scheduler("a", "b")
+    calls = []
+
+    def call(backend):
+        calls.append(backend.name)
+        raise OutputParserException("Invalid json output: 429 USD")
+
+    with pytest.raises(OutputParserException):
+        scheduler.invoke(call, tokens=10)
+    assert len(calls) == 1
+    assert all(backend.cooldown_until == 0 and backend.totals["rate_limited"] == 0 for backend in scheduler.backends)
+
+
+def test_rate_limited_call_is_retried_on_another_backend():
+    scheduler = make_scheduler("a", "b")
+    calls = []
+
+    def call(backend):
+        calls.append(backend.name)
+        if len(calls) == 1:
+            raise ResourceExhausted("Quota exceeded")
+        return "ok"
+
+    assert scheduler.invoke(call, tokens=10) == "ok"
+    assert len(set(calls)) == 2